@@ -7,15 +7,36 @@ from services.document_store import DocumentStore
 from settings import settings
 import uvicorn
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, UploadFile, File,Request
+from fastapi import FastAPI, UploadFile, File,Request, HTTPException
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from functools import lru_cache
+from typing import List, Optional
 from services.extractor import Extractor
 from services.vectorDB import VectorDB
 from services.summarizer import Summarizer
 from services.retriever import Retriever
-from services.query_dcomposer import Query_decomposer
+from services.query_dcomposer import Query_decomposer, is_refusal
+from services.metrics import metrics
+from services.bedrock_client import BedrockUnavailableError, gateway_stats
+from services.ingestion_pipeline import IngestionPipeline, list_directory
+from services.warmup import Warmup
+from services.image_processing import make_thumbnail
+from services.search_cache import normalize_query, search_cache
+from services.single_flight import SingleFlight
+from services.llm_scheduler import SchedulerBusyError, llm_scheduler, request_scope
+import base64
+import logging
+import os
+import shutil
+import uuid
 import time
 import warnings
 import re
+
+logger = logging.getLogger(__name__)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -32,14 +53,24 @@ async def lifespan(app: FastAPI):
         document_store = DocumentStore(config.MONGO_URI)
         app.state.doc_store = document_store
 
+        # batch ingestion pipeline
+        app.state.ingestion = IngestionPipeline(app)
+
+        # load the lazily imported stacks in the background, /ready reports when they are hot
+        app.state.warmup = Warmup()
+        app.state.warmup.start()
+
         yield
     finally:
         print("Application is shutting down...")
+        if hasattr(app.state, "ingestion"):
+            app.state.ingestion.close()
+
         if hasattr(app.state, "vector_db"):
             app.state.vector_db.client.close()
 
         if hasattr(app.state, "doc_store"):
-            app.state.doc_store.client.close()
+            app.state.doc_store.close()
 
 
 
@@ -49,7 +80,71 @@ app = FastAPI(
     description=settings.app_description,
     version=settings.version,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
+app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_minimum_size)
+
+# concurrent identical questions share one pipeline run
+answer_flight = SingleFlight("ask.coalescing")
+
+
+def build_answer(answer: str, refs: list, images: list, compact: bool) -> dict:
+    """
+    Shape the ``/ask_question`` payload.
+
+    The full form inlines every context text and base64 image. The compact form
+    returns text snippets and image references instead; full texts and images are
+    served by ``/chunks/{id}`` and ``/images/{id}``.
+    """
+    if not compact:
+        return {"answer": answer, "context_texts": refs, "context_images": images}
+
+    limit = settings.response_snippet_chars
+    texts, image_refs = [], []
+    for ref in refs:
+        text = ref["text"] or ""
+        texts.append(dict(ref, text=text[:limit], truncated=len(text) > limit, url=f"/chunks/{ref['id']}"))
+        if ref.get("kind") == "image":
+            image_refs.append({
+                "id": ref["id"],
+                "page_no": ref["page_no"],
+                "url": f"/images/{ref['id']}",
+                "thumbnail_url": f"/images/{ref['id']}?thumbnail=true",
+            })
+    return {"answer": answer, "context_texts": texts, "context_images": image_refs}
+
+
+def image_b64(image_id: str) -> str:
+    """Base64 PNG of an indexed image, raises KeyError if unknown."""
+    meta = app.state.doc_store.get_metadata(image_id)
+    if meta is None or "image" not in meta["metadata"]:
+        raise KeyError(image_id)
+    return meta["metadata"]["image"]
+
+
+@lru_cache(maxsize=settings.thumbnail_cache_size)
+def image_thumbnail(image_id: str) -> bytes:
+    """JPEG thumbnail of an indexed image, cached since thumbnails are small and immutable."""
+    return make_thumbnail(image_b64(image_id), settings.thumbnail_max_px)
+
+
+@app.exception_handler(BedrockUnavailableError)
+def bedrock_unavailable(request: Request, exc: BedrockUnavailableError):
+    """Answer with 503 instead of an empty result when the LLM stays unavailable."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The language model is temporarily unavailable, please retry."},
+    )
+
+
+@app.exception_handler(SchedulerBusyError)
+def scheduler_busy(request: Request, exc: SchedulerBusyError):
+    """Shed interactive load fast when the model call queue exceeds the latency SLO."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The service is busy, please retry shortly."},
+        headers={"Retry-After": str(max(1, int(settings.llm_latency_slo)))},
+    )
 
 
 @app.get("/health")
@@ -63,6 +158,41 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+def readiness_check():
+    """
+    Readiness endpoint: 503 until the warm-up of the heavy stacks is over.
+
+    Returns:
+        dict: Readiness status and the duration of every warm-up step
+    """
+    warmup = app.state.warmup
+    if not warmup.ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "warming_up", "steps": warmup.steps})
+    return {"status": "ready", "steps": warmup.steps}
+
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Expose the in-process counters and timings (safety tiers, latency saved, ...).
+
+    Returns:
+        dict: Snapshot of all counters and timing aggregates
+    """
+    snapshot = metrics.snapshot()
+    snapshot["bedrock"] = gateway_stats()
+    snapshot["scheduler"] = llm_scheduler.stats()
+    calls = metrics.get("llm.structured.calls")
+    snapshot["structured_output"] = {
+        "calls": calls,
+        "wasted_calls": metrics.get("llm.structured.wasted_calls"),
+        "wasted_call_rate": metrics.get("llm.structured.wasted_calls") / calls if calls else 0.0,
+        "repaired": metrics.get("llm.structured.repaired"),
+    }
+    return snapshot
+
+
 global vector_retriever
 
 
@@ -80,54 +210,202 @@ def embedding_file(request: Request, file: UploadFile = File(...)):
         file (UploadFile): The file to be processed
         
     Returns:
-        dict: Status of the embedding process
+        dict: Status of the embedding process; in production mode, a 202 with the
+        ingestion job id when the job outlasts ``settings.ingest_wait_timeout``
     """
     st = time.time()
-    print(f"Session ID: {session_id}")
+    logger.info(f"Session ID: {session_id}")
+    if settings.run_mode == "production":
+        # keep partition_pdf out of the API workers: hand the file to the ingestion worker
+        spool_dir = os.path.join(settings.ingest_spool_dir, uuid.uuid4().hex)
+        os.makedirs(spool_dir, exist_ok=True)
+        path = os.path.join(spool_dir, "00000.pdf")
+        with open(path, "wb") as spooled:
+            shutil.copyfileobj(file.file, spooled)
+        job_id = app.state.ingestion.submit([(file.filename, path)], cleanup_dir=spool_dir)
+        job = app.state.ingestion.wait(job_id, timeout=settings.ingest_wait_timeout)
+        logger.info(f"Embedding of {file.filename} waited {time.time() - st:.1f}s for job {job_id}")
+        if job is not None and job["finished_at"] is None:
+            # still running: the client follows it on /ingestion_jobs/{job_id}
+            return JSONResponse(status_code=202, content={"status": "processing", "job_id": job_id})
+        return {"status": "success" if job and not job["failed"] else "failed", "job_id": job_id}
     # print(f' embedding file {file.filename}')
     file_content = file.file
     extractor = Extractor()
     extractor.run(file_content)
 
-    summarizer = Summarizer(extractor.texts, extractor.tables, extractor.images_b64)
+    summarizer = Summarizer(extractor.texts, extractor.tables, extractor.images_b64, doc_store=app.state.doc_store)
     data = summarizer.run()
 
     app.state.vector_db.run(data,app)
-    et = time.time()
-    print(f'time taken {et - st}')
+    logger.info(f"Embedding of {file.filename} took {time.time() - st:.1f}s")
     return {"status": "success"}
 
 
+@app.post("/upload_files_for_embedding")
+def embedding_files(files: List[UploadFile] = File(...)):
+    """
+    Process and embed many files in one request.
+
+    The files are spooled to disk and ingested in the background by the batch
+    pipeline, which overlaps extraction, summarization and insertion across files.
+
+    Args:
+        files (List[UploadFile]): The files to be processed
+
+    Returns:
+        dict: Id of the ingestion job and number of accepted files
+    """
+    spool_dir = os.path.join(settings.ingest_spool_dir, uuid.uuid4().hex)
+    os.makedirs(spool_dir, exist_ok=True)
+    sources = []
+    for i, file in enumerate(files):
+        path = os.path.join(spool_dir, f"{i:05d}.pdf")
+        with open(path, "wb") as spooled:
+            shutil.copyfileobj(file.file, spooled)
+        sources.append((file.filename, path))
+    job_id = app.state.ingestion.submit(sources, cleanup_dir=spool_dir)
+    return {"job_id": job_id, "documents": len(sources)}
+
+
+@app.post("/ingest_directory")
+def ingest_directory(directory: str):
+    """
+    Embed every PDF of a server-side directory (inside ``settings.ingest_root``).
+
+    Args:
+        directory (str): Directory to ingest, relative to the ingestion root
+
+    Returns:
+        dict: Id of the ingestion job and number of files found
+    """
+    try:
+        sources = list_directory(directory)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job_id = app.state.ingestion.submit(sources)
+    return {"job_id": job_id, "documents": len(sources)}
+
+
+@app.get("/ingestion_jobs/{job_id}")
+def ingestion_job(job_id: str):
+    """
+    Progress report of a batch ingestion job.
+
+    Args:
+        job_id (str): Id returned by the batch ingestion endpoints
+
+    Returns:
+        dict: Per-stage document counts, failures and throughput
+    """
+    job = app.state.ingestion.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job")
+    return job
+
+
 @app.get("/ask_question")
-def query_from_user(request: Request, question: str):
+def query_from_user(request: Request, question: str, compact: Optional[bool] = None):
     """
     Process a user question and return an answer with relevant context.
     
     Args:
         request:
         question (str): The user's question
+        compact (bool): Return snippets and image references instead of full texts and
+            inline images (default: settings.compact_responses)
         
     Returns:
         dict: Contains the answer and relevant context (text and images)
     """
     session_id = request.headers.get("session-id", "unknown")
     print(f"Session ID: {session_id}")
+    compact = settings.compact_responses if compact is None else compact
+
+    with request_scope("interactive", session_id):
+        return answer_request(question, session_id, compact)
+
+
+def answer_request(question: str, session_id: str, compact: bool) -> dict:
+    """Answer a question of a session, sharing the pipeline run with identical concurrent questions."""
+    retriever = Retriever(app,session_id=session_id)  # Update Retriever to accept session_id
+    if not settings.answer_coalescing or retriever.load_history() != "None yet.":
+        # the answer depends on the history of this session, nothing to share
+        return build_answer(*answer_question(retriever, question), compact)
+
+    # same normalized question against the same collection version -> same answer
+    key = f"{normalize_query(question)}\x00{search_cache.version(app.state.doc_store, 'DocumentCollection')}"
+    (answer, refs, images, answered), shared = answer_flight.run(
+        key, lambda: answer_question(retriever, question) + (retriever.answered,)
+    )
+    if shared and answered:
+        # the leader only stored the turn in its own session
+        app.state.doc_store.store_chat(question, answer, session_id)
+    return build_answer(answer, refs, images, compact)
+
+
+def answer_question(retriever: Retriever, question: str):
+    """
+    Run the question answering pipeline of ``/ask_question``.
 
+    Returns:
+        tuple: (answer, context references, context images)
+    """
     decomposer = Query_decomposer()
+    if settings.speculative_retrieval:
+        # raw-question search and history lookup overlap with the decomposition LLM call
+        return retriever.run_speculative(question, decomposer)
+
     queries = decomposer.run(question)
-    if len(queries) == 1:
-        return {
-            "answer": queries[0],
-            "context_texts": [],
-            "context_images": []
-        }
-    retriever = Retriever(app,session_id=session_id)  # Update Retriever to accept session_id
-    llm_response, fetch_context_text, fetch_context_image = retriever.run(question, queries)
-    return {
-        "answer": llm_response,
-        "context_texts": fetch_context_text,
-        "context_images": fetch_context_image
-    }
+    if is_refusal(queries):
+        return queries[0], [], []
+    return retriever.run(question, queries)
+
+
+@app.get("/images/{image_id}")
+def get_image(request: Request, image_id: str, thumbnail: bool = False):
+    """
+    Serve an indexed image, or its thumbnail, with caching headers.
+
+    Images never change once indexed, so the ETag only depends on the id and the
+    variant and a revalidation is answered without touching the document store.
+
+    Args:
+        image_id (str): Id of the image, as returned in ``context_images``
+        thumbnail (bool): Serve a downscaled JPEG instead of the original PNG
+
+    Returns:
+        Response: The image bytes, or 304 when the client copy is current
+    """
+    etag = f'"{image_id}{"-thumb" if thumbnail else ""}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.image_cache_max_age}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    try:
+        content = image_thumbnail(image_id) if thumbnail else base64.b64decode(image_b64(image_id))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(content=content, media_type="image/jpeg" if thumbnail else "image/png", headers=headers)
+
+
+@app.get("/chunks/{chunk_id}")
+def get_chunk(chunk_id: str):
+    """
+    Return the full text of a context chunk whose snippet was sent by ``/ask_question``.
+
+    Args:
+        chunk_id (str): Id of the chunk, as returned in ``context_texts``
+
+    Returns:
+        dict: Id, full text and page number of the chunk
+    """
+    collection = app.state.vector_db.client.collections.get("DocumentCollection")
+    obj = collection.query.fetch_object_by_id(chunk_id)
+    if obj is None:
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    meta = (app.state.doc_store.get_metadata(chunk_id) or {}).get("metadata", {})
+    page = meta.get("page_number", meta.get("metadata", {}).get("page_number"))
+    return {"id": chunk_id, "text": obj.properties["text"], "page_no": page}
 
 
 @app.get("/query_decompose")
@@ -142,7 +420,8 @@ def query_from_user(question: str):
         list: Decomposed sub-queries
     """
     decomposer = Query_decomposer()
-    response = decomposer.run(question)
+    with request_scope("debug"):
+        response = decomposer.run(question)
     return response
 
 
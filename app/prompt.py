@@ -2,17 +2,24 @@
 Prompt templates for the Multi-Modal RAG system.
 This module contains all the prompt templates used for different tasks in the application,
 including summarization, retrieval, query decomposition, and query expansion.
+
+Every task is split into a static ``*_system`` part, sent as the system prompt so it forms
+a stable, cacheable prefix (see ``settings.prompt_caching``), and a ``*_prompt`` part holding
+the per-request variables.
 """
 
-# Prompt template for summarizing text and tables
-summary_prompt_text = """
+# System prompt for summarizing text and tables
+summary_system_text = """
 You are an assistant tasked with summarizing tables and text.
 Give a concise summary of the table or text.
 
 Respond only with the summary, no additionnal comment.
 Do not start your message by saying "Here is a summary" or anything like that.
 Just give the summary as it is.
+"""
 
+# Prompt template for summarizing text and tables
+summary_prompt_text = """
 Table or text chunk: {element}
 """
 
@@ -21,26 +28,60 @@ summary_prompt_image = """
 Describe the image in detail.
 """
 
-# Prompt template for answering user questions based on retrieved context
-user_query_prompt = """
+# System prompt for summarizing several tables in a single request
+summary_system_table_batch = """
+You are an assistant tasked with summarizing tables.
+Give a concise summary of each of the tables you are given, each one delimited by <table id="N"> tags.
+
+Respond only with a JSON object mapping every table id to its summary, for example:
+{"1": "summary of table 1", "2": "summary of table 2"}
+Do not add any other text.
+"""
+
+# Prompt template for summarizing several tables in a single request
+summary_prompt_table_batch = """
+There are {count} tables:
+
+{elements}
+"""
+
+# System prompt for describing several images in a single request
+summary_system_image_batch = """
+Describe each of the images you are given in detail. Every image is preceded by its label "Image N".
+
+Respond only with a JSON object mapping every image number to its description, for example:
+{"1": "description of image 1", "2": "description of image 2"}
+Do not add any other text.
+"""
+
+# Prompt template for describing several images in a single request
+summary_prompt_image_batch = """
+There are {count} images.
+"""
+
+# System prompt for answering user questions based on retrieved context
+user_query_system = """
 You are a helpful assistant. Provide a JSON Answer for question based on the provided context.
 Do not rely on the internal memory or internal knowledge.
-Determine if the question is relevant to the context. 
-If yes, answer the question using the context provided and return status = 1 with answer. 
+Determine if the question is relevant to the context.
+If yes, answer the question using the context provided and return status = 1 with answer.
 If no, return status = 0 and answer something like this:
 \"I\'m sorry, I don't have enough information to answer that.\"
 
-Context: {context_text} 
-Question: {user_question}
-
 Respond in this JSON format:
-{{\"status\":...,\"answer\":\"...\"}}
+{\"status\":...,\"answer\":\"...\"}
 
 Only provide the JSON.
 """
 
-# Prompt template for query expansion and decomposition
-query_expansion_prompt = """
+# Prompt template for answering user questions based on retrieved context
+user_query_prompt = """
+Context: {context_text}
+Question: {user_question}
+"""
+
+# System prompt for query expansion and decomposition
+query_expansion_system = """
 You are a helpful assistant that rewrites a user query to improve search accuracy in a document retrieval system.
 
 Given an input query, you have two task
@@ -52,10 +93,35 @@ Given an input query, you have two task
 
  task 2: generate alternative phrasings or related queries that capture similar intent, using different vocabulary or structure. Do not change the meaning.
 
+Generate only a python list containing 5-6 queries, NO OTHER TEXT.
+"""
+
+# Prompt template for query expansion and decomposition
+query_expansion_user = """
 Original Query:
 "{query}"
 
 Generated queries: []
+"""
 
-Generate only a python list containing 5-6 queries, NO OTHER TEXT.
+# Single-message form of the query expansion, used when it goes through the guardrails
+query_expansion_prompt = query_expansion_system + query_expansion_user
+
+# System prompt for folding older chat turns into the rolling session summary
+chat_summary_system = """
+You are an assistant that maintains a running summary of a conversation between a user and a document Q&A assistant.
+Update the existing summary with the new turns you are given.
+Keep the facts, names, numbers and open questions that later questions may refer to, drop greetings and repetition.
+
+Respond only with the updated summary, no additional comment.
+"""
+
+# Prompt template for folding older chat turns into the rolling session summary
+chat_summary_prompt = """
+The summary must stay under {max_words} words.
+
+Existing summary: {summary}
+
+New turns:
+{turns}
 """
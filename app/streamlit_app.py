@@ -83,14 +83,26 @@ if question and st.button("Get Answer"):
                     st.write(f'Page_number = {ref.get("page_no", "")}')
                     st.write(f'score = {ref.get("score", "")}')
                     st.write(f'text = {ref.get("text", "")}')
+                    if ref.get("truncated"):
+                        with st.expander("Show full text"):
+                            full = requests.get(f"http://localhost:8000{ref['url']}")
+                            if full.status_code == 200:
+                                st.write(full.json()["text"])
 
             # Display context images if available
             if context_images:
                 st.subheader("Relevant Images:")
                 cols = st.columns(min(3, len(context_images)))
-                for i, img_b64 in enumerate(context_images):
+                for i, img in enumerate(context_images):
                     with cols[i % 3]:
-                        image_bytes = base64.b64decode(img_b64)
+                        if isinstance(img, dict):
+                            # compact responses reference the images, fetch them separately
+                            image_response = requests.get(f"http://localhost:8000{img['url']}")
+                            if image_response.status_code != 200:
+                                continue
+                            image_bytes = image_response.content
+                        else:
+                            image_bytes = base64.b64decode(img)
                         image = Image.open(BytesIO(image_bytes))
                         st.image(image, caption=f"Image {i+1}")
         else:
@@ -0,0 +1,111 @@
+"""
+Startup-time benchmark for the Multi-Modal RAG system.
+Measures, in fresh interpreters, how long importing the API module and each heavy
+dependency takes, and optionally how long the API needs to answer ``/health`` and
+``/ready`` after launch.
+
+Usage:
+    python scripts/benchmark_startup.py [--runs 5] [--serve]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules timed on their own, the API module should not pull the lazily loaded ones in
+MODULES = [
+    "app.main",
+    "unstructured.partition.pdf",
+    "nemoguardrails",
+    "langchain",
+    "boto3",
+    "weaviate",
+]
+
+IMPORT_SNIPPET = (
+    "import sys, time; st = time.perf_counter(); __import__({module!r}); "
+    "el = time.perf_counter() - st; "
+    "lazy = [m for m in ('unstructured.partition.pdf', 'nemoguardrails', 'boto3') if m in sys.modules]; "
+    "print(el, ','.join(lazy))"
+)
+
+
+def time_import(module: str, runs: int):
+    """Median import time of ``module`` in fresh interpreters and the heavy modules it loaded."""
+    timings, loaded = [], ""
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            return None, out.stderr.strip().splitlines()[-1]
+        elapsed, _, loaded = out.stdout.strip().splitlines()[-1].partition(" ")
+        timings.append(float(elapsed))
+    return statistics.median(timings), loaded
+
+
+def wait_for(url: str, deadline: float):
+    """Seconds until ``url`` answers 200, None if it never does before ``deadline``."""
+    st = time.perf_counter()
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - st
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.1)
+    return None
+
+
+def time_serve(port: int, timeout: float):
+    """Launch uvicorn and time ``/health`` (accepting requests) and ``/ready`` (warm)."""
+    st = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = st + timeout
+        health = wait_for(f"http://127.0.0.1:{port}/health", deadline)
+        health = None if health is None else time.perf_counter() - st
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", deadline)
+        ready = None if ready is None else time.perf_counter() - st
+        return health, ready
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--serve", action="store_true", help="also time a real uvicorn launch")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for the server")
+    args = parser.parse_args()
+
+    print(f"{'module':<30}{'median import (s)':>20}  heavy modules loaded")
+    for module in MODULES:
+        elapsed, loaded = time_import(module, args.runs)
+        if elapsed is None:
+            print(f"{module:<30}{'error':>20}  {loaded}")
+        else:
+            print(f"{module:<30}{elapsed:>20.3f}  {loaded or '-'}")
+
+    if args.serve:
+        health, ready = time_serve(args.port, args.timeout)
+        print(f"\nlaunch -> /health: {health if health is None else round(health, 3)} s")
+        print(f"launch -> /ready:  {ready if ready is None else round(ready, 3)} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Chunking evaluation for the Multi-Modal RAG system.
+Compares chunking settings on prompt size and hit rate: every PDF is partitioned once,
+chunked with each configuration, and a set of questions with known answers is run against
+an in-memory BM25 index of the chunks (a lexical stand-in for the Weaviate hybrid search,
+so no service is needed). A question is a hit when one of the contexts that would be put
+in the prompt contains its expected answer.
+
+Usage:
+    python scripts/evaluate_chunking.py --pdf doc1.pdf doc2.pdf --questions questions.jsonl
+
+questions.jsonl holds one {"question": "...", "answer": "..."} object per line, where
+``answer`` is a short string expected verbatim in the relevant passage.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chunker import Chunker, count_tokens  # noqa: E402
+from services.extractor import Extractor  # noqa: E402
+from settings import settings  # noqa: E402
+
+# (name, Chunker arguments) compared by default
+CONFIGS = [
+    ("by_title", {"strategy": "by_title"}),
+    ("tokens-128", {"strategy": "structured", "max_tokens": 128, "small_to_big": False}),
+    ("tokens-256", {"strategy": "structured", "max_tokens": 256, "small_to_big": False}),
+    ("tokens-512", {"strategy": "structured", "max_tokens": 512, "small_to_big": False}),
+    ("tokens-128/parent-512", {"strategy": "structured", "max_tokens": 128, "parent_max_tokens": 512}),
+    ("tokens-256/parent-1024", {"strategy": "structured", "max_tokens": 256, "parent_max_tokens": 1024}),
+]
+
+WORD_REGEX = re.compile(r"\w+")
+
+
+class BM25:
+    """Minimal Okapi BM25 index over a list of texts."""
+
+    def __init__(self, texts, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.docs = [Counter(WORD_REGEX.findall(text.lower())) for text in texts]
+        self.lengths = [sum(doc.values()) for doc in self.docs]
+        self.avg_length = sum(self.lengths) / max(len(self.docs), 1)
+        frequencies = Counter(term for doc in self.docs for term in doc)
+        self.idf = {
+            term: math.log(1 + (len(self.docs) - n + 0.5) / (n + 0.5)) for term, n in frequencies.items()
+        }
+
+    def rank(self, query: str):
+        """Indices of the documents sorted by decreasing score."""
+        terms = WORD_REGEX.findall(query.lower())
+        scores = []
+        for i, doc in enumerate(self.docs):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / max(self.avg_length, 1e-6))
+            score = sum(
+                self.idf.get(t, 0.0) * doc[t] * (self.k1 + 1) / (doc[t] + norm) for t in terms if t in doc
+            )
+            scores.append(score)
+        return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+
+
+def contexts_for(question: str, index: BM25, texts, top_k: int):
+    """Prompt contexts the retriever would build: top chunks, children collapsed into their parent."""
+    contexts, seen_parents = [], set()
+    for i in index.rank(question):
+        if len(contexts) >= top_k:
+            break
+        metadata = texts[i]["metadata"]
+        parent_id = metadata.get("parent_id")
+        if parent_id is not None:
+            if parent_id in seen_parents:
+                continue
+            seen_parents.add(parent_id)
+        contexts.append(metadata.get("parent_text") or texts[i]["text"])
+    return contexts
+
+
+def evaluate(elements_per_doc, questions, config: dict, top_k: int) -> dict:
+    """Chunk every document with ``config`` and score the questions against the chunks."""
+    texts = []
+    for elements in elements_per_doc:
+        texts.extend(Chunker(**config).run(elements)[0])
+    index = BM25([text["text"] for text in texts])
+
+    hits, prompt_tokens = 0, []
+    for item in questions:
+        contexts = contexts_for(item["question"], index, texts, top_k)
+        joined = "\n".join(contexts)
+        hits += item["answer"].lower() in joined.lower()
+        prompt_tokens.append(count_tokens(joined))
+    return {
+        "chunks": len(texts),
+        "mean_chunk_tokens": round(sum(count_tokens(t["text"]) for t in texts) / max(len(texts), 1), 1),
+        "hit_rate": round(hits / max(len(questions), 1), 3),
+        "mean_prompt_tokens": round(sum(prompt_tokens) / max(len(prompt_tokens), 1), 1),
+        "max_prompt_tokens": max(prompt_tokens, default=0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", nargs="+", required=True, help="PDF files to index")
+    parser.add_argument("--questions", required=True, help="JSONL file of questions and expected answers")
+    parser.add_argument("--top-k", type=int, default=settings.ranking_limit, help="contexts put in the prompt")
+    args = parser.parse_args()
+
+    with open(args.questions) as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+
+    elements_per_doc = []
+    for path in args.pdf:
+        with open(path, "rb") as pdf:
+            elements_per_doc.append(Extractor.partition(pdf))
+
+    print(f"{'config':<26}{'chunks':>8}{'chunk tok':>11}{'hit rate':>10}{'prompt tok':>12}{'max prompt':>12}")
+    for name, config in CONFIGS:
+        result = evaluate(elements_per_doc, questions, config, args.top_k)
+        print(f"{name:<26}{result['chunks']:>8}{result['mean_chunk_tokens']:>11}{result['hit_rate']:>10}"
+              f"{result['mean_prompt_tokens']:>12}{result['max_prompt_tokens']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Retrieval quality and latency evaluation for the Multi-Modal RAG system.
+Runs a golden question set against the ingested corpus (Weaviate + MongoDB) through the
+query decomposer and the ``Retriever`` search and context selection, without calling the
+answering LLM, and reports recall@k, MRR, context recall, prompt tokens and per-stage
+latency for every point of a parameter sweep.
+
+Usage:
+    python scripts/evaluate_retrieval.py --questions golden.jsonl \\
+        --sweep score_threshold=0.5,0.7 --sweep search_limit=5,10 --decomposition stub \\
+        --output report.json
+
+golden.jsonl holds one {"question": "...", "answers": ["...", ...]} object per line; a hit
+is relevant when its text contains one of the answers (case-insensitive). ``--sweep`` takes
+any ``settings`` field; the decomposition is "llm" (Query_decomposer, needs Bedrock), "stub"
+(a deterministic stand-in) or "none" (the raw question only).
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import config  # noqa: E402
+from app.prompt import user_query_system  # noqa: E402
+from services.chunker import count_tokens  # noqa: E402
+from services.document_store import DocumentStore  # noqa: E402
+from services.query_dcomposer import is_refusal  # noqa: E402
+from services.retriever import Retriever, build_prompt  # noqa: E402
+from services.search_cache import search_cache  # noqa: E402
+from services.vectorDB import VectorDB  # noqa: E402
+from settings import settings  # noqa: E402
+
+# prompt tokens counted per image (Anthropic bills about (width * height) / 750, ~1600 at most)
+IMAGE_TOKENS = 1600
+
+RECALL_KS = (1, 3, 5, 10)
+
+STOPWORDS = {"a", "an", "and", "are", "did", "do", "does", "for", "how", "in", "is", "of", "on", "the",
+             "to", "was", "what", "when", "where", "which", "who", "why", "with"}
+
+
+class StubDecomposer:
+    """Deterministic stand-in for ``Query_decomposer``: the question and its keywords."""
+
+    def run(self, question: str):
+        keywords = " ".join(w for w in question.split() if w.lower().strip("?,.") not in STOPWORDS)
+        return [question, keywords] if keywords and keywords != question else [question]
+
+
+class RawDecomposer:
+    """No decomposition, only the raw question is searched."""
+
+    def run(self, question: str):
+        return [question]
+
+
+def make_decomposer(kind: str):
+    if kind == "llm":
+        from services.query_dcomposer import Query_decomposer
+        return Query_decomposer()
+    return StubDecomposer() if kind == "stub" else RawDecomposer()
+
+
+def is_relevant(text: str, answers) -> bool:
+    text = (text or "").lower()
+    return any(answer.lower() in text for answer in answers)
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def evaluate_question(retriever, decomposer, item) -> dict:
+    """Run one question through decomposition, search and context selection."""
+    question, answers = item["question"], item["answers"]
+    timings = {}
+
+    st = time.perf_counter()
+    queries = decomposer.run(question)
+    timings["decomposition"] = time.perf_counter() - st
+    if is_refusal(queries):
+        # refusal, the API would stop here
+        queries = []
+
+    st = time.perf_counter()
+    reference_docs = retriever.search(queries) if queries else {}
+    timings["search"] = time.perf_counter() - st
+
+    ranked = sorted(reference_docs.values(), key=lambda ref: float(ref["score"]), reverse=True)
+    first_relevant = next((rank for rank, ref in enumerate(ranked, 1) if is_relevant(ref["text"], answers)), None)
+    recall = {}
+    for k in RECALL_KS:
+        top = " ".join(ref["text"] or "" for ref in ranked[:k]).lower()
+        recall[k] = sum(answer.lower() in top for answer in answers) / len(answers)
+
+    st = time.perf_counter()
+    text_context, image_context, _ = retriever.select_context(question, reference_docs, describe_images=False)
+    prompt = build_prompt("", text_context, image_context, question)
+    timings["context"] = time.perf_counter() - st
+
+    context = " ".join(text_context).lower()
+    prompt_tokens = count_tokens(user_query_system) + IMAGE_TOKENS * len(image_context) + sum(
+        count_tokens(part["text"]) for part in prompt if part["type"] == "text"
+    )
+    return {
+        "question": question,
+        "queries": len(queries),
+        "hits": len(ranked),
+        "reciprocal_rank": 1.0 / first_relevant if first_relevant else 0.0,
+        "recall": recall,
+        "context_recall": sum(answer.lower() in context for answer in answers) / len(answers),
+        "prompt_tokens": prompt_tokens,
+        "images": len(image_context),
+        "timings": timings,
+    }
+
+
+def aggregate(results) -> dict:
+    """Average the per-question results of one configuration."""
+    n = max(len(results), 1)
+    report = {
+        "questions": len(results),
+        "mrr": round(sum(r["reciprocal_rank"] for r in results) / n, 4),
+        "context_recall": round(sum(r["context_recall"] for r in results) / n, 4),
+        "mean_hits": round(sum(r["hits"] for r in results) / n, 2),
+        "mean_prompt_tokens": round(sum(r["prompt_tokens"] for r in results) / n, 1),
+        "p95_prompt_tokens": percentile([r["prompt_tokens"] for r in results], 0.95),
+    }
+    for k in RECALL_KS:
+        report[f"recall@{k}"] = round(sum(r["recall"][k] for r in results) / n, 4)
+    for stage in ("decomposition", "search", "context"):
+        values = [r["timings"][stage] * 1000 for r in results]
+        report[f"{stage}_p50_ms"] = round(statistics.median(values), 1) if values else 0.0
+        report[f"{stage}_p95_ms"] = round(percentile(values, 0.95), 1)
+    return report
+
+
+def parse_sweep(specs):
+    """Turn ``name=v1,v2`` specs into the list of settings overrides to evaluate."""
+    axes = []
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if not hasattr(settings, name):
+            raise SystemExit(f"unknown setting {name}")
+        current = getattr(settings, name)
+        if isinstance(current, bool):
+            parsed = [v.strip().lower() in ("1", "true", "yes") for v in values.split(",")]
+        else:
+            parsed = [type(current)(v) for v in values.split(",")]
+        axes.append([(name, v) for v in parsed])
+    return [dict(combination) for combination in itertools.product(*axes)] if axes else [{}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", required=True, help="golden question set (JSONL)")
+    parser.add_argument("--sweep", action="append", default=[], help="setting=v1,v2 (repeatable)")
+    parser.add_argument("--decomposition", choices=("llm", "stub", "none"), default="stub")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the search cache between configurations")
+    parser.add_argument("--output", help="write the full report (per question) to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.questions) as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+    for item in questions:
+        item["answers"] = item.get("answers") or [item["answer"]]
+
+    app = SimpleNamespace(state=SimpleNamespace(vector_db=VectorDB(), doc_store=DocumentStore(config.MONGO_URI)))
+    decomposer = make_decomposer(args.decomposition)
+    baseline = {name: getattr(settings, name) for name in type(settings).model_fields}
+    report = []
+    try:
+        for overrides in parse_sweep(args.sweep):
+            for name, value in overrides.items():
+                setattr(settings, name, value)
+            if not args.warm_cache:
+                search_cache.clear()
+            retriever = Retriever(app, session_id="evaluation")
+            results = [evaluate_question(retriever, decomposer, item) for item in questions]
+            summary = aggregate(results)
+            report.append({"settings": overrides, "decomposition": args.decomposition, "summary": summary,
+                           "questions": results})
+            label = " ".join(f"{k}={v}" for k, v in overrides.items()) or "current settings"
+            print(f"\n[{label}]")
+            for key, value in summary.items():
+                print(f"  {key:<22}{value}")
+            for name, value in baseline.items():
+                setattr(settings, name, value)
+    finally:
+        app.state.vector_db.client.close()
+        app.state.doc_store.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
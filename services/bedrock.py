@@ -4,65 +4,72 @@ This module provides functionality to interact with AWS Bedrock's language model
 for generating responses to user queries.
 """
 
-import boto3
 from components.base_component import BaseComponent
-from botocore.config import Config
 from settings import settings
-from app.config import config
 import json
 from enum import Enum
-from services.guardrails import GuardrailsService
+from services.bedrock_client import BedrockRequestError, BedrockUnavailableError, get_gateway
+from services.llm_scheduler import current_priority, llm_scheduler
+from services.metrics import metrics
+from services.model_router import model_router
+from services.structured_output import StructuredOutputError, coerce, tool_definition
 
-# Define timeout settings for AWS API calls (15 minutes)
-TIMEOUT = 900
 
-# Configure AWS client with timeout settings
-boto_config = Config(
-    connect_timeout=TIMEOUT,
-    read_timeout=TIMEOUT,
-)
+def cache_point() -> dict:
+    """Anthropic cache-control marker ending a cacheable prompt prefix, empty when caching is off."""
+    return {"cache_control": {"type": "ephemeral"}} if settings.prompt_caching else {}
+
+
+def has_images(content) -> bool:
+    """True if a list of content blocks holds an image block."""
+    return isinstance(content, list) and any(
+        isinstance(block, dict) and block.get("type") == "image" for block in content
+    )
 
 
 class Models(str, Enum):
     """Enumeration of available language models."""
     model1 = settings.MODEL_ID_SONNET_3_7
+    model2 = settings.MODEL_ID_HAIKU_3_5
 
 
 class MLLM(BaseComponent):
     """
     AWS Bedrock Language Model interface.
     
-    This class provides an interface to interact with AWS Bedrock's language models,
-    specifically the Claude 3.7 Sonnet model. It handles:
+    This class provides an interface to interact with AWS Bedrock's language models.
+    The model, token budget and temperature are picked per task by the model router
+    (``settings.model_routes``). It handles:
     1. AWS client configuration and authentication
     2. Request formatting and model invocation
-    3. Response processing and error handling
+    3. Falling back to the next model of the route when a model stays throttled,
+       times out or has its circuit open (see ``services/bedrock_client.py``)
+    4. Admission by the priority scheduler (see ``services/llm_scheduler.py``)
+    5. Response processing and error handling
     
     Attributes:
-        model_id (str): Identifier for the language model to use
+        route (Route): model selection of the task this instance serves
+        model_id (str): Identifier of the primary language model
+        gateway (BedrockGateway): process-wide rate-limited Bedrock client
         client: AWS Bedrock client instance
     """
 
-    def __init__(self):
-        """Initialize the MLLM with AWS Bedrock client configuration."""
+    def __init__(self, task: str = "default"):
+        """
+        Initialize the MLLM with AWS Bedrock client configuration.
+
+        Args:
+            task (str): call site name used to pick the model route (default: "default")
+        """
         super().__init__(logger_name='MLLM')
-        
-        # Configure AWS client settings
-        aws_settings = {
-            'region_name': 'us-west-2',
-            'config': boto_config,
-            'service_name': 'bedrock-runtime'
-        }
 
-        # Add AWS credentials if running locally
-        if config.IS_LOCAL == "True":
-            aws_settings['aws_access_key_id'] = config.AWS_ACCESS_KEY_ID
-            aws_settings['aws_secret_access_key'] = config.AWS_SECRET_ACCESS_KEY
-        
-        self.model_id = Models.model1
-        self.client = boto3.client(**aws_settings)
+        # rate limiting, retries and circuit breaking are shared by every MLLM of the process
+        self.gateway = get_gateway()
+        self.client = self.gateway.client
+        self.route = model_router.route(task)
+        self.model_id = self.route.model
 
-    def run(self, data):
+    def run(self, data, system=None, max_tokens: int = None):
         """
         Generate a response using the language model with content safety checks.
         
@@ -75,16 +82,19 @@ class MLLM(BaseComponent):
         Args:
             data: Input data to send to the model. Can be a list of messages
                  with different content types (text, image)
+            system (str): Optional static instructions, sent as the system prompt with a
+                 cache breakpoint so they are served from the prompt cache on repeated calls
+            max_tokens (int): Optional response budget overriding the one of the route
             
         Returns:
             str: Generated response from the language model
-            
-        Note:
-            The method handles errors gracefully and logs any issues that occur
-            during the model invocation.
+
+        Raises:
+            BedrockUnavailableError: if no model of the route answered within its deadline
+            BedrockRequestError: if the request was rejected by Bedrock
+            SchedulerBusyError: if an interactive call was shed under load
         """
-        llm_response = ""
-        
+
         # Format the input data as a user message
         message_list = [
             {
@@ -92,24 +102,120 @@ class MLLM(BaseComponent):
                 "content": data
             }
         ]
+        response = self._invoke(self._request(message_list, system, max_tokens=max_tokens), images=has_images(data))
+        return response['content'][0]['text']
+
+    def run_structured(self, data, schema, system=None, tool_name: str = "respond"):
+        """
+        Generate a response validated against a pydantic schema.
 
-        # Prepare the request payload
-        payload = json.dumps({
-            "max_tokens": settings.MAX_TOKENS,
-            'temperature': settings.model_temp,
+        The model is forced to call a tool whose input schema is ``schema``, so the
+        answer arrives as a JSON object instead of free text. An output that does not
+        validate is first repaired locally (``services/structured_output.py``); only
+        when that fails is the model asked again with the validation error, at most
+        ``settings.structured_output_max_retries`` times. Every call whose output could
+        not be used is counted in the ``llm.structured.wasted_calls`` metric.
+
+        Args:
+            data: Input data to send to the model, as for ``run``
+            schema: pydantic model class of the expected output
+            system (str): Optional static instructions, as for ``run``
+            tool_name (str): name of the tool the model has to call
+
+        Returns:
+            BaseModel: validated ``schema`` instance
+
+        Raises:
+            StructuredOutputError: if no valid output was obtained within the retries
+            BedrockUnavailableError, BedrockRequestError, SchedulerBusyError: as for ``run``
+        """
+        task = self.route.task
+        messages = [{"role": 'user', "content": data}]
+        tools = None
+        if settings.structured_output:
+            tools = {"tools": [tool_definition(schema, tool_name)], "tool_choice": {"type": "tool", "name": tool_name}}
+
+        error = None
+        for attempt in range(settings.structured_output_max_retries + 1):
+            response = self._invoke(self._request(messages, system, tools), images=has_images(data))
+            metrics.incr("llm.structured.calls")
+            metrics.incr(f"llm.structured.{task}.calls")
+            tool_use = next((block for block in response["content"] if block.get("type") == "tool_use"), None)
+            text = "".join(block.get("text", "") for block in response["content"] if block.get("type") == "text")
+            try:
+                result, repaired = coerce(tool_use["input"] if tool_use is not None else text, schema)
+                if repaired:
+                    metrics.incr("llm.structured.repaired")
+                    metrics.incr(f"llm.structured.{task}.repaired")
+                return result
+            except StructuredOutputError as e:
+                error = e
+                metrics.incr("llm.structured.wasted_calls")
+                metrics.incr(f"llm.structured.{task}.wasted_calls")
+                self.logger.info(f"Invalid structured output for {task} (attempt {attempt + 1}): {e}")
+
+            # re-ask with the validation error
+            messages = messages + [{"role": "assistant", "content": response["content"]}]
+            if tool_use is not None:
+                messages.append({"role": "user", "content": [{
+                    "type": "tool_result", "tool_use_id": tool_use["id"], "is_error": True,
+                    "content": f"Invalid arguments: {error}. Call {tool_name} again with valid arguments.",
+                }]})
+            else:
+                messages.append({"role": "user", "content": [{
+                    "type": "text", "text": f"Your answer could not be parsed: {error}. Reply with the JSON only.",
+                }]})
+
+        metrics.incr("llm.structured.failures")
+        self.logger.error(f"No valid structured output for {task}: {error}")
+        raise error
+
+    def _request(self, messages, system=None, tools=None, max_tokens: int = None) -> str:
+        """JSON payload of a messages request with the parameters of the route."""
+        request = {
+            "max_tokens": max_tokens or self.route.max_tokens,
+            'temperature': self.route.temperature,
             "anthropic_version": settings.ANTHROPIC_VERSION,
-            "messages": message_list
-        })
+            "messages": messages
+        }
+        if system:
+            request["system"] = [{"type": "text", "text": system, **cache_point()}]
+        if tools:
+            request.update(tools)
+        return json.dumps(request)
 
-        try:
-            # Invoke the model and process the response
-            response = self.client.invoke_model(
-                body=payload,
-                modelId=self.model_id
-            )
-            llm_response = json.loads(response.get("body").read())['content'][0]['text']
+    def _invoke(self, payload: str, images: bool = False) -> dict:
+        """
+        Send a payload to the models of the route in turn and return the first response.
+
+        Text-only models of the route are skipped when the payload carries ``images``.
+        """
+        # bulk calls leave part of the shared rate limit to interactive ones, across processes
+        reserve = settings.bedrock_bulk_reserve if current_priority(self.route.task) == "bulk" else 0.0
+        error = None
+        with llm_scheduler.slot(self.route.task):
+            for model_id in self.route.models_for(images):
+                try:
+                    # Invoke the model through the shared gateway and process the response
+                    response = self.gateway.invoke(model_id, payload, reserve=reserve)
+                    metrics.incr(f"llm.requests.{self.route.task}")
+                    self._record_usage(response.get("usage", {}))
+                    return response
+                except BedrockUnavailableError as e:
+                    error = e
+                    metrics.incr(f"llm.fallbacks.{self.route.task}")
+                    self.logger.info(f"{model_id} unavailable for {self.route.task} ({e}), trying the next model")
+                except BedrockRequestError as e:
+                    self.logger.error(f"An error occurred while fetching the response from the llm: {e}")
+                    raise
 
-        except Exception as e:
-            self.logger.info(f"An error occurred while fetching the response from the llm")
+        error = error or BedrockUnavailableError(f"no model of the {self.route.task} route accepts images")
+        self.logger.error(f"No model available for {self.route.task}: {error}")
+        raise error
 
-        return llm_response
\ No newline at end of file
+    def _record_usage(self, usage):
+        """Add the token usage of a response, including prompt-cache reads and writes, to the metrics."""
+        for key in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+            if usage.get(key):
+                metrics.incr(f"llm.tokens.{key}", usage[key])
+                metrics.incr(f"llm.tokens.{self.route.task}.{key}", usage[key])
@@ -0,0 +1,354 @@
+"""
+Rate-limit-aware AWS Bedrock client shared by every caller in the process.
+This module wraps ``invoke_model`` with token-bucket rate limiting, AIMD adaptive
+concurrency driven by throttling responses, jittered retries, per-call deadlines and
+a per-model circuit breaker, so bulk ingestion runs at the account quota instead of
+collapsing into throttling errors and empty responses.
+"""
+
+import json
+import random
+import threading
+import time
+from typing import Optional
+
+from app.config import config
+from components.base_component import BaseComponent
+from services.metrics import metrics
+from services.shared_state import get_shared_state
+from settings import settings
+
+# Bedrock error codes signalling that the account or model is over its quota
+THROTTLING_CODES = {"ThrottlingException", "TooManyRequestsException"}
+
+# Transient server side error codes worth retrying
+RETRYABLE_CODES = {
+    "ServiceUnavailableException",
+    "ModelTimeoutException",
+    "ModelNotReadyException",
+    "InternalServerException",
+}
+
+
+class BedrockUnavailableError(Exception):
+    """Raised when a model cannot be reached within the retry budget or its circuit is open."""
+
+
+class BedrockRequestError(Exception):
+    """Raised for non-retryable request errors (validation, access denied, ...)."""
+
+
+class TokenBucket:
+    """
+    Classic token bucket limiting the request rate.
+
+    Attributes:
+        rate (float): tokens added per second
+        capacity (float): maximum burst size
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float, reserve: float = 0.0) -> bool:
+        """
+        Take one token, waiting until ``deadline`` (monotonic time) at most.
+
+        With ``reserve`` the token is only taken while that many more stay in the
+        bucket, so low-priority callers leave a burst budget to the others.
+        """
+        reserve = min(reserve, self.capacity - 1)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1 + reserve:
+                    self._tokens -= 1
+                    return True
+                wait = (1 + reserve - self._tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class SharedTokenBucket:
+    """
+    Token bucket kept in the local shared store, so every API and ingestion
+    process on the host draws from the same request budget.
+    """
+
+    def __init__(self, state, name: str, rate: float, capacity: float):
+        self.state = state
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+    def acquire(self, deadline: float, reserve: float = 0.0) -> bool:
+        """Take one token, waiting until ``deadline`` (monotonic time) at most, see ``TokenBucket``."""
+        reserve = min(reserve, self.capacity - 1)
+        while True:
+            wait = self.state.take_token(self.name, self.rate, self.capacity, reserve)
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter.
+
+    The number of concurrent requests grows by one per limit-worth of successful
+    calls (additive increase) and is multiplied by ``backoff`` on every throttling
+    response (multiplicative decrease).
+
+    Attributes:
+        limit (float): current concurrency limit
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, backoff: float = 0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self._inflight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline: float) -> bool:
+        """Wait for a free slot until ``deadline`` (monotonic time)."""
+        with self._cond:
+            while self._inflight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._inflight += 1
+            return True
+
+    def release(self, throttled: bool = False) -> None:
+        """Free a slot and adapt the limit to the outcome of the call."""
+        with self._cond:
+            self._inflight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker.
+
+    After ``threshold`` consecutive failures the circuit opens and calls fail fast
+    for ``cooldown`` seconds; then a single trial call is let through (half-open)
+    and its outcome closes or re-opens the circuit. Every allowed call must be
+    settled with ``record``, also when it ends without a verdict on the model
+    (throttled, rejected request, no slot before the deadline), otherwise the
+    circuit would stay half-open with its trial never returning.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return True if a call may be attempted now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, success: Optional[bool]) -> None:
+        """
+        Update the breaker with the outcome of a call.
+
+        Args:
+            success: True or False for a healthy or failed model, None when the call
+                says nothing about the model; it only ends a half-open trial
+        """
+        with self._lock:
+            self._trial = False
+            if success is None:
+                return
+            if success:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._failures >= self.threshold:
+                if self._opened_at is None:
+                    metrics.incr("bedrock.circuit_opened")
+                self._opened_at = time.monotonic()
+
+
+class BedrockGateway(BaseComponent):
+    """
+    Process-wide Bedrock runtime client with flow control.
+
+    Every call goes through the token bucket, the AIMD limiter and the circuit
+    breaker of its model; throttling and transient errors are retried with full
+    jitter exponential backoff until the per-call deadline.
+
+    Attributes:
+        client: boto3 bedrock-runtime client shared by all callers
+    """
+
+    def __init__(self):
+        """Create the shared boto3 client and flow-control state."""
+        super().__init__(logger_name='BedrockGateway')
+        # boto3 is imported here rather than at module load, it is only needed once a model is called
+        import boto3
+        from botocore.config import Config
+
+        aws_settings = {
+            'region_name': 'us-west-2',
+            'config': Config(
+                connect_timeout=settings.bedrock_connect_timeout,
+                read_timeout=settings.bedrock_read_timeout,
+                retries={"total_max_attempts": 1},  # retries are handled here
+                max_pool_connections=settings.bedrock_max_concurrency,
+            ),
+            'service_name': 'bedrock-runtime'
+        }
+
+        # Add AWS credentials if running locally
+        if config.IS_LOCAL == "True":
+            aws_settings['aws_access_key_id'] = config.AWS_ACCESS_KEY_ID
+            aws_settings['aws_secret_access_key'] = config.AWS_SECRET_ACCESS_KEY
+
+        self.client = boto3.client(**aws_settings)
+        state = get_shared_state()
+        if state is not None:
+            self.bucket = SharedTokenBucket(
+                state, "bedrock", settings.bedrock_requests_per_second, settings.bedrock_burst
+            )
+        else:
+            self.bucket = TokenBucket(settings.bedrock_requests_per_second, settings.bedrock_burst)
+        self.limiter = AdaptiveLimiter(
+            initial=settings.bedrock_initial_concurrency,
+            minimum=1,
+            maximum=settings.bedrock_max_concurrency,
+        )
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def _breaker(self, model_id: str) -> CircuitBreaker:
+        with self._lock:
+            if model_id not in self._breakers:
+                self._breakers[model_id] = CircuitBreaker(
+                    settings.bedrock_circuit_threshold, settings.bedrock_circuit_cooldown
+                )
+            return self._breakers[model_id]
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Full-jitter exponential backoff delay for ``attempt`` (1-based)."""
+        return random.uniform(0, min(settings.bedrock_backoff_cap, settings.bedrock_backoff_base * 2 ** attempt))
+
+    def invoke(self, model_id: str, body: str, deadline: float = None, reserve: float = 0.0) -> dict:
+        """
+        Invoke a model and return its decoded JSON response body.
+
+        Args:
+            model_id (str): Bedrock model id
+            body (str): JSON request payload
+            deadline (float): absolute monotonic deadline (default: now + settings.bedrock_call_deadline)
+            reserve (float): rate-limit tokens left in the bucket for higher priority calls
+
+        Returns:
+            dict: decoded response body
+
+        Raises:
+            BedrockUnavailableError: throttled, timed out or circuit open until the deadline
+            BedrockRequestError: the request itself was rejected
+        """
+        from botocore.exceptions import ClientError, ConnectTimeoutError, EndpointConnectionError, ReadTimeoutError
+
+        deadline = deadline or time.monotonic() + settings.bedrock_call_deadline
+        breaker = self._breaker(model_id)
+        last_error = "deadline exceeded"
+
+        for attempt in range(1, settings.bedrock_max_attempts + 1):
+            if not breaker.allow():
+                metrics.incr("bedrock.circuit_rejected")
+                raise BedrockUnavailableError(f"circuit open for {model_id}")
+
+            # True / False once the model answered or failed; None (throttled, rejected
+            # request, no slot, unexpected error) still settles a half-open trial
+            verdict = None
+            try:
+                if not self.bucket.acquire(deadline, reserve) or not self.limiter.acquire(deadline):
+                    metrics.incr("bedrock.deadline_exceeded")
+                    break
+
+                throttled = False
+                st = time.monotonic()
+                try:
+                    response = self.client.invoke_model(body=body, modelId=model_id)
+                    result = json.loads(response.get("body").read())
+                    metrics.observe("bedrock.invoke", time.monotonic() - st)
+                    verdict = True
+                    return result
+                except ClientError as e:
+                    code = e.response["Error"]["Code"]
+                    if code in THROTTLING_CODES:
+                        throttled = True
+                        metrics.incr("bedrock.throttled")
+                    elif code in RETRYABLE_CODES:
+                        verdict = False
+                        metrics.incr("bedrock.transient_errors")
+                    else:
+                        raise BedrockRequestError(f"{model_id}: {code}: {e}") from e
+                    last_error = code
+                except (ConnectTimeoutError, ReadTimeoutError, EndpointConnectionError) as e:
+                    verdict = False
+                    metrics.incr("bedrock.timeouts")
+                    last_error = type(e).__name__
+                finally:
+                    self.limiter.release(throttled)
+            finally:
+                breaker.record(verdict)
+
+            delay = self._backoff(attempt)
+            if time.monotonic() + delay >= deadline:
+                break
+            self.logger.info(f"{model_id} attempt {attempt} failed ({last_error}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+        raise BedrockUnavailableError(f"{model_id} unavailable: {last_error}")
+
+    def stats(self) -> dict:
+        """Current flow-control state, for the metrics endpoint."""
+        return {"concurrency_limit": round(self.limiter.limit, 2), "inflight": self.limiter._inflight}
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def gateway_stats() -> dict:
+    """Flow-control state of the gateway, empty if it was never used."""
+    return _gateway.stats() if _gateway is not None else {}
+
+
+def get_gateway() -> BedrockGateway:
+    """Return the process-wide gateway, creating it on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = BedrockGateway()
+        return _gateway
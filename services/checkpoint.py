@@ -0,0 +1,45 @@
+"""
+Ingestion checkpoint keys for the Multi-Modal RAG system.
+Every extracted item (text chunk, table, image, table row group) gets a key derived from
+the document content, its kind, position and content, so a re-run of the same ingest
+recognises the work already done: summaries are restored from MongoDB and vector store
+objects get deterministic UUIDs, which makes inserts idempotent.
+"""
+
+import hashlib
+import uuid
+
+# namespace of the deterministic vector store object ids
+ITEM_NAMESPACE = uuid.UUID("5d0c7f5e-3a51-4c55-9a43-2f8f0f3b6a11")
+
+
+def document_key(pdf_bytes: bytes) -> str:
+    """Key of a document: SHA-256 of its content."""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def item_key(parent_key: str, kind: str, index: int, content: str = "") -> str:
+    """
+    Key of one item of a document.
+
+    Args:
+        parent_key (str): key of the document (or of the item this one derives from)
+        kind (str): "text", "table", "image" or "rows"
+        index (int): position of the item among the items of its kind
+        content (str): item content, so a changed extraction never reuses old work
+    """
+    digest = hashlib.sha1(f"{parent_key}:{kind}:{index}:".encode("utf-8"))
+    digest.update((content or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def assign_item_keys(doc_key: str, texts, tables, images) -> None:
+    """Set the ``item_key`` of every extracted item, in place."""
+    for kind, items, field in (("text", texts, "text"), ("table", tables, "text"), ("image", images, "image")):
+        for index, item in enumerate(items):
+            item["item_key"] = item_key(doc_key, kind, index, item.get(field))
+
+
+def item_uuid(key: str) -> str:
+    """Deterministic vector store object id of an item."""
+    return str(uuid.uuid5(ITEM_NAMESPACE, key))
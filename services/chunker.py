@@ -0,0 +1,257 @@
+"""
+Chunking stage of the extraction pipeline.
+This module turns the elements produced by ``partition_pdf`` into the text, table and
+image items that get summarized and indexed, either with unstructured's ``by_title``
+chunking or with a structure-aware, token-sized chunker supporting small-to-big retrieval.
+"""
+
+import hashlib
+import re
+
+from components.base_component import BaseComponent
+from settings import settings
+
+# Parameters of the original ``by_title`` chunking, kept for ``chunking_strategy == "by_title"``
+BY_TITLE_PARAMS = {
+    "max_characters": 10000,
+    "combine_text_under_n_chars": 2000,
+    "new_after_n_chars": 6000,
+    "overlap": 100,
+}
+
+# Element categories that never carry document content
+SKIPPED_CATEGORIES = {"Header", "Footer", "PageBreak", "PageNumber"}
+
+TOKEN_REGEX = re.compile(r"\w+|[^\w\s]")
+SENTENCE_REGEX = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate the number of model tokens of a text.
+
+    Words and punctuation marks are counted as one token each, which tracks the
+    Claude tokenizer closely enough for sizing chunks without loading a tokenizer.
+    """
+    return len(TOKEN_REGEX.findall(text or ""))
+
+
+def split_tokens(text: str, max_tokens: int, overlap_tokens: int = 0):
+    """
+    Split a text into pieces of at most ``max_tokens`` tokens at sentence boundaries.
+
+    Consecutive pieces share up to ``overlap_tokens`` tokens of trailing sentences;
+    sentences longer than ``max_tokens`` are split on words.
+
+    Returns:
+        list: the text pieces, in order
+    """
+    sentences = []
+    for sentence in SENTENCE_REGEX.split(text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if count_tokens(sentence) <= max_tokens:
+            sentences.append(sentence)
+            continue
+        words, part = sentence.split(), []
+        for word in words:
+            if part and count_tokens(" ".join(part + [word])) > max_tokens:
+                sentences.append(" ".join(part))
+                part = []
+            part.append(word)
+        if part:
+            sentences.append(" ".join(part))
+
+    pieces, current, used = [], [], 0
+    for sentence in sentences:
+        size = count_tokens(sentence)
+        if current and used + size > max_tokens:
+            pieces.append(" ".join(current))
+            # carry the trailing sentences over as overlap
+            overlap, overlap_used = [], 0
+            for previous in reversed(current):
+                previous_size = count_tokens(previous)
+                if overlap_used + previous_size > overlap_tokens or overlap_used + previous_size + size > max_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_used += previous_size
+            current, used = overlap, overlap_used
+        current.append(sentence)
+        used += size
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _clean_metadata(element) -> dict:
+    """Serializable metadata of an element, without the heavy payload fields."""
+    metadata = element.to_dict()["metadata"]
+    for key in ("image_base64", "orig_elements", "text_as_html"):
+        metadata.pop(key, None)
+    return metadata
+
+
+class Chunker(BaseComponent):
+    """
+    Turn partitioned PDF elements into indexable text, table and image items.
+
+    With ``settings.chunking_strategy == "structured"`` the elements are grouped
+    into sections following the title hierarchy; every section is cut into parent
+    chunks of at most ``settings.chunk_parent_max_tokens`` tokens and every parent
+    into small child chunks of at most ``settings.chunk_max_tokens`` tokens. Only
+    the children are indexed. With ``settings.small_to_big`` each child carries its
+    parent (``parent_id`` / ``parent_text`` metadata) so the retriever can put the
+    whole parent section in the prompt instead of the matching fragment.
+
+    ``"by_title"`` reproduces the original unstructured chunking.
+
+    Attributes:
+        strategy (str): "structured" or "by_title"
+    """
+
+    def __init__(self, strategy: str = None, max_tokens: int = None, overlap_tokens: int = None,
+                 parent_max_tokens: int = None, min_tokens: int = None, small_to_big: bool = None):
+        """
+        Initialize the chunker, every argument defaults to its ``settings.chunk*`` value.
+
+        Args:
+            strategy (str): "structured" or "by_title"
+            max_tokens (int): size bound of the indexed child chunks
+            overlap_tokens (int): tokens shared by consecutive children of a parent
+            parent_max_tokens (int): size bound of the parent chunks
+            min_tokens (int): sections smaller than this are merged into the previous parent
+            small_to_big (bool): attach the parent text to every child
+        """
+        super().__init__(logger_name='Chunker')
+        self.strategy = strategy or settings.chunking_strategy
+        self.max_tokens = max_tokens or settings.chunk_max_tokens
+        self.overlap_tokens = settings.chunk_overlap_tokens if overlap_tokens is None else overlap_tokens
+        self.parent_max_tokens = parent_max_tokens or settings.chunk_parent_max_tokens
+        self.min_tokens = settings.chunk_min_tokens if min_tokens is None else min_tokens
+        self.small_to_big = settings.small_to_big if small_to_big is None else small_to_big
+
+    def params(self) -> dict:
+        """Parameters that determine the chunking output, part of the extraction cache key."""
+        if self.strategy == "by_title":
+            return {"strategy": self.strategy, **BY_TITLE_PARAMS}
+        return {
+            "strategy": self.strategy,
+            "max_tokens": self.max_tokens,
+            "overlap_tokens": self.overlap_tokens,
+            "parent_max_tokens": self.parent_max_tokens,
+            "min_tokens": self.min_tokens,
+            "small_to_big": self.small_to_big,
+        }
+
+    def run(self, elements):
+        """
+        Chunk the elements of one document.
+
+        Args:
+            elements (list): elements returned by ``partition_pdf`` (without chunking)
+
+        Returns:
+            tuple: (texts, tables, images) lists of dicts, as stored on ``Extractor``
+        """
+        if self.strategy == "by_title":
+            return self._by_title(elements)
+        return self._structured(elements)
+
+    @staticmethod
+    def _by_title(elements):
+        """Original chunking: unstructured ``chunk_by_title`` with large character limits."""
+        from unstructured.chunking.title import chunk_by_title
+
+        texts, tables, images = [], [], []
+        for chunk in chunk_by_title(elements, **BY_TITLE_PARAMS):
+            chunk_dic = chunk.to_dict()
+            if 'Table' in str(type(chunk)) or 'TableChunk' in str(type(chunk)):
+                tables.append({"text": chunk.metadata.text_as_html, "metadata": chunk_dic['metadata']})
+
+            if 'CompositeElement' in str(type(chunk)):
+                texts.append({"text": chunk_dic['text'], "metadata": chunk_dic['metadata']})
+                for el in chunk.metadata.orig_elements:
+                    if "Image" in str(type(el)):
+                        # keep the surrounding chunk text as a cheap caption for lazy image indexing
+                        images.append({"image": el.metadata.image_base64, "metadata": chunk_dic['metadata'],
+                                       "context": chunk_dic['text']})
+        return texts, tables, images
+
+    def _sections(self, elements):
+        """
+        Group elements into sections along the title hierarchy.
+
+        Returns:
+            tuple: list of (heading path, [(text, metadata)], [image elements]) per section,
+            and the list of table elements
+        """
+        sections, tables, path = [], [], []
+        body, figures = [], []
+
+        def close():
+            if body or figures:
+                sections.append((list(path), body, figures))
+
+        for element in elements:
+            category = getattr(element, "category", type(element).__name__)
+            if category in SKIPPED_CATEGORIES:
+                continue
+            if category == "Title":
+                close()
+                body, figures = [], []
+                depth = getattr(element.metadata, "category_depth", None) or 0
+                path = path[:depth] + [element.text.strip()]
+            elif category == "Table":
+                tables.append(element)
+            elif category == "Image":
+                figures.append(element)
+            elif element.text and element.text.strip():
+                body.append((element.text.strip(), _clean_metadata(element)))
+        close()
+        return sections, tables
+
+    def _structured(self, elements):
+        """Structure-aware, token-sized chunking with parent/child chunks."""
+        texts, images = [], []
+        parents = []  # (heading path, text, metadata)
+
+        sections, table_elements = self._sections(elements)
+        for path, body, figures in sections:
+            heading = " > ".join(path)
+            section_text = "\n".join(text for text, _ in body)
+
+            # parents: consecutive elements of the section up to the parent budget
+            current, used, metadata = [], 0, None
+            for text, element_metadata in body:
+                size = count_tokens(text)
+                if current and used + size > self.parent_max_tokens:
+                    parents.append((heading, "\n".join(current), metadata))
+                    current, used, metadata = [], 0, None
+                current.append(text)
+                used += size
+                metadata = metadata or element_metadata
+            if current:
+                if (used < self.min_tokens and parents and parents[-1][0] == heading
+                        and count_tokens(parents[-1][1]) + used <= self.parent_max_tokens):
+                    previous = parents.pop()
+                    parents.append((heading, previous[1] + "\n" + "\n".join(current), previous[2]))
+                else:
+                    parents.append((heading, "\n".join(current), metadata))
+
+            for figure in figures:
+                images.append({"image": figure.metadata.image_base64, "metadata": _clean_metadata(figure),
+                               "context": (heading + "\n" + section_text).strip()})
+
+        for heading, parent_text, metadata in parents:
+            parent_id = hashlib.sha1(f"{heading}\n{parent_text}".encode("utf-8")).hexdigest()[:16]
+            for child in split_tokens(parent_text, self.max_tokens, self.overlap_tokens):
+                child_metadata = dict(metadata, section=heading, parent_id=parent_id)
+                if self.small_to_big:
+                    child_metadata["parent_text"] = parent_text
+                # the heading path makes short fragments searchable by their section name
+                texts.append({"text": f"{heading}\n{child}" if heading else child, "metadata": child_metadata})
+
+        tables = [{"text": table.metadata.text_as_html, "metadata": _clean_metadata(table)} for table in table_elements]
+        self.logger.info(f"Chunked {len(parents)} parents into {len(texts)} children")
+        return texts, tables, images
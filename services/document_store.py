@@ -1,7 +1,12 @@
 import datetime
 
-from pymongo import MongoClient
-from typing import Any, Dict, Optional
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from typing import Any, Dict, List, Optional
+
+from services.session_memory import SessionMemory
+from services.write_buffer import WriteBehindBuffer
+from settings import settings
 
 
 class DocumentStore:
@@ -10,13 +15,64 @@ class DocumentStore:
         self.db = self.client[db_name]
         self.meta_col = self.db["document_metadata"]
         self.chat_col = self.db["chat_history"]
+        self.summary_col = self.db["chat_summary"]
+        self.version_col = self.db["collection_versions"]
+        self.search_cache_col = self.db["search_cache"]
+        self.table_col = self.db["tables"]
+        self.checkpoint_col = self.db["ingest_checkpoints"]
         self.meta_col.create_index("weaviate_id", unique=True)
+        # chunks repeated verbatim are found by their normalized text key
+        self.meta_col.create_index("text_key")
+        # supports the per-session "latest N turns" lookups
+        self.chat_col.create_index([("session_id", ASCENDING), ("timestamp", DESCENDING)])
+        self.summary_col.create_index("session_id", unique=True)
+        # turns expire one by one, counted from their own timestamp: a long session loses
+        # its oldest turns first, their gist stays in the rolling summary (see SessionMemory)
+        ttl = int(settings.chat_history_ttl_days * 86400)
+        self._ensure_ttl_index(self.chat_col, "timestamp", ttl)
+        self._ensure_ttl_index(self.summary_col, "updated_at", ttl)
+        self._ensure_ttl_index(self.search_cache_col, "created_at", int(settings.search_cache_shared_ttl))
+        self._ensure_ttl_index(self.checkpoint_col, "updated_at", int(settings.ingest_checkpoint_ttl_days * 86400))
+        self.memory = SessionMemory(self)
+        self.chat_writer = (
+            WriteBehindBuffer(
+                self.chat_col,
+                batch_size=settings.chat_write_batch_size,
+                flush_interval=settings.chat_write_flush_interval,
+            )
+            if settings.chat_write_behind
+            else None
+        )
+
+    def _ensure_ttl_index(self, collection, field: str, ttl_seconds: int) -> None:
+        """
+        Create, update or drop the TTL index on ``field``.
+
+        A TTL of 0 disables expiry. Changing the TTL of an existing index is done
+        with collMod since create_index refuses to change index options.
+        """
+        name = f"{field}_ttl"
+        existing = collection.index_information()
+        if ttl_seconds <= 0:
+            if name in existing:
+                collection.drop_index(name)
+            return
+        try:
+            collection.create_index(field, name=name, expireAfterSeconds=ttl_seconds)
+        except OperationFailure:
+            self.db.command(
+                "collMod", collection.name,
+                index={"name": name, "expireAfterSeconds": ttl_seconds},
+            )
 
-    def upsert_metadata(self, weaviate_id: str, metadata: Dict[str, Any]) -> None:
+    def upsert_metadata(self, weaviate_id: str, metadata: Dict[str, Any], text_key: Optional[str] = None) -> None:
         """
-        Insert or update the metadata document for a given weaviate_id (UUID).
+        Insert or update the metadata document for a given weaviate_id (UUID),
+        optionally with the normalized text key of the chunk (see ``services.near_duplicates``).
         """
         doc = {"weaviate_id": weaviate_id, "metadata": metadata}
+        if text_key is not None:
+            doc["text_key"] = text_key
         # upsert: if exists, replace; if not, insert
         self.meta_col.replace_one({"weaviate_id": weaviate_id}, doc, upsert=True)
 
@@ -27,9 +83,92 @@ class DocumentStore:
         """
         return self.meta_col.find_one({"weaviate_id": weaviate_id})
 
+    def find_by_text_key(self, text_key: str, exclude: Optional[str] = None) -> Optional[str]:
+        """Return the id of an indexed chunk with the normalized text key ``text_key``, None if there is none."""
+        query = {"text_key": text_key}
+        if exclude is not None:
+            query["weaviate_id"] = {"$ne": exclude}
+        doc = self.meta_col.find_one(query, {"weaviate_id": 1})
+        return doc["weaviate_id"] if doc else None
+
+    def count_duplicate(self, weaviate_id: str, source: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Count one collapsed repeat of an indexed chunk and keep where it came from.
+
+        The sources of the last ``settings.near_dup_max_sources`` repeats are kept
+        in ``duplicate_sources`` (file, page, section and item key).
+        """
+        update = {"$inc": {"duplicates": 1}}
+        if source is not None:
+            update["$push"] = {"duplicate_sources": {"$each": [source], "$slice": -settings.near_dup_max_sources}}
+        self.meta_col.update_one({"weaviate_id": weaviate_id}, update)
+
+    def mark_described(self, weaviate_id: str) -> None:
+        """Flag a lazily indexed image as described by the LLM."""
+        self.meta_col.update_one({"weaviate_id": weaviate_id}, {"$set": {"metadata.described": True}})
+
+    #  Table helpers
+    def upsert_table(self, table_id: str, table: Dict[str, Any]) -> None:
+        """Store the columnar form of a table, see ``services.table_index``."""
+        self.table_col.replace_one({"_id": table_id}, dict(table, _id=table_id), upsert=True)
+
+    def get_tables(self, table_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return table_id -> columnar table for the given ids that exist."""
+        return {doc["_id"]: doc for doc in self.table_col.find({"_id": {"$in": list(table_ids)}})}
+
+    #  Ingestion checkpoint helpers
+    def get_checkpoints(self, item_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return item_key -> checkpoint for the given items that have one."""
+        if not item_keys:
+            return {}
+        return {doc["_id"]: doc for doc in self.checkpoint_col.find({"_id": {"$in": list(item_keys)}})}
+
+    def save_checkpoint(self, item_key: str, stage: str, text: Optional[str] = None) -> None:
+        """
+        Record that an ingested item reached ``stage`` ("summarized" or "inserted").
+
+        The summary ``text`` is kept with the checkpoint so it never has to be generated twice.
+        """
+        fields = {"stage": stage, "updated_at": datetime.datetime.utcnow()}
+        if text is not None:
+            fields["text"] = text
+        self.checkpoint_col.update_one({"_id": item_key}, {"$set": fields}, upsert=True)
+
+    #  Search‑cache helpers
+    def get_collection_version(self, collection: str) -> int:
+        """Return the version counter of a vector collection (0 if never bumped)."""
+        doc = self.version_col.find_one({"_id": collection})
+        return doc["version"] if doc else 0
+
+    def bump_collection_version(self, collection: str) -> int:
+        """Increment and return the version counter of a vector collection."""
+        doc = self.version_col.find_one_and_update(
+            {"_id": collection}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return doc["version"]
+
+    def get_cached_search(self, key: str) -> Optional[List[Any]]:
+        """Return the shared cached hits of a search key, None on a miss."""
+        doc = self.search_cache_col.find_one({"_id": key})
+        return doc["hits"] if doc else None
+
+    def put_cached_search(self, key: str, hits: List[Any]) -> None:
+        """Store the hits of a search key in the shared cache."""
+        self.search_cache_col.replace_one(
+            {"_id": key}, {"_id": key, "hits": hits, "created_at": datetime.datetime.utcnow()}, upsert=True
+        )
+
     #  Chat‑history helpers
     def get_chat_history(self,session_id,history_limit) -> str:
-        """Return the last N turns (user + assistant) as a plain string."""
+        """
+        Return the conversation memory of a session as a plain string.
+
+        With ``settings.session_memory`` enabled this is the rolling summary plus the
+        recent turns kept by ``SessionMemory``; otherwise the last N turns verbatim.
+        """
+        if settings.session_memory:
+            return self.memory.get(session_id)
+
         cursor = (
             self.chat_col.find({"session_id": session_id})
             .sort("timestamp", -1)
@@ -42,28 +181,86 @@ class DocumentStore:
         ]
         return "\n".join(formatted) or "None yet."
 
+    def get_turns(self, session_id, since=None, limit: Optional[int] = 10) -> List[Dict[str, Any]]:
+        """Return the last ``limit`` messages (all of them if None) of a session newer than ``since``, oldest first."""
+        query = {"session_id": session_id}
+        if since is not None:
+            query["timestamp"] = {"$gt": since}
+        cursor = self.chat_col.find(query).sort("timestamp", -1)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return list(cursor)[::-1]
+
+    def get_summary(self, session_id) -> Optional[Dict[str, Any]]:
+        """Return the persisted rolling summary of a session, None if there is none."""
+        return self.summary_col.find_one({"session_id": session_id})
+
+    def upsert_summary(self, session_id, summary: str, summarized_until) -> bool:
+        """
+        Persist the rolling summary of a session and the timestamp of the last turn it covers.
+
+        A summary never replaces one covering more turns (written by another process).
+
+        Returns:
+            bool: False if a summary covering at least as many turns is already persisted
+        """
+        try:
+            self.summary_col.update_one(
+                {"session_id": session_id, "$or": [
+                    {"summarized_until": None}, {"summarized_until": {"$lt": summarized_until}},
+                ]},
+                {"$set": {
+                    "summary": summary,
+                    "summarized_until": summarized_until,
+                    "updated_at": datetime.datetime.utcnow(),
+                }},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # the filter did not match the existing summary, which is newer
+            return False
+        return True
+
     def store_chat(self, question: str, answer: str,session_id) -> None:
-        """Persist both user question and assistant answer."""
+        """
+        Persist both user question and assistant answer.
+
+        With ``settings.chat_write_behind`` enabled the insert is queued and written
+        by a background thread; the session memory is updated immediately either way.
+        """
         ts = datetime.datetime.utcnow()
-        self.chat_col.insert_many(
-            [
-                {
-                    "session_id": session_id,
-                    "role": "user",
-                    "message": question,
-                    "timestamp": ts,
-                },
-                {
-                    "session_id": session_id,
-                    "role": "assistant",
-                    "message": answer,
-                    "timestamp": ts,
-                },
-            ]
-        )
+        # MongoDB keeps milliseconds, the in-process memory must match the stored turns
+        ts = ts.replace(microsecond=ts.microsecond // 1000 * 1000)
+        turn = [
+            {
+                "session_id": session_id,
+                "role": "user",
+                "message": question,
+                "timestamp": ts,
+            },
+            {
+                "session_id": session_id,
+                "role": "assistant",
+                "message": answer,
+                "timestamp": ts,
+            },
+        ]
+        if self.chat_writer is not None:
+            self.chat_writer.add(turn)
+        else:
+            self.chat_col.insert_many(turn)
+        if settings.session_memory:
+            self.memory.update(session_id, question, answer, ts)
+
+    def close(self) -> None:
+        """Flush buffered chat writes and pending summaries, then close the client."""
+        if self.chat_writer is not None:
+            self.chat_writer.close()
+        self.memory.close()
+        self.client.close()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.client.close()
+        self.close()
@@ -0,0 +1,122 @@
+"""
+Extraction result cache for the Multi-Modal RAG system.
+This module persists the output of ``Extractor.run`` (texts, tables, images) as gzipped
+JSON files keyed by the PDF content hash and the extraction parameters, so a retried or
+repeated ingest of the same document skips the hi_res ``partition_pdf`` run entirely.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+from components.base_component import BaseComponent
+from services.metrics import metrics
+from settings import settings
+
+# bump when the layout of the cached results changes
+CACHE_FORMAT = 1
+
+
+class ExtractionCache(BaseComponent):
+    """
+    Size-bounded on-disk cache of extraction results.
+
+    Files live in ``settings.extraction_cache_dir`` on local disk and are shared by
+    every process of the host; writes go through a temporary file and an atomic
+    rename. Hits refresh the file modification time, and the least recently used
+    files are deleted once the directory grows past ``settings.extraction_cache_max_bytes``.
+
+    Attributes:
+        directory (str): cache directory
+        max_bytes (int): size bound of the directory
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        """
+        Initialize the cache.
+
+        Args:
+            directory (str): cache directory (default: settings.extraction_cache_dir)
+            max_bytes (int): size bound (default: settings.extraction_cache_max_bytes)
+        """
+        super().__init__(logger_name='ExtractionCache')
+        self.directory = directory or settings.extraction_cache_dir
+        self.max_bytes = max_bytes or settings.extraction_cache_max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(pdf_bytes: bytes, params: dict) -> str:
+        """Cache key of a PDF content and the parameters it is extracted with."""
+        digest = hashlib.sha256(pdf_bytes)
+        digest.update(json.dumps([CACHE_FORMAT, params], sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, key: str):
+        """
+        Load a cached extraction.
+
+        Returns:
+            tuple: (texts, tables, images_b64), None on a miss or an unreadable file
+        """
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                cached = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            metrics.incr("extraction_cache.misses")
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Dropping unreadable extraction cache entry {key}: {e}")
+            metrics.incr("extraction_cache.misses")
+            self._remove(path)
+            return None
+        metrics.incr("extraction_cache.hits")
+        return cached["texts"], cached["tables"], cached["images"]
+
+    def put(self, key: str, texts, tables, images) -> None:
+        """Store an extraction result and evict old entries beyond the size bound."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump({"texts": texts, "tables": tables, "images": images}, f, default=str)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            self.logger.error(f"Extraction cache write failed: {e}")
+            self._remove(tmp_path)
+            return
+        self._evict()
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        """Delete the least recently used entries until the directory fits ``max_bytes``."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json.gz"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                metrics.incr("extraction_cache.evictions")
+
+
+# Create a global cache instance shared by all extractors of the process
+extraction_cache = ExtractionCache()
@@ -4,9 +4,37 @@ This module provides functionality to extract text, tables, and images from PDF
 using the unstructured library with high-resolution processing capabilities.
 """
 
+import io
+
 from components.base_component import BaseComponent
-from unstructured.partition.pdf import partition_pdf
-from .image_processing import filter_non_blank_images
+from settings import settings
+from .checkpoint import assign_item_keys, document_key
+from .chunker import Chunker
+from .extraction_cache import extraction_cache
+from .image_analysis import analyze_images
+
+# partition_pdf parameters, part of the extraction cache key
+PARTITION_PARAMS = {
+    "strategy": "hi_res",  # mandatory to infer tables
+    "extract_images_in_pdf": True,
+    "infer_table_structure": True,  # extract tables
+    "extract_image_block_types": ['Table', 'Figure'],
+    "include_page_breaks": True,
+    "unique_element_ids": True,
+    # "hi_res_model_name": 'yolox',
+    "extract_image_block_to_payload": True,  # if true, will extract base64 for API usage
+}
+
+
+def load_partition_pdf():
+    """
+    Import ``partition_pdf`` on first use.
+
+    The unstructured PDF stack (layout models, OCR, torch) takes seconds to import,
+    so it is only loaded by processes that actually extract documents.
+    """
+    from unstructured.partition.pdf import partition_pdf
+    return partition_pdf
 
 
 class Extractor(BaseComponent):
@@ -26,12 +54,19 @@ class Extractor(BaseComponent):
         images_b64 (list): List of base64-encoded images
     """
 
-    def __init__(self):
-        """Initialize the extractor with empty content lists."""
+    def __init__(self, chunker: Chunker = None):
+        """
+        Initialize the extractor with empty content lists.
+
+        Args:
+            chunker (Chunker): chunking stage run after partitioning (default: from settings)
+        """
         super().__init__('Extractor')
         self.texts = []
         self.tables = []
         self.images_b64 = []
+        self.doc_key = None
+        self.chunker = chunker or Chunker()
 
     def run(self, pdf_data, output_dir="resources/extracted_content"):
         """
@@ -39,8 +74,8 @@ class Extractor(BaseComponent):
         
         This method performs the following steps:
         1. Partition the PDF using high-resolution strategy
-        2. Extract text, tables, and images
-        3. Filter out blank images
+        2. Chunk the elements into text, tables, and images (see ``Chunker``)
+        3. Filter out blank and duplicate images (see ``analyze_images``)
         4. Store results in class attributes
         
         Args:
@@ -49,51 +84,59 @@ class Extractor(BaseComponent):
             
         Note:
             The extraction process uses high-resolution processing to ensure accurate
-            table structure inference and image extraction.
+            table structure inference and image extraction. With ``settings.extraction_cache``
+            the result is cached by file content and parameters, so a retried ingest of
+            the same PDF does not partition it again.
         """
-        # Partition PDF with high-resolution processing
-        chunks = partition_pdf(
-            file=pdf_data,
-            strategy="hi_res",  # mandatory to infer tables
-            extract_images_in_pdf=True,
-            infer_table_structure=True,  # extract tables
-            extract_image_block_types=['Table', 'Figure'],
-            include_page_breaks=True,
-            unique_element_ids=True,
-            # hi_res_model_name='yolox',
-            image_output_dir_path=output_dir,  # if None, images and tables will saved in base64
-            extract_image_block_to_payload=True,  # if true, will extract base64 for API usage
-            chunking_strategy="by_title",  # or 'basic'
-            max_characters=10000,  # defaults to 500
-            combine_text_under_n_chars=2000,  # defaults to 0 if chunks substantially smaller than desired combine
-            new_after_n_chars=6000,
-            chunk_overlap=100,
-        )
+        pdf_bytes = pdf_data.read() if hasattr(pdf_data, "read") else pdf_data
+        self.doc_key = document_key(pdf_bytes)
+        key = None
+        cached = None
+        if settings.extraction_cache:
+            key = extraction_cache.key(pdf_bytes, {"partition": PARTITION_PARAMS, "chunking": self.chunker.params()})
+            cached = extraction_cache.get(key)
 
-        # Process extracted chunks
-        for chunk in chunks:
-            chunk_dic = chunk.to_dict()
-            self.logger.info(f'\n{chunk_dic.items()}\n')
-            # Extract tables
-            if 'Table' in str(type(chunk)) or 'TableChunk' in str(type(chunk)):
-                self.tables.append({"text": chunk.metadata.text_as_html, "metadata": chunk_dic['metadata']})
-
-            # Extract text
-            if 'CompositeElement' in str(type(chunk)):
-                self.texts.append({"text": chunk_dic['text'], "metadata": chunk_dic['metadata']})
-
-            # Extract images
-            if 'CompositeElement' in str(type(chunk)):
-                chunk_els = chunk.metadata.orig_elements
-                for el in chunk_els:
-                    if "Image" in str(type(el)):
-                        self.images_b64.append({"image": el.metadata.image_base64, "metadata": chunk_dic['metadata']})
+        if cached is not None:
+            self.texts, self.tables, self.images_b64 = cached
+            self.logger.info(f"Extraction cache hit {key[:12]}")
+        else:
+            elements = self.partition(io.BytesIO(pdf_bytes), output_dir)
+
+            # Group the elements into text chunks, tables and images
+            self.texts, self.tables, self.images_b64 = self.chunker.run(elements)
+            if key is not None:
+                extraction_cache.put(key, self.texts, self.tables, self.images_b64)
+
+        # stable per-item keys, used to resume an interrupted ingest of the same document
+        assign_item_keys(self.doc_key, self.texts, self.tables, self.images_b64)
 
         # Log extraction results
         self.logger.info(
             f'Extracted texts = {len(self.texts)} tables= {len(self.tables)} images = {len(self.images_b64)}')
 
-        # Filter out blank images
-        # self.images_b64 = filter_non_blank_images(self.images_b64)
-        self.logger.info(
-            f'Extracted texts = {len(self.texts)} tables= {len(self.tables)} images = {len(self.images_b64)}')
+        # Filter out blank and repeated images, all images of the document in one batch
+        if settings.image_filtering and self.images_b64:
+            analysis = analyze_images([image["image"] for image in self.images_b64])
+            self.images_b64 = [image for image, keep in zip(self.images_b64, analysis.keep) if keep]
+            self.logger.info(
+                f'Dropped {int(analysis.blank.sum())} blank, {int((analysis.duplicate_of >= 0).sum())} duplicate '
+                f'and {int((~analysis.valid).sum())} invalid images, images = {len(self.images_b64)}')
+
+    @staticmethod
+    def partition(pdf_data, output_dir="resources/extracted_content"):
+        """
+        Partition a PDF into unchunked elements with high-resolution processing.
+
+        Args:
+            pdf_data: The PDF file data to process
+            output_dir (str): Directory to save extracted images
+
+        Returns:
+            list: elements returned by ``partition_pdf``
+        """
+        partition_pdf = load_partition_pdf()
+        return partition_pdf(
+            file=pdf_data,
+            image_output_dir_path=output_dir,  # if None, images and tables will saved in base64
+            **PARTITION_PARAMS,
+        )
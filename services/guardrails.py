@@ -3,14 +3,37 @@ Nemo Guardrails integration service for content safety and moderation.
 This module provides functionality to interact with Nvidia's Nemo Guardrails
 for content safety checks and moderation.
 """
-from nemoguardrails import RailsConfig
-from nemoguardrails import LLMRails
 from settings import settings
 from components.base_component import BaseComponent
-import os
-import yaml
-import json
-import random
+from services.metrics import metrics
+from services.safety_screen import SafetyScreen, safety_screen
+import threading
+import time
+
+# default NeMo refusal, returned when a request is blocked outside of the rails flow
+REFUSAL_MESSAGE = "I'm sorry, I can't respond to that."
+
+_rails = None
+_rails_lock = threading.Lock()
+
+
+def get_rails():
+    """
+    Return the process-wide ``LLMRails`` instance, building it on first use.
+
+    Importing nemoguardrails (and the langchain stack behind it) and parsing the
+    YAML configuration are slow, so they happen once per process instead of once
+    per request, and not at all in processes that never check content.
+    """
+    global _rails
+    with _rails_lock:
+        if _rails is None:
+            from nemoguardrails import LLMRails, RailsConfig
+
+            st = time.perf_counter()
+            _rails = LLMRails(RailsConfig.from_path('./config'))
+            metrics.observe("startup.guardrails_load", time.perf_counter() - st)
+        return _rails
 
 class GuardrailsService(BaseComponent):
     """
@@ -21,20 +44,35 @@ class GuardrailsService(BaseComponent):
     1. Content safety checks for input and output
     2. Integration with AWS Bedrock
     3. Response processing and error handling
+    4. Tiered screening: a local pre-screen (cache of earlier rail verdicts)
+       decides which questions need the LLM rail at all
     """
 
     def __init__(self):
         """Initialize the Guardrails service with configuration."""
         super().__init__(logger_name='Guardrails')
 
+        # Local tiers in front of the LLM rail, shared by every service instance
+        self.screen = safety_screen
+        # whether the last ``run`` was stopped by a rail (or failed)
+        self.blocked = False
 
-        # Create the Rails configuration
-        content_safety_config = RailsConfig.from_path('./config')
+    @property
+    def rails(self):
+        """Shared Rails instance, loaded on first use."""
+        return get_rails()
 
-        # Initialize the Rails
-        self.rails = LLMRails(content_safety_config)
+    def _record_input_rails(self, response, question):
+        """Time the input rails of a generation log and cache the verdict for ``question``."""
+        input_rails = [rail for rail in response.log.activated_rails if rail.type == "input"]
+        blocked = any(rail.stop for rail in input_rails)
+        metrics.incr("guardrails.llm_blocked" if blocked else "guardrails.llm_allowed")
+        metrics.observe("guardrails.input_rail", sum(rail.duration or 0.0 for rail in input_rails))
+        if question is not None:
+            self.screen.record(question, not blocked)
+        return blocked
 
-    def run(self, content):
+    def run(self, content, question=None):
         """
         Run the Guardrails service to check content safety.
 
@@ -43,10 +81,15 @@ class GuardrailsService(BaseComponent):
 
         Args:
             content (str): The input content to be checked for safety.
+            question (str): Optional raw user question; when given, the input-rail
+                verdict is cached for the local pre-screen.
 
         Returns:
-            str: The validated response from the Guardrails service.
+            str: The validated response from the Guardrails service, None on error.
+            ``self.blocked`` tells whether a rail stopped the generation (the
+            response is then the rails' refusal) or the call failed.
         """
+        self.blocked = True
         # Format the input data as a user message
         message_list = [
             {
@@ -56,9 +99,49 @@ class GuardrailsService(BaseComponent):
         ]
 
         try:
-            response = self.rails.generate(messages=message_list)
-            self.logger.info(f"Guardrails response: {response}")
-            return response['content']
+            response = self.rails.generate(
+                messages=message_list,
+                options={"log": {"activated_rails": True}},
+            )
+            self._record_input_rails(response, question)
+            self.blocked = any(rail.stop for rail in response.log.activated_rails)
+            self.logger.info(f"Guardrails response: {response.response}")
+            return response.response[0]['content']
+        except Exception as e:
+            self.logger.error(f"Guardrails error: {e}")
+            return None
+
+    def check_input(self, content, verdict=None) -> bool:
+        """
+        Check a user input, escalating to the input rails only when the local pre-screen cannot decide.
+
+        Args:
+            content (str): The user input to be checked for safety.
+            verdict (str): pre-screen verdict of ``content`` when the caller already ran it
+
+        Returns:
+            bool: True if the input is safe, False if it was blocked
+            or the check itself failed.
+        """
+        verdict = verdict or self.screen.run(content)
+        if verdict != SafetyScreen.ESCALATE:
+            return verdict == SafetyScreen.SAFE
+
+        message_list = [
+            {
+                "role": 'user',
+                "content": content
+            }
+        ]
+
+        try:
+            response = self.rails.generate(
+                messages=message_list,
+                options={"rails": ["input"], "log": {"activated_rails": True}},
+            )
+            blocked = self._record_input_rails(response, content)
+            self.logger.info(f"Guardrails input check blocked={blocked}")
+            return not blocked
         except Exception as e:
             self.logger.error(f"Guardrails error: {e}")
-            return None
\ No newline at end of file
+            return False
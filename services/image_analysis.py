@@ -0,0 +1,218 @@
+"""
+Batch image analysis for the Multi-Modal RAG system.
+This module analyses all images of a document at once: the images are decoded in
+parallel into a full-resolution grayscale histogram and a fixed downsampled grid, both
+stacked into arrays, on which blankness, entropy and perceptual hashes are computed as
+vectorized NumPy operations.
+Ingestion uses it to drop blank images and repeated ones (logos, page decorations)
+before they are summarized.
+"""
+
+import base64
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# side of the grid perceptual hashes are computed on, and of their low-frequency block
+HASH_GRID = 32
+HASH_SIZE = 8
+
+
+@dataclass
+class ImageAnalysis:
+    """
+    Analysis of a batch of images, every array has one entry per image.
+
+    Attributes:
+        valid (np.ndarray): False for images that could not be decoded
+        stddev (np.ndarray): standard deviation of the grayscale pixels
+        entropy (np.ndarray): Shannon entropy of the grayscale histogram, in bits (0 to 8)
+        phash (np.ndarray): 64-bit DCT perceptual hash (uint64)
+        blank (np.ndarray): True for blank or uniform images
+        duplicate_of (np.ndarray): index of the earlier image this one repeats, -1 if none
+    """
+    valid: np.ndarray
+    stddev: np.ndarray
+    entropy: np.ndarray
+    phash: np.ndarray
+    blank: np.ndarray
+    duplicate_of: np.ndarray
+
+    @property
+    def keep(self) -> np.ndarray:
+        """Mask of the valid, non-blank, non-duplicate images."""
+        return self.valid & ~self.blank & (self.duplicate_of < 0)
+
+
+def _decode(base64_image: str, grid: int):
+    """
+    Decode one image into its grayscale histogram and a ``grid`` x ``grid`` grayscale array.
+
+    The histogram is taken at full resolution, so thin lines and small print that
+    vanish in the grid still count for blankness; both come out of C code (PIL).
+
+    Returns:
+        tuple: (256-bin histogram, grid array), None if the image is invalid
+    """
+    try:
+        gray = Image.open(io.BytesIO(base64.b64decode(base64_image))).convert("L")
+        small = gray.resize((grid, grid), Image.BOX, reducing_gap=2.0)
+        return gray.histogram(), np.asarray(small, dtype=np.uint8)
+    except Exception as e:
+        logger.warning(f"Skipping invalid image: {e}")
+        return None
+
+
+def decode_images(base64_images: List[str], grid: int = None, workers: int = None):
+    """
+    Decode and downsample a batch of base64-encoded images in parallel.
+
+    Args:
+        base64_images (list[str]): base64-encoded images
+        grid (int): side of the grayscale grid (default: settings.image_analysis_grid)
+        workers (int): decoding threads (default: settings.image_analysis_workers)
+
+    Returns:
+        tuple: (histograms of shape (n, 256), grids of shape (n, grid, grid) as uint8,
+            mask of the decoded images)
+    """
+    grid = grid or settings.image_analysis_grid
+    workers = workers or settings.image_analysis_workers
+    if len(base64_images) > 1 and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-decode") as pool:
+            decoded = list(pool.map(lambda b64: _decode(b64, grid), base64_images))
+    else:
+        decoded = [_decode(b64, grid) for b64 in base64_images]
+
+    valid = np.array([d is not None for d in decoded], dtype=bool)
+    histograms = np.zeros((len(decoded), 256), dtype=np.int64)
+    stack = np.zeros((len(decoded), grid, grid), dtype=np.uint8)
+    for i, d in enumerate(decoded):
+        if d is not None:
+            histograms[i], stack[i] = d
+    return histograms, stack, valid
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II matrix."""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.sqrt(2.0 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def histogram_stats(histograms: np.ndarray):
+    """
+    Pixel standard deviation and Shannon entropy (in bits) of stacked grayscale histograms.
+
+    Equal to ``np.std`` over the pixels of every image, without touching the pixels.
+    """
+    totals = np.maximum(histograms.sum(axis=1, keepdims=True), 1)
+    p = histograms / totals
+    levels = np.arange(256, dtype=np.float64)
+    mean = p @ levels
+    variance = np.maximum(p @ levels ** 2 - mean ** 2, 0.0)
+    entropy = -(p * np.log2(np.where(p > 0, p, 1.0))).sum(axis=1)
+    return np.sqrt(variance), entropy
+
+
+def perceptual_hashes(stack: np.ndarray) -> np.ndarray:
+    """
+    DCT perceptual hash of every grid of the stack.
+
+    Every grid is reduced to 32 x 32, transformed with a 2D DCT, and the 8 x 8 lowest
+    frequencies are compared to their median: one bit per coefficient.
+
+    Returns:
+        np.ndarray: uint64 hash per image
+    """
+    n, grid = stack.shape[0], stack.shape[1]
+    if grid % HASH_GRID:
+        raise ValueError(f"image analysis grid must be a multiple of {HASH_GRID}, got {grid}")
+    factor = grid // HASH_GRID
+    small = stack.reshape(n, HASH_GRID, factor, HASH_GRID, factor).mean(axis=(2, 4))
+    dct = _dct_matrix(HASH_GRID)
+    coefficients = dct @ small @ dct.T
+    low = coefficients[:, :HASH_SIZE, :HASH_SIZE].reshape(n, -1)
+    # the DC term only carries the mean brightness, it is left out of the median
+    bits = low > np.median(low[:, 1:], axis=1)[:, None]
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def hash_distances(hashes: np.ndarray) -> np.ndarray:
+    """Pairwise Hamming distances of 64-bit hashes, as an (n, n) matrix."""
+    bits = np.unpackbits(hashes.astype(">u8").view(np.uint8).reshape(-1, 8), axis=1).astype(np.float32)
+    # differing bits = ones of a + ones of b - 2 * common ones
+    ones = bits.sum(axis=1)
+    return (ones[:, None] + ones[None, :] - 2 * (bits @ bits.T)).astype(np.int64)
+
+
+def find_duplicates(hashes: np.ndarray, candidates: np.ndarray, max_distance: int) -> np.ndarray:
+    """
+    Index of the earlier image every image repeats, -1 for originals.
+
+    An image only duplicates an earlier original, so a chain of slightly different
+    images never collapses into its first element.
+
+    Args:
+        hashes (np.ndarray): perceptual hashes
+        candidates (np.ndarray): mask of the images taking part (valid and non-blank)
+        max_distance (int): hash bits two images may differ by and still be duplicates
+    """
+    n = len(hashes)
+    duplicate_of = np.full(n, -1, dtype=np.int64)
+    if n < 2:
+        return duplicate_of
+    close = (hash_distances(hashes) <= max_distance) & candidates[None, :] & candidates[:, None]
+    originals = np.zeros(n, dtype=bool)
+    for i in np.flatnonzero(candidates):
+        earlier = np.flatnonzero(close[i, :i] & originals[:i])
+        if len(earlier):
+            duplicate_of[i] = earlier[0]
+        else:
+            originals[i] = True
+    return duplicate_of
+
+
+def analyze_images(base64_images: List[str], stddev_thresh: float = None,
+                   max_distance: int = None, grid: int = None) -> ImageAnalysis:
+    """
+    Analyse all images of a document in one batch.
+
+    Args:
+        base64_images (list[str]): base64-encoded images
+        stddev_thresh (float): images whose pixel standard deviation is below this are
+            blank (default: settings.image_blank_stddev)
+        max_distance (int): perceptual hash bits two duplicates may differ by
+            (default: settings.image_dedup_max_distance, negative disables duplicates)
+        grid (int): side of the grayscale grid (default: settings.image_analysis_grid)
+
+    Returns:
+        ImageAnalysis: per-image statistics and the blank / duplicate decisions
+    """
+    stddev_thresh = settings.image_blank_stddev if stddev_thresh is None else stddev_thresh
+    max_distance = settings.image_dedup_max_distance if max_distance is None else max_distance
+    if not base64_images:
+        empty = np.zeros(0)
+        return ImageAnalysis(empty.astype(bool), empty, empty, empty.astype(np.uint64), empty.astype(bool),
+                             empty.astype(np.int64))
+
+    histograms, stack, valid = decode_images(base64_images, grid)
+    stddev, entropy = histogram_stats(histograms)
+    phash = perceptual_hashes(stack)
+    blank = valid & (stddev < stddev_thresh)
+    if max_distance >= 0:
+        duplicate_of = find_duplicates(phash, valid & ~blank, max_distance)
+    else:
+        duplicate_of = np.full(len(stack), -1, dtype=np.int64)
+    return ImageAnalysis(valid, stddev, entropy, phash, blank, duplicate_of)
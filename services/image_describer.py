@@ -0,0 +1,119 @@
+"""
+Lazy image description service.
+This module lets ingestion index figures with cheap signals (surrounding chunk text and
+OCR) and defers the expensive multimodal LLM description until an image is first
+retrieved, at which point the description is appended to the indexed stub.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.prompt import summary_prompt_image
+from components.base_component import BaseComponent
+from services.image_processing import ocr_image
+from services.metrics import metrics
+from services.search_cache import search_cache
+from settings import settings
+
+# separates the stub of a lazily indexed image from its description in the indexed text
+DESCRIPTION_MARKER = "\nDescription: "
+
+
+def image_stub_text(image) -> str:
+    """
+    Build the cheap searchable text of an image that has not been described yet.
+
+    Args:
+        image (dict): extracted image with "image", "metadata" and "context" keys
+
+    Returns:
+        str: page number, nearby chunk text and OCR text of the image
+    """
+    page = image['metadata'].get('page_number')
+    context = (image.get('context') or "")[:settings.lazy_image_context_chars]
+    parts = [f"Figure on page {page}."]
+    if context:
+        parts.append(f"Nearby text: {context}")
+    ocr_text = ocr_image(image['image']) if settings.lazy_image_ocr else ""
+    if ocr_text:
+        parts.append(f"Text in figure: {ocr_text}")
+    return "\n".join(parts)
+
+
+class LazyImageDescriber(BaseComponent):
+    """
+    Describes lazily indexed images the first time they are retrieved.
+
+    Descriptions run on a small background pool so they never delay the answer
+    being built (the image itself is already part of the prompt). Once described,
+    the description is appended to the stub in the Weaviate object text (which
+    Weaviate re-vectorizes), so the OCR and caption text stays searchable, and the
+    MongoDB metadata is flagged, so each image is described once. Only the cached
+    searches holding the image are invalidated.
+    """
+
+    def __init__(self):
+        """Initialize the describer with an empty in-flight set."""
+        super().__init__(logger_name='LazyImageDescriber')
+        self._pool = ThreadPoolExecutor(max_workers=settings.lazy_image_workers, thread_name_prefix="describe")
+        self._lock = threading.Lock()
+        # ids queued or being described by this process, described ones are flagged in MongoDB
+        self._in_flight = set()
+        self._model = None
+
+    @property
+    def model(self):
+        """Language model used for the descriptions, created on first use."""
+        if self._model is None:
+            from services.bedrock import MLLM
+            self._model = MLLM(task="image_summary")
+        return self._model
+
+    def schedule(self, app, weaviate_id: str, image_b64: str) -> None:
+        """
+        Queue the description of a retrieved image unless it is already handled.
+
+        Args:
+            app: FastAPI application holding the vector and document stores
+            weaviate_id (str): uuid of the image object
+            image_b64 (str): base64-encoded image
+        """
+        with self._lock:
+            if weaviate_id in self._in_flight:
+                return
+            if len(self._in_flight) >= settings.lazy_image_max_pending:
+                # a later retrieval schedules it again
+                metrics.incr("images.lazy_deferred")
+                return
+            self._in_flight.add(weaviate_id)
+        self._pool.submit(self._describe, app, weaviate_id, image_b64)
+
+    def _describe(self, app, weaviate_id: str, image_b64: str) -> None:
+        """Describe an image and write the description back to Weaviate and MongoDB."""
+        content = [
+            {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": image_b64}},
+        ]
+        try:
+            description = self.model.run(content, system=summary_prompt_image)
+            if not description:
+                raise ValueError("empty description")
+            collection = app.state.vector_db.client.collections.get("DocumentCollection")
+            obj = collection.query.fetch_object_by_id(weaviate_id)
+            # another process may have described it already, its description is replaced
+            stub = (obj.properties.get("text") or "").split(DESCRIPTION_MARKER)[0] if obj is not None else ""
+            collection.data.update(uuid=weaviate_id, properties={"text": stub + DESCRIPTION_MARKER + description})
+            app.state.doc_store.mark_described(weaviate_id)
+            # cached searches returning the stub are stale in every worker, the version is shared
+            search_cache.bump(app.state.doc_store, "DocumentCollection")
+            metrics.incr("images.lazy_described")
+            self.logger.info(f"Described lazily indexed image {weaviate_id}")
+        except Exception as e:
+            self.logger.error(f"Lazy description of {weaviate_id} failed: {e}")
+        finally:
+            with self._lock:
+                # described images are flagged, failed ones are retried on a later retrieval
+                self._in_flight.discard(weaviate_id)
+
+
+# Create a global describer instance shared by all requests
+lazy_image_describer = LazyImageDescriber()
@@ -6,9 +6,12 @@ detecting and removing blank or uniform images from the dataset.
 
 import base64
 import io
+import logging
 from PIL import Image
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 def is_blank_image(image: Image.Image, stddev_thresh: float = 10.0) -> bool:
     """
     Check if an image is blank or uniform.
@@ -35,9 +38,9 @@ def filter_non_blank_images(base64_images: list[str]) -> list[str]:
     """
     Filter out blank images from a list of base64-encoded images.
     
-    This function processes a list of base64-encoded images and removes any that
-    are determined to be blank or uniform. It handles potential errors in image
-    decoding and processing gracefully.
+    The images are analysed in one batch by ``analyze_images`` (parallel decoding,
+    vectorized statistics over full-resolution grayscale histograms) instead of one
+    at a time.
     
     Args:
         base64_images (list[str]): List of base64-encoded image strings
@@ -46,15 +49,44 @@ def filter_non_blank_images(base64_images: list[str]) -> list[str]:
         list[str]: List of base64-encoded strings containing only non-blank images
         
     Note:
-        Invalid or corrupted images are skipped and logged with an error message.
-    """
-    non_blank_images = []
-    for b64 in base64_images:
-        try:
-            image_data = base64.b64decode(b64)
-            image = Image.open(io.BytesIO(image_data))
-            if not is_blank_image(image):
-                non_blank_images.append(b64)
-        except Exception as e:
-            print(f"Skipping invalid image: {e}")
-    return non_blank_images
+        Invalid or corrupted images are skipped and logged with a warning.
+    """
+    from .image_analysis import analyze_images
+
+    analysis = analyze_images(base64_images, max_distance=-1)
+    return [b64 for b64, keep in zip(base64_images, analysis.keep) if keep]
+
+def ocr_image(base64_image: str) -> str:
+    """
+    Extract the text visible in a base64-encoded image with Tesseract.
+
+    Args:
+        base64_image (str): base64-encoded image
+
+    Returns:
+        str: recognized text, empty if OCR is unavailable or fails
+    """
+    try:
+        import pytesseract
+        image = Image.open(io.BytesIO(base64.b64decode(base64_image)))
+        return " ".join(pytesseract.image_to_string(image).split())
+    except Exception as e:
+        logger.warning(f"OCR failed: {e}")
+        return ""
+
+def make_thumbnail(base64_image: str, max_px: int = 256) -> bytes:
+    """
+    Downscale a base64-encoded image to a JPEG thumbnail.
+
+    Args:
+        base64_image (str): base64-encoded image
+        max_px (int): maximum width and height of the thumbnail
+
+    Returns:
+        bytes: JPEG encoded thumbnail
+    """
+    image = Image.open(io.BytesIO(base64.b64decode(base64_image)))
+    image.thumbnail((max_px, max_px))
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=80, optimize=True)
+    return buffer.getvalue()
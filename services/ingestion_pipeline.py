@@ -0,0 +1,337 @@
+"""
+Batch ingestion pipeline for the Multi-Modal RAG system.
+This module ingests many documents at once, pipelining the extract, summarize and
+insert stages across documents: while document N is being summarized, document N+1
+is already being extracted and document N-1 inserted into the vector store.
+"""
+
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from components.base_component import BaseComponent
+from services.extractor import Extractor
+from services.shared_state import get_shared_state
+from services.summarizer import Summarizer
+from settings import settings
+
+# marks the end of the input of a stage
+_DONE = object()
+
+
+def extract_file(path):
+    """
+    Extract the texts, tables and images of one PDF.
+
+    Module-level so it can run in a worker process.
+
+    Args:
+        path (str): path of the PDF file
+
+    Returns:
+        tuple: (texts, tables, images_b64) as produced by ``Extractor``
+    """
+    extractor = Extractor()
+    with open(path, "rb") as pdf_data:
+        extractor.run(pdf_data)
+    return extractor.texts, extractor.tables, extractor.images_b64
+
+
+def new_job(job_id: str, total: int) -> dict:
+    """Initial progress record of a job."""
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "total": total,
+        "extracted": 0,
+        "summarized": 0,
+        "inserted": 0,
+        "failed": [],
+        "started_at": None,
+        "finished_at": None,
+    }
+
+
+def with_throughput(job: dict) -> dict:
+    """Add the documents/hour rate to a job progress record."""
+    started, finished = job["started_at"], job["finished_at"] or time.time()
+    if started and job["inserted"]:
+        job["documents_per_hour"] = round(job["inserted"] * 3600 / max(finished - started, 1e-6), 1)
+    return job
+
+
+class JobRegistry:
+    """Thread-safe, in-process registry of ingestion job progress."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, total: int) -> str:
+        """Register a new job for ``total`` documents and return its id."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = new_job(job_id, total)
+        return job_id
+
+    def update(self, job_id: str, **fields) -> None:
+        """Overwrite fields of a job."""
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def incr(self, job_id: str, stage: str) -> None:
+        """Count one more document through ``stage``."""
+        with self._lock:
+            self._jobs[job_id][stage] += 1
+
+    def fail(self, job_id: str, name: str, stage: str, error: Exception) -> None:
+        """Record a document that failed in ``stage``."""
+        with self._lock:
+            self._jobs[job_id]["failed"].append({"file": name, "stage": stage, "error": str(error)})
+
+    def get(self, job_id: str):
+        """Return a copy of the job progress, None for unknown ids."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job, failed=list(job["failed"]))
+        return with_throughput(job)
+
+
+class SharedJobRegistry(JobRegistry):
+    """Job registry kept in the local shared store, visible to every worker process."""
+
+    def __init__(self, state):
+        """
+        Args:
+            state (SharedState): store holding the job records
+        """
+        self.state = state
+
+    def create(self, total: int) -> str:
+        job_id = uuid.uuid4().hex
+        self.state.put_job(job_id, new_job(job_id, total))
+        return job_id
+
+    def update(self, job_id: str, **fields) -> None:
+        self.state.update_job(job_id, lambda job: dict(job, **fields))
+
+    def incr(self, job_id: str, stage: str) -> None:
+        self.state.update_job(job_id, lambda job: dict(job, **{stage: job[stage] + 1}))
+
+    def fail(self, job_id: str, name: str, stage: str, error: Exception) -> None:
+        failure = {"file": name, "stage": stage, "error": str(error)}
+        self.state.update_job(job_id, lambda job: dict(job, failed=job["failed"] + [failure]))
+
+    def get(self, job_id: str):
+        job = self.state.get_job(job_id)
+        return with_throughput(job) if job is not None else None
+
+
+class IngestionPipeline(BaseComponent):
+    """
+    Three-stage (extract → summarize → insert) pipeline over many documents.
+
+    Every stage has its own pool of worker threads and hands documents to the next
+    stage through a bounded queue, so a slow stage applies backpressure to the ones
+    before it instead of letting extracted documents pile up in memory. Extraction
+    can optionally run in worker processes since ``partition_pdf`` is CPU bound.
+    Progress of every job is tracked in a ``JobRegistry``.
+
+    In ``settings.run_mode == "production"`` the API processes only enqueue jobs in
+    the local shared store; a separate ingestion worker (``services/ingestion_worker.py``)
+    runs them, so ``partition_pdf`` never competes with question answering.
+
+    Attributes:
+        app: FastAPI application holding the vector and document stores
+        jobs (JobRegistry): progress of submitted jobs
+    """
+
+    def __init__(self, app, jobs: JobRegistry = None):
+        """
+        Initialize the pipeline.
+
+        Args:
+            app: FastAPI application instance (``app.state.vector_db`` / ``app.state.doc_store``)
+            jobs (JobRegistry): registry to report progress to (default: the shared
+                registry when ``settings.shared_state`` is enabled, else an in-process one)
+        """
+        super().__init__(logger_name='IngestionPipeline')
+        self.app = app
+        self.state = get_shared_state()
+        self.jobs = jobs or (SharedJobRegistry(self.state) if self.state is not None else JobRegistry())
+        self._process_pool = (
+            ProcessPoolExecutor(max_workers=settings.ingest_extract_workers)
+            if settings.ingest_extract_in_processes
+            else None
+        )
+
+    def submit(self, sources, cleanup_dir: str = None) -> str:
+        """
+        Start ingesting documents in the background.
+
+        Args:
+            sources (list): (display name, file path) pairs
+            cleanup_dir (str): directory removed once the job finished, e.g. the upload spool
+
+        Returns:
+            str: id of the job, to be polled with ``jobs.get``
+        """
+        job_id = self.jobs.create(len(sources))
+        if settings.run_mode == "production":
+            # picked up by the separate ingestion worker process
+            self.state.enqueue(job_id, {"sources": sources, "cleanup_dir": cleanup_dir})
+            return job_id
+        thread = threading.Thread(
+            target=self.run, args=(job_id, sources, cleanup_dir), name=f"ingest-{job_id[:8]}", daemon=True
+        )
+        thread.start()
+        return job_id
+
+    def wait(self, job_id: str, timeout: float = None, poll_interval: float = 1.0):
+        """
+        Block until a job has finished.
+
+        Args:
+            job_id (str): id of the job
+            timeout (float): maximum seconds to wait (default: no limit)
+            poll_interval (float): seconds between two progress reads
+
+        Returns:
+            dict: final (or, on timeout, current) progress of the job
+        """
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            job = self.jobs.get(job_id)
+            if job is None or job["finished_at"] is not None:
+                return job
+            if deadline is not None and time.time() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def _extract(self, path):
+        """Extract a document in process or in the process pool."""
+        if self._process_pool is None:
+            return extract_file(path)
+        return self._process_pool.submit(extract_file, path).result()
+
+    def _summarize(self, extracted):
+        """Summarize the tables and images of an extracted document."""
+        texts, tables, images = extracted
+        return Summarizer(texts, tables, images, doc_store=self.app.state.doc_store).run()
+
+    def _insert(self, data):
+        """Insert the summaries of a document into the vector and document stores."""
+        self.app.state.vector_db.run(data, self.app)
+        return data
+
+    def _stage(self, job_id, name, fn, inbox, outbox, workers):
+        """Start ``workers`` threads applying ``fn`` to every item of ``inbox``."""
+
+        def work():
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                doc_name, payload = item
+                try:
+                    result = fn(payload)
+                except Exception as e:
+                    self.logger.error(f"Ingestion of {doc_name} failed at {name}: {e}")
+                    self.jobs.fail(job_id, doc_name, name, e)
+                    continue
+                self.jobs.incr(job_id, name)
+                if outbox is not None:
+                    # blocks while the next stage is saturated (backpressure)
+                    outbox.put((doc_name, result))
+
+        threads = [
+            threading.Thread(target=work, name=f"ingest-{name}-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    @staticmethod
+    def _close(threads, outbox, consumers):
+        """Wait for a stage to drain and signal the end of input to the next one."""
+        for thread in threads:
+            thread.join()
+        for _ in range(consumers):
+            outbox.put(_DONE)
+
+    def run(self, job_id: str, sources, cleanup_dir: str = None) -> None:
+        """
+        Ingest ``sources`` synchronously, reporting progress under ``job_id``.
+
+        Args:
+            job_id (str): id returned by ``jobs.create``
+            sources (list): (display name, file path) pairs
+            cleanup_dir (str): directory removed at the end of the job
+        """
+        extract_workers = settings.ingest_extract_workers
+        summarize_workers = settings.ingest_summarize_workers
+        insert_workers = settings.ingest_insert_workers
+        self.jobs.update(job_id, status="running", started_at=time.time())
+
+        to_extract = queue.Queue()
+        to_summarize = queue.Queue(maxsize=settings.ingest_queue_size)
+        to_insert = queue.Queue(maxsize=settings.ingest_queue_size)
+        for name, path in sources:
+            to_extract.put((name, path))
+        for _ in range(extract_workers):
+            to_extract.put(_DONE)
+
+        try:
+            extractors = self._stage(job_id, "extracted", self._extract, to_extract, to_summarize, extract_workers)
+            summarizers = self._stage(job_id, "summarized", self._summarize, to_summarize, to_insert,
+                                      summarize_workers)
+            inserters = self._stage(job_id, "inserted", self._insert, to_insert, None, insert_workers)
+            self._close(extractors, to_summarize, summarize_workers)
+            self._close(summarizers, to_insert, insert_workers)
+            for thread in inserters:
+                thread.join()
+        finally:
+            job = self.jobs.get(job_id)
+            status = "completed" if not job["failed"] else "completed_with_errors"
+            self.jobs.update(job_id, status=status, finished_at=time.time())
+            if cleanup_dir:
+                shutil.rmtree(cleanup_dir, ignore_errors=True)
+            self.logger.info(f"Ingestion job {job_id} finished: {self.jobs.get(job_id)}")
+
+    def close(self) -> None:
+        """Shut down the extraction process pool."""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def list_directory(directory: str, pattern: str = ".pdf"):
+    """
+    List the documents of a server-side directory that may be ingested.
+
+    Args:
+        directory (str): directory relative to (or inside) ``settings.ingest_root``
+        pattern (str): file name suffix to select (default: ".pdf")
+
+    Returns:
+        list: sorted (display name, file path) pairs
+
+    Raises:
+        ValueError: if the directory is outside ``settings.ingest_root``
+    """
+    root = os.path.realpath(settings.ingest_root)
+    target = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, target]) != root:
+        raise ValueError(f"{directory} is outside of the ingestion root")
+    sources = []
+    for dirpath, _, filenames in os.walk(target):
+        for filename in filenames:
+            if filename.lower().endswith(pattern):
+                path = os.path.join(dirpath, filename)
+                sources.append((os.path.relpath(path, root), path))
+    return sorted(sources)
@@ -0,0 +1,91 @@
+"""
+Standalone ingestion worker for the production run mode.
+This module consumes the ingestion queue kept in the local shared store and runs the
+batch ingestion pipeline in its own process, away from the query API workers.
+
+Usage:
+    python -m services.ingestion_worker
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+from app.config import config
+from components.base_component import BaseComponent
+from services.document_store import DocumentStore
+from services.extractor import load_partition_pdf
+from services.ingestion_pipeline import IngestionPipeline
+from services.shared_state import get_shared_state
+from services.vectorDB import VectorDB
+from settings import settings
+
+
+class IngestionWorker(BaseComponent):
+    """
+    Queue consumer running ingestion jobs one at a time.
+
+    Claimed entries are kept alive with a heartbeat while their job runs; entries
+    whose heartbeat stopped (crashed worker) are put back in the queue for the next
+    worker to pick up.
+    """
+
+    def __init__(self):
+        """Connect to the stores the pipeline writes to."""
+        super().__init__(logger_name='IngestionWorker')
+        self.state = get_shared_state()
+        # the pipeline only needs the application state, not the FastAPI app itself
+        self.app = SimpleNamespace(state=SimpleNamespace(
+            vector_db=VectorDB(),
+            doc_store=DocumentStore(config.MONGO_URI),
+        ))
+        self.pipeline = IngestionPipeline(self.app)
+        # this process exists to extract documents, load the PDF stack before the first job
+        load_partition_pdf()
+
+    def _heartbeat(self, entry_id: int, done: threading.Event) -> None:
+        while not done.wait(settings.ingest_claim_timeout / 3):
+            self.state.heartbeat(entry_id)
+
+    def run(self) -> None:
+        """Process queue entries forever."""
+        self.logger.info("Ingestion worker started")
+        while True:
+            requeued = self.state.requeue_stale(settings.ingest_claim_timeout)
+            if requeued:
+                self.logger.info(f"Requeued {requeued} stale ingestion jobs")
+            self.state.maybe_cleanup()
+            entry = self.state.claim()
+            if entry is None:
+                time.sleep(settings.ingest_poll_interval)
+                continue
+
+            entry_id, job_id, payload = entry
+            done = threading.Event()
+            threading.Thread(target=self._heartbeat, args=(entry_id, done), daemon=True).start()
+            try:
+                sources = [tuple(source) for source in payload["sources"]]
+                self.pipeline.run(job_id, sources, payload.get("cleanup_dir"))
+            except Exception as e:
+                self.logger.error(f"Ingestion job {job_id} crashed: {e}")
+            finally:
+                done.set()
+                self.state.complete(entry_id)
+
+    def close(self) -> None:
+        """Release the pipeline and store connections."""
+        self.pipeline.close()
+        self.app.state.vector_db.client.close()
+        self.app.state.doc_store.close()
+
+
+def main():
+    worker = IngestionWorker()
+    try:
+        worker.run()
+    finally:
+        worker.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Priority scheduling of language model calls for the Multi-Modal RAG system.
+Every ``MLLM`` call is admitted by a process-wide scheduler before it reaches the Bedrock
+gateway. Calls belong to a priority class (interactive answers, debug endpoints, bulk
+summarization); free slots go to the highest class first and, within a class, round-robin
+across sessions, so a large ingestion or one busy session cannot starve the others.
+Interactive and debug calls whose expected queueing delay exceeds the latency SLO are
+shed at once with ``SchedulerBusyError``, which the API answers with a fast 503.
+"""
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from components.base_component import BaseComponent
+from services.metrics import metrics
+from settings import settings
+
+# priority classes, highest first
+PRIORITIES = ("interactive", "debug", "bulk")
+
+_priority = contextvars.ContextVar("llm_priority", default=None)
+_session = contextvars.ContextVar("llm_session", default=None)
+
+
+class SchedulerBusyError(Exception):
+    """Raised when a call is shed because its queue exceeds the latency SLO."""
+
+
+@contextmanager
+def request_scope(priority: str = None, session: str = None):
+    """
+    Set the priority class and session of the model calls made in this context.
+
+    Thread pools do not inherit the context, submit with ``contextvars.copy_context().run``
+    to keep it; calls made without a scope use the class of their task
+    (``settings.llm_task_priorities``).
+    """
+    priority_token = _priority.set(priority)
+    session_token = _session.set(session)
+    try:
+        yield
+    finally:
+        _priority.reset(priority_token)
+        _session.reset(session_token)
+
+
+def current_priority(task: str) -> str:
+    """Priority class of a call of ``task`` made in the current context."""
+    return _priority.get() or settings.llm_task_priorities.get(task, "bulk")
+
+
+def current_session() -> str:
+    """Session of the calls made in the current context, "" when unknown."""
+    return _session.get() or ""
+
+
+class _Ticket:
+    """One call waiting for, or holding, a slot."""
+
+    __slots__ = ("priority", "session", "event", "granted", "started")
+
+    def __init__(self, priority: str, session: str):
+        self.priority = priority
+        self.session = session
+        self.event = threading.Event()
+        self.granted = False
+        self.started = None
+
+
+class LLMScheduler(BaseComponent):
+    """
+    Admission control in front of the model calls of the process.
+
+    At most ``slots`` calls run at once and bulk calls never hold more than
+    ``bulk_slots`` of them, which keeps headroom for interactive traffic while an
+    ingestion runs. Waiting calls are queued per class and per session. The
+    expected wait of a new call is estimated from the calls queued ahead of it and
+    the average call duration; above ``settings.llm_latency_slo`` interactive and
+    debug calls are rejected instead of queued, and they never wait longer than
+    the SLO. Bulk calls are never shed.
+
+    Attributes:
+        slots (int): concurrent calls admitted
+        bulk_slots (int): concurrent bulk calls admitted
+        service_time (float): moving average of the call duration in seconds
+    """
+
+    def __init__(self, slots: int = None, bulk_slots: int = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            slots (int): concurrent calls (default: settings.llm_scheduler_slots)
+            bulk_slots (int): concurrent bulk calls (default: settings.llm_scheduler_bulk_slots)
+        """
+        super().__init__(logger_name='LLMScheduler')
+        self.slots = slots or settings.llm_scheduler_slots
+        self.bulk_slots = min(bulk_slots or settings.llm_scheduler_bulk_slots, self.slots)
+        self.service_time = settings.llm_scheduler_initial_service_time
+        self._running = {priority: 0 for priority in PRIORITIES}
+        # per class: session -> waiting tickets, in round-robin order
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._lock = threading.Lock()
+
+    def _free(self, priority: str) -> bool:
+        if sum(self._running.values()) >= self.slots:
+            return False
+        return priority != "bulk" or self._running["bulk"] < self.bulk_slots
+
+    def _queued(self, priority: str) -> int:
+        return sum(len(tickets) for tickets in self._queues[priority].values())
+
+    def _expected_wait(self, priority: str) -> float:
+        """Seconds a new call of ``priority`` should wait: calls ahead of it divided among the slots."""
+        ahead = sum(self._queued(p) for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+        return (ahead + 1) * self.service_time / self.slots
+
+    def _grant(self, ticket: _Ticket) -> None:
+        ticket.granted = True
+        ticket.started = time.monotonic()
+        self._running[ticket.priority] += 1
+        ticket.event.set()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the waiting calls, highest class first, sessions in turn."""
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._free(priority):
+                session, tickets = next(iter(queue.items()))
+                ticket = tickets.popleft()
+                # the session goes to the back of the round
+                del queue[session]
+                if tickets:
+                    queue[session] = tickets
+                self._grant(ticket)
+            if queue:
+                # lower classes only get the slots this one does not wait for
+                return
+
+    def _shed(self, priority: str, reason: str):
+        metrics.incr(f"scheduler.shed.{priority}")
+        return SchedulerBusyError(f"{priority} model call shed: {reason}")
+
+    def acquire(self, priority: str, session: str = "") -> _Ticket:
+        """
+        Wait for a slot.
+
+        Raises:
+            SchedulerBusyError: the call was shed (interactive and debug classes only)
+        """
+        ticket = _Ticket(priority, session)
+        st = time.monotonic()
+        with self._lock:
+            ahead = any(self._queues[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+            if not ahead and self._free(priority):
+                self._grant(ticket)
+            else:
+                if priority != "bulk":
+                    expected = self._expected_wait(priority)
+                    if expected > settings.llm_latency_slo:
+                        raise self._shed(priority, f"expected wait {expected:.1f}s")
+                self._queues[priority].setdefault(session, deque()).append(ticket)
+
+        timeout = None if priority == "bulk" else settings.llm_latency_slo
+        if not ticket.event.wait(timeout):
+            with self._lock:
+                if not ticket.granted:
+                    tickets = self._queues[priority][session]
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self._queues[priority][session]
+                    raise self._shed(priority, f"waited {timeout:.1f}s")
+
+        metrics.incr(f"scheduler.admitted.{priority}")
+        metrics.observe(f"scheduler.wait.{priority}", time.monotonic() - st)
+        return ticket
+
+    def release(self, ticket: _Ticket) -> None:
+        """Free the slot of a finished call and admit the next waiting ones."""
+        with self._lock:
+            self._running[ticket.priority] -= 1
+            elapsed = time.monotonic() - ticket.started
+            self.service_time += 0.1 * (elapsed - self.service_time)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, task: str):
+        """Hold a slot for one call of ``task`` in the priority class and session of the context."""
+        if not settings.llm_scheduling:
+            yield
+            return
+        ticket = self.acquire(current_priority(task), current_session())
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> dict:
+        """Running and queued calls per class, for the metrics endpoint."""
+        with self._lock:
+            return {
+                "running": dict(self._running),
+                "queued": {priority: self._queued(priority) for priority in PRIORITIES},
+                "service_time": round(self.service_time, 3),
+            }
+
+
+# Create a global scheduler shared by every model call of the process
+llm_scheduler = LLMScheduler()
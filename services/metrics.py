@@ -0,0 +1,60 @@
+"""
+In-process metrics registry for the Multi-Modal RAG system.
+This module keeps simple counters and timing aggregates that the services update
+and that the FastAPI application exposes through the /metrics endpoint.
+"""
+
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and timings.
+
+    Counters are plain running totals (``incr``); timings keep count, total and
+    maximum of the observed durations in seconds (``observe``).
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._timings = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        """Add ``value`` to the counter ``name``."""
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record one duration for the timing ``name``."""
+        with self._lock:
+            count, total, longest = self._timings.get(name, (0, 0.0, 0.0))
+            self._timings[name] = (count + 1, total + seconds, max(longest, seconds))
+
+    def get(self, name: str) -> float:
+        """Return the current value of the counter ``name``."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def mean(self, name: str) -> float:
+        """Return the average duration of the timing ``name``, 0.0 if never observed."""
+        with self._lock:
+            count, total, _ = self._timings.get(name, (0, 0.0, 0.0))
+        return total / count if count else 0.0
+
+    def snapshot(self) -> dict:
+        """Return a JSON-serializable copy of every counter and timing."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {
+                    name: {"count": count, "mean": total / count, "max": longest}
+                    for name, (count, total, longest) in self._timings.items()
+                },
+            }
+
+
+# Create a global metrics instance
+metrics = Metrics()
@@ -0,0 +1,90 @@
+"""
+Task-aware model routing for the Multi-Modal RAG system.
+This module maps every call site (query expansion, summaries, answers, ...) to the
+Bedrock model, token budget and temperature configured for it in ``settings.model_routes``,
+together with the fallback models to try when the primary one is throttled or times out.
+"""
+
+from dataclasses import dataclass, field
+from typing import List
+
+from settings import settings
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    Model selection for one task.
+
+    Attributes:
+        task (str): name of the task the route belongs to
+        model (str): primary Bedrock model id
+        max_tokens (int): maximum number of tokens of the response
+        temperature (float): sampling temperature
+        fallbacks (list): model ids tried in order when the primary model is unavailable
+    """
+    task: str
+    model: str
+    max_tokens: int
+    temperature: float
+    fallbacks: List[str] = field(default_factory=list)
+
+    @property
+    def models(self) -> List[str]:
+        """Primary model followed by the fallbacks."""
+        return [self.model] + [m for m in self.fallbacks if m != self.model]
+
+    def models_for(self, images: bool = False) -> List[str]:
+        """Models to try in order, without the text-only ones when the request carries images."""
+        if not images:
+            return self.models
+        return [m for m in self.models if m not in settings.text_only_models]
+
+
+class ModelRouter:
+    """
+    Resolves task names to ``Route`` objects.
+
+    Unknown tasks and missing keys fall back to the "default" route, which itself
+    falls back to the global ``MODEL_ID_SONNET_3_7`` / ``MAX_TOKENS`` / ``model_temp`` settings.
+    """
+
+    def __init__(self, routes=None):
+        """
+        Initialize the router.
+
+        Args:
+            routes (dict): task -> {"model", "max_tokens", "temperature", "fallbacks"}
+                (default: settings.model_routes)
+        """
+        self.routes = settings.model_routes if routes is None else routes
+
+    def route(self, task: str = "default") -> Route:
+        """
+        Return the route of a task.
+
+        Args:
+            task (str): call site name, e.g. "answer" or "query_expansion"
+
+        Returns:
+            Route: the resolved model selection
+        """
+        base = {
+            "model": settings.MODEL_ID_SONNET_3_7,
+            "max_tokens": settings.MAX_TOKENS,
+            "temperature": settings.model_temp,
+            "fallbacks": [],
+        }
+        base.update(self.routes.get("default", {}))
+        base.update(self.routes.get(task, {}))
+        return Route(
+            task=task,
+            model=base["model"],
+            max_tokens=int(base["max_tokens"]),
+            temperature=float(base["temperature"]),
+            fallbacks=list(base["fallbacks"]),
+        )
+
+
+# Create a global router instance
+model_router = ModelRouter()
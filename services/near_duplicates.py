@@ -0,0 +1,54 @@
+"""
+Near-duplicate detection for the Multi-Modal RAG system.
+This module computes 64-bit SimHash fingerprints of chunk texts, compared during result
+merging so the prompt slots go to distinct content, and the normalized text keys used at
+ingest time to collapse exact repeats (boilerplate) in the index. Near-duplicates are not
+collapsed in the index: a revised figure or a templated page with other numbers is only
+a few SimHash bits away from the original and must stay searchable.
+"""
+
+import hashlib
+import re
+
+WORD_REGEX = re.compile(r"\w+")
+
+FINGERPRINT_BITS = 64
+
+
+def _feature_hash(feature: str) -> int:
+    """Stable 64-bit hash of a shingle (Python's ``hash`` is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str, shingle_size: int = 2) -> int:
+    """
+    64-bit SimHash of a text over its word shingles.
+
+    Texts differing by a few words get fingerprints differing by a few bits.
+    """
+    words = WORD_REGEX.findall((text or "").lower())
+    if len(words) >= shingle_size:
+        features = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    else:
+        features = words
+    weights = [0] * FINGERPRINT_BITS
+    for feature in features:
+        h = _feature_hash(feature)
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits of two fingerprints."""
+    return bin(a ^ b).count("1")
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case a text and collapse its whitespace, digits and punctuation are kept."""
+    return " ".join((text or "").lower().split())
+
+
+def text_key(text: str) -> str:
+    """Key of the normalized text: equal for chunks repeated verbatim up to case and spacing."""
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
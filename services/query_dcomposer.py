@@ -5,11 +5,11 @@ and generate alternative phrasings for improved information retrieval.
 """
 
 from .bedrock import MLLM
+from .structured_output import QueryExpansion, StructuredOutputError, parse_structured
 from components.base_component import BaseComponent
-from app.prompt import query_expansion_prompt
-import ast
-
-from .guardrails import GuardrailsService
+from app.prompt import query_expansion_prompt, query_expansion_system, query_expansion_user
+from .guardrails import GuardrailsService, REFUSAL_MESSAGE
+from .safety_screen import SafetyScreen
 
 
 class Query_decomposer(BaseComponent):
@@ -31,40 +31,66 @@ class Query_decomposer(BaseComponent):
         super().__init__(logger_name='Query_decomposer')
         self.queries = ""
         self.rails = GuardrailsService()
-        self.model = MLLM()
+        self.model = MLLM(task="query_expansion")
 
-    def run(self, query):
+    def run(self, query, verdict=None):
         """
         Process a query to generate expanded and decomposed versions.
         
         This method:
         1. Takes a complex query as input
-        2. Uses the language model to generate alternative phrasings
-        3. Parses the response into a list of queries
+        2. Uses the language model to generate alternative phrasings, going through
+           the Guardrails LLM rail only when the local safety pre-screen escalates
+        3. Gets the queries as a validated ``QueryExpansion`` (forced tool call, local
+           repair, bounded re-ask, see ``MLLM.run_structured``)
         4. Returns the expanded query set
         
         Args:
             query (str): The original query to process
+            verdict (str): ``SafetyScreen`` verdict of the query when the caller already
+                ran the pre-screen
             
         Returns:
-            list: List of expanded and decomposed queries
-            
+            list: List of expanded and decomposed queries, ``[REFUSAL_MESSAGE]`` when the
+                query was refused (see ``is_refusal``)
+
         Note:
-            The response from the language model is expected to be a valid Python list
-            representation that can be parsed using ast.literal_eval.
+            When no valid query list can be obtained the original query is returned
+            alone, so the search still runs on the raw question.
         """
         # Generate expanded queries using the language model
         content = [{"type": "text", "text": query_expansion_prompt.format(query=query)}]
 
-        self.queries = self.rails.run(content)
-
-        # Parse the response into a list of queries
-        try:
-            expanded_queries = ast.literal_eval(self.queries)
-        except Exception as e:
-            self.logger.error(f"Failed to parse queries: {self.queries}")
-            expanded_queries = [self.queries]
+        # tiered safety: only questions the rail already judged skip the LLM rail
+        verdict = verdict or self.rails.screen.run(query)
+        if verdict == SafetyScreen.SAFE:
+            user_content = [{"type": "text", "text": query_expansion_user.format(query=query)}]
+            try:
+                expanded_queries = self.model.run_structured(
+                    user_content, QueryExpansion, system=query_expansion_system, tool_name="search_queries"
+                ).queries
+            except StructuredOutputError:
+                expanded_queries = [query]
+        elif verdict == SafetyScreen.UNSAFE:
+            expanded_queries = [REFUSAL_MESSAGE]
+        else:
+            self.queries = self.rails.run(content, question=query)
+            if self.rails.blocked:
+                # stopped by a rail, or the rails failed: fail closed like ``check_input``
+                expanded_queries = [REFUSAL_MESSAGE]
+            else:
+                # the rails answer in text, the model text is never shown to the user
+                try:
+                    expanded_queries = parse_structured(self.queries, QueryExpansion).queries
+                except StructuredOutputError:
+                    self.logger.error(f"Failed to parse queries: {self.queries}")
+                    expanded_queries = [query]
         self.logger.info(f'{expanded_queries}')
         
         return expanded_queries
 
+
+def is_refusal(queries) -> bool:
+    """True when ``Query_decomposer.run`` refused the query instead of returning queries to search."""
+    return list(queries) == [REFUSAL_MESSAGE]
+
@@ -3,18 +3,57 @@ Content‑retrieval service for the Multi‑Modal RAG system.
 Now chat‑aware: keeps conversation history per session_id.
 """
 
-import json, traceback, datetime
+import contextvars, re, time, traceback, datetime
 from base64 import b64decode
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import weaviate
 import weaviate.classes.query as wq
 from components.base_component import BaseComponent
-from services.bedrock import MLLM
-from app.prompt import user_query_prompt
+from services.bedrock import MLLM, cache_point
+from services.bedrock_client import BedrockUnavailableError
+from services.guardrails import REFUSAL_MESSAGE
+from services.image_describer import lazy_image_describer
+from services.llm_scheduler import SchedulerBusyError
+from services.metrics import metrics
+from services.near_duplicates import hamming, simhash
+from services.query_dcomposer import is_refusal
+from services.safety_screen import SafetyScreen
+from services.search_cache import search_cache
+from services.structured_output import Answer
+from services.table_index import match_rows, render_rows, table_rows
+from app.prompt import user_query_prompt, user_query_system
 from settings import settings
 
+# shared pool for the speculative pipeline (decomposition + history lookups)
+_speculation_pool = ThreadPoolExecutor(
+    max_workers=settings.speculative_workers, thread_name_prefix="speculative"
+)
+
+
+# identifiers such as part numbers or codes: tokens mixing letters and digits, or numbers longer than a year
+IDENTIFIER_REGEX = re.compile(r"\b(?=[\w./-]*\d)(?=[\w./-]*[a-zA-Z])[\w./-]{3,}\b|\b\d{5,}\b")
+QUOTED_REGEX = re.compile(r'"([^"]{2,})"')
+
+FUSION_TYPES = {"ranked": wq.HybridFusion.RANKED, "relative_score": wq.HybridFusion.RELATIVE_SCORE}
+
+
 #  Helpers
+def keyword_query(query: str) -> bool:
+    """
+    Tell whether a query is a keyword lookup that BM25 answers better than the vector search.
+
+    Exact phrases in double quotes, and short queries made mostly of identifiers
+    (part numbers, codes, ids) qualify.
+    """
+    if QUOTED_REGEX.search(query):
+        return True
+    words = query.split()
+    identifiers = IDENTIFIER_REGEX.findall(query)
+    return bool(identifiers) and len(words) <= settings.search_keyword_max_words
+
+
 def build_prompt(
     chat_history: str,
     text_context: List[str],
@@ -29,20 +68,22 @@ def build_prompt(
     image_context –list of base‑64 PNG strings
     question –current user question
     """
-    # prepend conversation memory
-    prompt_text = f"Conversation so far:\n{chat_history}\n\n"
+    # conversation memory first, right after the static system prompt, so that
+    # system prompt + history form the cacheable prefix of the request
+    content = [{"type": "text", "text": f"Conversation so far:\n{chat_history}\n\n", **cache_point()}]
 
     #  add retrieved text context
+    prompt_text = ""
     if text_context:
         prompt_text += "Document context:\n"
         prompt_text += "\n".join(text_context)
 
     #  add the template with the current question
     prompt = user_query_prompt.format(
-        context_text=prompt_text,  # already included above
+        context_text=prompt_text,
         user_question=question,
     )
-    content = [{"type": "text", "text": prompt}]
+    content.append({"type": "text", "text": prompt})
 
     #  attach images
     for img in image_context:
@@ -77,93 +118,332 @@ class Retriever(BaseComponent):
         self.history_limit = history_limit
 
         # Bedrock LLM wrapper
-        self.model = MLLM()
+        self.model = MLLM(task="answer")
         self.doc_store = self.app.state.doc_store  # MongoDB client
+        # set by ``answer`` when the turn was stored in the chat history
+        self.answered = False
 
 
+    def search(self, queries: List[str], reference_docs: Optional[Dict] = None) -> Dict:
+        """
+        Run a hybrid search for every query and collect the hits above the score threshold.
 
-    def run(self, question : str, queries: List[str]):
+        Args:
+            queries: list of (decomposed) queries to search for
+            reference_docs: optional dict of hits from an earlier search to merge into
+
+        Returns:
+            dict: uuid -> {"text", "score"} for every unique relevant object
+
+        Hits of each query are served from ``search_cache`` while the collection
+        version is unchanged. Keyword-like queries take the BM25-only fast path
+        (``settings.search_bm25_fast_path``), which skips the query embedding.
         """
-        • queries == list from Query_decomposer
-        • question == original user question (for history + prompt)
+        reference_docs = {} if reference_docs is None else reference_docs
+        client: weaviate.Client = self.app.state.vector_db.client
+        collection = client.collections.get("DocumentCollection")
+        params = {
+            "limit": settings.search_limit,
+            "alpha": settings.search_alpha,
+            "fusion": settings.search_fusion,
+            "properties": settings.search_query_properties,
+            "bm25_fast_path": settings.search_bm25_fast_path,
+            "bm25_reference_score": settings.search_bm25_reference_score,
+            "score_threshold": settings.score_threshold,
+        }
+        version = search_cache.version(self.doc_store, "DocumentCollection")
+
+        # hybrid search for every decomposed query
+        for q in queries:
+            key = search_cache.key(q, params, version)
+            hits = search_cache.get(key, self.doc_store)
+            if hits is None:
+                hits = self._query(collection, q)
+                search_cache.put(key, hits, self.doc_store)
+            for uuid, text, raw_score in hits:
+                score = float(f"{raw_score:.3f}")
+                # thresholding the score to 0.7 to find the most relevant documents
+                if score >= settings.score_threshold:
+                    # setdefault ensures unique UUIDs only once
+                    reference_docs.setdefault(
+                        uuid,
+                        {
+                            "text": text,
+                            "score": f"{score:.3f}",
+                        },
+                    )
+        return reference_docs
+
+    def _query(self, collection, query: str) -> List[Tuple[str, str, float]]:
+        """
+        Search one query, with BM25 only when it looks like a keyword lookup, hybrid otherwise.
+
+        BM25 scores are unbounded, so they are put on a fixed scale on which a raw score
+        of ``settings.search_bm25_reference_score`` lands on ``settings.score_threshold``
+        (capped at 1.0): weak lexical matches are filtered like weak hybrid hits, and the
+        best hit of a query is not promoted to 1.0. Quoted phrases must appear verbatim
+        in the hits.
+
+        Returns:
+            list: (uuid, text, score) hits
+        """
+        st = time.perf_counter()
+        if settings.search_bm25_fast_path and keyword_query(query):
+            self.logger.info(f"BM25 search for keyword query: {query}")
+            res = collection.query.bm25(
+                query=query.replace('"', " "),
+                query_properties=settings.search_query_properties,
+                limit=settings.search_limit,
+                return_metadata=wq.MetadataQuery(score=True),
+            )
+            phrases = [phrase.lower() for phrase in QUOTED_REGEX.findall(query)]
+            objects = [
+                obj for obj in res.objects
+                if all(phrase in (obj.properties["text"] or "").lower() for phrase in phrases)
+            ]
+            if objects:
+                scale = settings.score_threshold / settings.search_bm25_reference_score
+                metrics.incr("search.bm25_fast_path")
+                metrics.observe("search.bm25", time.perf_counter() - st)
+                return [
+                    (str(obj.uuid), obj.properties["text"], min((obj.metadata.score or 0.0) * scale, 1.0))
+                    for obj in objects
+                ]
+            # nothing matched lexically, let the vector search try
+
+        self.logger.info(f"Hybrid search for query: {query}")
+        res = collection.query.hybrid(
+            query=query,
+            alpha=settings.search_alpha,
+            fusion_type=FUSION_TYPES[settings.search_fusion],
+            query_properties=settings.search_query_properties,
+            limit=settings.search_limit,
+            return_metadata=wq.MetadataQuery(score=True),
+        )
+        metrics.incr("search.hybrid")
+        metrics.observe("search.hybrid", time.perf_counter() - st)
+        return [(str(obj.uuid), obj.properties["text"], obj.metadata.score) for obj in res.objects]
+
+    def load_history(self) -> str:
+        """Return the formatted chat history of the current session."""
+        return self.doc_store.get_chat_history(self.session_id, self.history_limit)
+
+    @staticmethod
+    def top_score(reference_docs: Dict) -> float:
+        """Best score among the collected hits, 0.0 when nothing was found."""
+        return max((float(ref["score"]) for ref in reference_docs.values()), default=0.0)
+
+    def select_context(self, question: str, reference_docs: Dict, describe_images: bool = True):
+        """
+        Rank the collected hits and turn the top ones into prompt context.
+
+        Args:
+            question: original user question (used to pick matching table rows)
+            reference_docs: hits collected by ``search``
+            describe_images: schedule the description of lazily indexed images
+
+        Returns:
+            tuple: (text context, base64 image context, references for the response)
         """
         image_context, text_context, user_refs = [], [], []
-        llm_response = {"status": 1, "answer": ""}
+        #  ranking the  fetched context on the basis of the score
+        sorted_reference_docs = dict(
+            sorted(reference_docs.items(), key=lambda x: float(x[1]["score"]), reverse=True)
+        )
 
-        try:
-            client: weaviate.Client = self.app.state.vector_db.client
-            collection = client.collections.get("DocumentCollection")
+        self.logger.info(f"Hybrid search results: {sorted_reference_docs}")
+        # fetch metadata / raw content from MongoDB, keeping the top results;
+        # children of the same parent chunk count once (small-to-big retrieval)
+        seen_parents = set()
+        fingerprints = []  # SimHash of the text contexts kept so far
+        table_hits = {}  # table_id -> (text_context slot, matched row ranges)
+        for uuid, ref in sorted_reference_docs.items():
+            if len(user_refs) >= settings.ranking_limit:
+                break
+            meta = self.doc_store.get_metadata(str(uuid))
+            self.logger.info(f"Retrieved metadata for {uuid}: {meta}")
+            if "image" in meta["metadata"]:
+                # it's an image
+                try:
+                    b64decode(meta["metadata"]["image"])
+                    image_context.append(meta["metadata"]["image"])
+                except Exception:
+                    self.logger.error("Bad image b64", exc_info=True)
+                if meta["metadata"].get("described") is False and describe_images:
+                    lazy_image_describer.schedule(self.app, str(uuid), meta["metadata"]["image"])
+                page = meta["metadata"]["metadata"]["page_number"]
+            elif "row_start" in meta["metadata"]:
+                # table row group: the rows matching the question replace it below
+                row_range = (meta["metadata"]["row_start"], meta["metadata"]["row_end"])
+                tid = meta["metadata"]["table_id"]
+                if tid in table_hits:
+                    table_hits[tid][1].append(row_range)
+                    continue
+                table_hits[tid] = (len(text_context), [row_range])
+                text_context.append(ref["text"])
+                page = meta["metadata"]["page_number"]
+            else:
+                # plain text, replaced by its whole parent section when it has one
+                parent_id = meta["metadata"].get("parent_id")
+                if parent_id is not None:
+                    if parent_id in seen_parents:
+                        continue
+                    seen_parents.add(parent_id)
+                context = meta["metadata"].get("parent_text") or ref["text"]
+                if settings.near_dup_detection:
+                    # the fingerprint computed at ingest covers the chunk text, not its parent
+                    if meta.get("simhash") and not meta["metadata"].get("parent_text"):
+                        fingerprint = int(meta["simhash"], 16)
+                    else:
+                        fingerprint = simhash(context)
+                    if any(hamming(fingerprint, kept) <= settings.near_dup_max_distance for kept in fingerprints):
+                        metrics.incr("retriever.near_duplicates_dropped")
+                        continue
+                    fingerprints.append(fingerprint)
+                text_context.append(context)
+                page = meta["metadata"]["page_number"]
 
-            # hybrid search for every decomposed query
-            reference_docs = {}
-            for q in queries:
-                self.logger.info(f"Hybrid search for query: {q}")
-                res = collection.query.hybrid(
-                    query=q, limit=settings.search_limit, return_metadata=wq.MetadataQuery(score=True)
-                )
-                for obj in res.objects:
-                    score = float(f"{obj.metadata.score:.3f}")
-                    # thresholding the score to 0.7 to find the most relevant documents
-                    if score >= settings.score_threshold:
-                        # setdefault ensures unique UUIDs only once
-                        reference_docs.setdefault(
-                            obj.uuid,
-                            {
-                                "text": obj.properties["text"],
-                                "score": f"{score:.3f}",
-                            },
-                        )
-            #  ranking the  fetched context on the basis of the score
-            sorted_reference_docs = dict(
-                sorted(reference_docs.items(), key=lambda x: float(x[1]["score"]), reverse=True)
+            user_refs.append(
+                {
+                    "id": str(uuid),
+                    "kind": "image" if "image" in meta["metadata"] else "text",
+                    "page_no": page,
+                    "text": ref["text"],
+                    "score": ref["score"],
+                }
             )
 
-            #  keep only the top 3 results
-            reference_docs = dict(list(sorted_reference_docs.items())[:settings.ranking_limit])
-
-            self.logger.info(f"Hybrid search results: {reference_docs}")
-            # fetch metadata / raw content from MongoDB
-            for uuid, ref in reference_docs.items():
-                meta = self.doc_store.get_metadata(str(uuid))
-                self.logger.info(f"Retrieved metadata for {uuid}: {meta}")
-                if "image" in meta["metadata"]:
-                    # it's an image
-                    try:
-                        b64decode(meta["metadata"]["image"])
-                        image_context.append(meta["metadata"]["image"])
-                    except Exception:
-                        self.logger.error("Bad image b64", exc_info=True)
-                    page = meta["metadata"]["metadata"]["page_number"]
-                else:
-                    # plain text
-                    text_context.append(ref["text"])
-                    page = meta["metadata"]["page_number"]
-
-                user_refs.append(
-                    {
-                        "page_no": page,
-                        "text": ref["text"],
-                        "score": ref["score"],
-                    }
-                )
+        if table_hits:
+            self._inject_table_rows(question, table_hits, text_context)
+
+        return text_context, image_context, user_refs
+
+    def answer(self, question: str, reference_docs: Dict, chat_history: str):
+        """
+        Rank the collected hits, build the prompt and ask the LLM.
+
+        Args:
+            question: original user question (for history + prompt)
+            reference_docs: hits collected by ``search``
+            chat_history: formatted history returned by ``load_history``
+        """
+        llm_response = {"status": 1, "answer": ""}
+        user_refs, image_context = [], []
+
+        try:
+            text_context, image_context, user_refs = self.select_context(question, reference_docs)
 
             # build prompt (includes chat history)
-            chat_history = self.doc_store.get_chat_history(self.session_id, self.history_limit)
             prompt = build_prompt(chat_history, text_context, image_context, question)
             self.logger.info(f"prompt={prompt}")
-            # hit the LLM
-            raw = self.model.run(prompt)
-            self.logger.info(f"raw response={raw}")
-            llm_response = json.loads(raw)
+            # hit the LLM, the answer comes back as a validated {"status", "answer"} object
+            result = self.model.run_structured(prompt, Answer, system=user_query_system, tool_name="answer")
+            self.logger.info(f"response={result}")
+            llm_response = result.model_dump()
 
             #  storing the chat history
             if llm_response["status"] == 1:
                 self.doc_store.store_chat(question, llm_response["answer"],self.session_id)
+                self.answered = True
             else:
                 # irrelevant: ignore refs/ctx
                 user_refs, image_context = [], []
 
+        except (BedrockUnavailableError, SchedulerBusyError):
+            # surfaced as a 503 by the API instead of an empty answer
+            raise
         except Exception:
             self.logger.error("Retriever failure", exc_info=True)
 
         return llm_response["answer"], user_refs, image_context
+
+    def _inject_table_rows(self, question: str, table_hits: Dict, text_context: List[str]) -> None:
+        """Replace the retrieved row groups of every table by its rows matching the question."""
+        tables = self.doc_store.get_tables(list(table_hits))
+        for tid, (slot, ranges) in table_hits.items():
+            table = tables.get(tid)
+            if table is None:
+                continue
+            rows = match_rows(question, table, ranges, settings.table_max_prompt_rows)
+            selected = [table_rows(table, i, i + 1)[0] for i in rows]
+            text_context[slot] = "Table rows:\n" + render_rows(table["columns"], selected)
+
+    def run(self, question : str, queries: List[str]):
+        """
+        • queries == list from Query_decomposer
+        • question == original user question (for history + prompt)
+        """
+        try:
+            reference_docs = self.search(queries)
+            chat_history = self.load_history()
+        except Exception:
+            self.logger.error("Retriever failure", exc_info=True)
+            return "", [], []
+        return self.answer(question, reference_docs, chat_history)
+
+    @staticmethod
+    def _decompose_async(decomposer, question: str, verdict: str):
+        """Start the decomposition of ``question`` on the speculation pool."""
+        # the decomposition keeps the priority class and session of the request
+        return _speculation_pool.submit(contextvars.copy_context().run, decomposer.run, question, verdict)
+
+    def run_speculative(self, question: str, decomposer):
+        """
+        Pipelined variant of ``run`` that does not wait for the decomposition to start searching.
+
+        The hybrid search on the raw question and the chat-history lookup run while
+        ``decomposer`` is still talking to the LLM; the decomposed queries are searched
+        and merged in once they arrive. The safety pre-screen runs once, up front, and
+        its verdict is handed to the decomposition or the safety check.
+
+        With ``settings.speculative_skip_decomposition`` enabled, a raw-question hit
+        scoring at least ``settings.speculative_skip_score`` answers straight away. The
+        decomposition is then only started once the raw hits turned out too weak, so a
+        skipped request makes no decomposition call, and its safety check only calls
+        the input rail when the pre-screen escalated: never more model calls than ``run``.
+
+        Args:
+            question: original user question
+            decomposer: ``Query_decomposer`` instance used for expansion and safety checks
+
+        Returns:
+            tuple: (answer, context references, context images), like ``run``
+        """
+        verdict = decomposer.rails.screen.run(question)
+        if verdict == SafetyScreen.UNSAFE:
+            return REFUSAL_MESSAGE, [], []
+        skippable = settings.speculative_skip_decomposition
+        decomposition = None if skippable else self._decompose_async(decomposer, question, verdict)
+        history = _speculation_pool.submit(self.load_history)
+
+        try:
+            reference_docs = self.search([question])
+        except Exception:
+            self.logger.error("Speculative search failure", exc_info=True)
+            reference_docs = {}
+
+        top_score = self.top_score(reference_docs)
+        if skippable and top_score >= settings.speculative_skip_score:
+            self.logger.info(f"Skipping decomposition, raw question scored {top_score:.3f}")
+            metrics.incr("retriever.decomposition_skipped")
+            if not decomposer.rails.check_input(question, verdict=verdict):
+                return REFUSAL_MESSAGE, [], []
+        else:
+            if decomposition is None:
+                decomposition = self._decompose_async(decomposer, question, verdict)
+            queries = decomposition.result()
+            if is_refusal(queries):
+                # guardrails refusal, same as the serial flow
+                return queries[0], [], []
+            try:
+                self.search([q for q in queries if q != question], reference_docs)
+            except Exception:
+                self.logger.error("Retriever failure", exc_info=True)
+                return "", [], []
+
+        try:
+            chat_history = history.result()
+        except Exception:
+            self.logger.error("Retriever failure", exc_info=True)
+            return "", [], []
+        return self.answer(question, reference_docs, chat_history)
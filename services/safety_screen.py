@@ -0,0 +1,130 @@
+"""
+Local safety pre-screen for user questions.
+This module provides the cheap tier of the safety pipeline that runs before the
+LLM-based Nemo Guardrails check: a cache of the verdicts the LLM rail gave for
+earlier inputs. Only a question the rail already judged is decided locally, every
+new question goes to the rail; no local rule ever clears a question on its own.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from components.base_component import BaseComponent
+from services.metrics import metrics
+from services.shared_state import get_shared_state
+from settings import settings
+
+
+class SafetyScreen(BaseComponent):
+    """
+    Verdict cache that runs before the Guardrails LLM check.
+
+    The normalized question is looked up in a bounded LRU cache of the verdicts
+    recorded from the LLM rail, then in the local shared store when it is enabled,
+    so verdicts are shared by every API worker. A question without a cached
+    verdict is escalated to the rail.
+
+    Attributes:
+        SAFE (str): verdict for questions the LLM rail let through before
+        UNSAFE (str): verdict for questions previously blocked by the LLM rail
+        ESCALATE (str): verdict for questions that need the LLM rail
+    """
+
+    SAFE = "safe"
+    UNSAFE = "unsafe"
+    ESCALATE = "escalate"
+
+    def __init__(self, cache_size: int = None, cache_ttl: float = None):
+        """
+        Initialize the pre-screen.
+
+        Args:
+            cache_size (int): maximum number of cached verdicts (default: settings.safety_cache_size)
+            cache_ttl (float): seconds a cached verdict stays valid (default: settings.safety_cache_ttl)
+        """
+        super().__init__(logger_name='SafetyScreen')
+        self.cache_size = cache_size or settings.safety_cache_size
+        self.cache_ttl = cache_ttl or settings.safety_cache_ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.state = get_shared_state()
+
+    @staticmethod
+    def _key(question: str) -> str:
+        """Cache key of a question: hash of the lower-cased, whitespace-collapsed text."""
+        normalized = " ".join(question.lower().split()).rstrip(" ?!.")
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str):
+        """Return the cached verdict for ``key`` or None if absent or expired."""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                verdict, stored_at = entry
+                if time.time() - stored_at <= self.cache_ttl:
+                    self._cache.move_to_end(key)
+                    return verdict
+                del self._cache[key]
+        if self.state is not None:
+            verdict = self.state.get(f"safety:{key}")
+            if verdict is not None:
+                self._remember(key, verdict)
+            return verdict
+        return None
+
+    def _remember(self, key: str, verdict: str) -> None:
+        """Store a verdict in the in-process LRU."""
+        with self._lock:
+            self._cache[key] = (verdict, time.time())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def record(self, question: str, safe: bool) -> None:
+        """
+        Cache the verdict of the LLM rail for a question.
+
+        Args:
+            question (str): the user question that was checked
+            safe (bool): whether the rail let the question through
+        """
+        key = self._key(question)
+        verdict = self.SAFE if safe else self.UNSAFE
+        self._remember(key, verdict)
+        if self.state is not None:
+            try:
+                self.state.set(f"safety:{key}", verdict, ttl=self.cache_ttl)
+            except Exception as e:
+                self.logger.error(f"Shared safety verdict write failed: {e}")
+
+    def run(self, question: str) -> str:
+        """
+        Screen a question locally.
+
+        Args:
+            question (str): the raw user question
+
+        Returns:
+            str: one of ``SAFE``, ``UNSAFE`` or ``ESCALATE``
+        """
+        st = time.perf_counter()
+        verdict = self._lookup(self._key(question))
+        if verdict is not None:
+            tier = "cache"
+        else:
+            tier, verdict = "escalated", self.ESCALATE
+
+        metrics.incr(f"guardrails.tier.{tier}")
+        metrics.observe("guardrails.prescreen", time.perf_counter() - st)
+        if verdict != self.ESCALATE:
+            # every local decision saves one input-rail round trip
+            saved = metrics.mean("guardrails.input_rail") or settings.safety_rail_latency_estimate
+            metrics.incr("guardrails.latency_saved_seconds", saved)
+        self.logger.info(f"Safety pre-screen tier={tier} verdict={verdict}")
+        return verdict
+
+
+# Create a global pre-screen instance so cached verdicts survive across requests
+safety_screen = SafetyScreen()
@@ -0,0 +1,141 @@
+"""
+Hybrid search result cache for the Multi-Modal RAG system.
+This module caches the results of ``collection.query.hybrid`` per normalized sub-query,
+search parameters and collection version, so popular sub-queries produced by the
+decomposer never hit Weaviate twice between two ingests.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from components.base_component import BaseComponent
+from services.metrics import metrics
+from settings import settings
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case a query, collapse whitespace and drop trailing punctuation."""
+    return " ".join(query.lower().split()).rstrip(" ?!.")
+
+
+class SearchCache(BaseComponent):
+    """
+    Two-tier cache of hybrid search hits.
+
+    The first tier is an in-process LRU bounded both by number of entries and by
+    the total size of the cached texts. The optional second tier is a MongoDB
+    collection shared by every process (``settings.search_cache_shared``).
+    Entries are keyed by the collection version, which ``VectorDB.run`` bumps after
+    every ingest and the lazy image describer after every description, so stale
+    results are simply never looked up again, by any process.
+
+    Attributes:
+        max_entries (int): maximum number of cached queries
+        max_bytes (int): maximum total size of the cached hit texts
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int): entry bound (default: settings.search_cache_max_entries)
+            max_bytes (int): size bound (default: settings.search_cache_max_bytes)
+        """
+        super().__init__(logger_name='SearchCache')
+        self.max_entries = max_entries or settings.search_cache_max_entries
+        self.max_bytes = max_bytes or settings.search_cache_max_bytes
+        self._entries = OrderedDict()  # key -> (hits, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._versions = {}  # collection -> (version, read at)
+
+    @staticmethod
+    def key(query: str, params: dict, version: int) -> str:
+        """Cache key of a normalized query, its search parameters and the collection version."""
+        raw = json.dumps([normalize_query(query), params, version], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def version(self, doc_store, collection: str) -> int:
+        """
+        Current version of a collection, re-read from MongoDB at most every
+        ``settings.search_cache_version_ttl`` seconds.
+        """
+        with self._lock:
+            cached = self._versions.get(collection)
+        if cached and time.time() - cached[1] < settings.search_cache_version_ttl:
+            return cached[0]
+        version = doc_store.get_collection_version(collection)
+        with self._lock:
+            self._versions[collection] = (version, time.time())
+        return version
+
+    def bump(self, doc_store, collection: str) -> int:
+        """Invalidate every cached result of a collection by bumping its version."""
+        version = doc_store.bump_collection_version(collection)
+        with self._lock:
+            self._versions[collection] = (version, time.time())
+        metrics.incr("search_cache.invalidations")
+        return version
+
+    def get(self, key: str, doc_store=None):
+        """
+        Look a key up in memory, then in the shared tier.
+
+        Returns:
+            list: cached hits as (uuid, text, score) tuples, None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            metrics.incr("search_cache.hits")
+            return entry[0]
+
+        if settings.search_cache_shared and doc_store is not None:
+            hits = doc_store.get_cached_search(key)
+            if hits is not None:
+                metrics.incr("search_cache.shared_hits")
+                hits = [tuple(hit) for hit in hits]
+                self._store(key, hits)
+                return hits
+
+        metrics.incr("search_cache.misses")
+        return None
+
+    def put(self, key: str, hits, doc_store=None) -> None:
+        """Cache the hits of a query in memory and, if enabled, in the shared tier."""
+        self._store(key, hits)
+        if settings.search_cache_shared and doc_store is not None:
+            try:
+                doc_store.put_cached_search(key, [list(hit) for hit in hits])
+            except Exception as e:
+                self.logger.error(f"Shared search cache write failed: {e}")
+
+    def clear(self) -> None:
+        """Drop every in-process entry and cached collection version."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._versions.clear()
+
+    def _store(self, key: str, hits) -> None:
+        """Insert into the in-process LRU and evict down to the bounds."""
+        size = sum(len((hit[1] or "").encode("utf-8")) for hit in hits) + 64
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (hits, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                metrics.incr("search_cache.evictions")
+
+
+# Create a global cache instance shared by all requests
+search_cache = SearchCache()
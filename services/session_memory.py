@@ -0,0 +1,283 @@
+"""
+Per-session conversation memory for the Multi-Modal RAG system.
+This module keeps, for every chat session, a rolling compressed summary of the older
+turns plus the most recent turns verbatim, so the history part of the prompt stays
+bounded however long the conversation gets.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.prompt import chat_summary_prompt, chat_summary_system
+from components.base_component import BaseComponent
+from settings import settings
+
+
+class _SessionState:
+    """In-process memory of a single session."""
+
+    def __init__(self, session_id, summary="", summarized_until=None, turns=None):
+        self.session_id = session_id
+        self.summary = summary
+        self.summarized_until = summarized_until
+        self.turns = turns or []  # [(question, answer, timestamp)], oldest first
+        self.pending = []  # turns pushed out of the window, not yet folded into the summary
+        self.compressing = False
+        self.folding_until = None  # timestamp of the last turn of the compression in flight
+        self.evicted = False  # dropped from the cache, every pending turn is folded
+        self.touched = time.time()
+        self.lock = threading.Lock()
+
+
+class SessionMemory(BaseComponent):
+    """
+    Rolling summary + recent-turns memory, cached in process with per-session eviction.
+
+    The memory is updated incrementally from ``DocumentStore.store_chat``: new turns are
+    appended to the recent window, turns pushed out of the window are folded into the
+    summary by the LLM in a background thread, and the summary is persisted so a
+    session evicted from the cache (or served by another process) can be reloaded.
+
+    In the production run mode the requests of a session are spread over several
+    worker processes, so the cached state is refreshed from MongoDB on every access:
+    only the compressions are shared, through the persisted summary.
+
+    Attributes:
+        doc_store: DocumentStore used to load turns and persist summaries
+        recent_turns (int): number of question/answer pairs kept verbatim
+        max_sessions (int): sessions kept in the in-process cache
+        idle_ttl (float): seconds after which an idle session is evicted
+    """
+
+    def __init__(self, doc_store):
+        """
+        Initialize the memory.
+
+        Args:
+            doc_store: DocumentStore instance backing the memory
+        """
+        super().__init__(logger_name='SessionMemory')
+        self.doc_store = doc_store
+        self.recent_turns = settings.memory_recent_turns
+        self.max_sessions = settings.memory_max_sessions
+        self.idle_ttl = settings.memory_idle_ttl
+        # other processes write the same sessions, the cache cannot be trusted as is
+        self.refresh = settings.run_mode == "production"
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-memory")
+        self._model = None
+
+    @property
+    def model(self):
+        """Language model used for compression, created on first use."""
+        if self._model is None:
+            from services.bedrock import MLLM
+            self._model = MLLM(task="chat_summary")
+        return self._model
+
+    @staticmethod
+    def _clip(text: str, limit: int) -> str:
+        """Truncate ``text`` to ``limit`` characters."""
+        return text if len(text) <= limit else text[:limit].rstrip() + " …"
+
+    def _evict(self):
+        """Drop idle sessions and the least recently used ones above ``max_sessions``."""
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for session_id in list(self._sessions):
+                if now - self._sessions[session_id].touched > self.idle_ttl:
+                    evicted.append(self._sessions.pop(session_id))
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for state in evicted:
+            # fold whatever is still pending so it is not lost from the persisted summary
+            state.evicted = True
+            self._fold_if_due(state)
+
+    def _state(self, session_id) -> _SessionState:
+        """Return the cached state of a session, loading it from MongoDB on a miss (on every access with ``refresh``)."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self._sessions.move_to_end(session_id)
+                state.touched = time.time()
+        if state is not None and not self.refresh:
+            return state
+
+        loaded = self._load(session_id)
+        if state is not None:
+            self._merge(state, loaded)
+        else:
+            with self._lock:
+                # another thread may have loaded the session meanwhile
+                state = self._sessions.setdefault(session_id, loaded)
+                self._sessions.move_to_end(session_id)
+            self._evict()
+        self._fold_if_due(state)
+        return state
+
+    @staticmethod
+    def _after(timestamp, bound) -> bool:
+        """True if ``timestamp`` is later than ``bound``, None being the beginning of the session."""
+        return bound is None or (timestamp is not None and timestamp > bound)
+
+    def _merge(self, state: _SessionState, loaded: _SessionState) -> None:
+        """
+        Bring a cached session up to date with the one just loaded from MongoDB.
+
+        The persisted summary wins unless this process holds a newer one; turns not
+        written yet (write-behind buffer) and the turns of the compression in flight
+        are kept as they are in process.
+        """
+        with state.lock:
+            if not self._after(state.summarized_until, loaded.summarized_until):
+                state.summary, state.summarized_until = loaded.summary, loaded.summarized_until
+            turns = {turn[2]: turn for turn in loaded.pending + loaded.turns}
+            for turn in state.pending + state.turns:
+                turns.setdefault(turn[2], turn)
+            cutoff = state.summarized_until
+            if state.compressing and self._after(state.folding_until, cutoff):
+                cutoff = state.folding_until
+            turns = [turns[ts] for ts in sorted(turns) if self._after(ts, cutoff)]
+            excess = max(len(turns) - self.recent_turns, 0)
+            state.pending, state.turns = turns[:excess], turns[excess:]
+
+    def _load(self, session_id) -> _SessionState:
+        """
+        Load a session from MongoDB: its summary and every turn the summary does not cover.
+
+        Turns older than the recent window were never folded (the process stopped or the
+        compression failed), they are queued for folding instead of being dropped.
+        """
+        summary_doc = self.doc_store.get_summary(session_id) or {}
+        summarized_until = summary_doc.get("summarized_until")
+        # both messages of a turn share its timestamp, they come back in either order
+        messages = {}
+        for doc in self.doc_store.get_turns(session_id, since=summarized_until, limit=None):
+            messages.setdefault(doc["timestamp"], {})[doc["role"]] = doc["message"]
+        turns = [
+            (roles["user"], roles["assistant"], ts)
+            for ts, roles in sorted(messages.items(), key=lambda item: item[0])
+            if "user" in roles and "assistant" in roles
+        ]
+        excess = max(len(turns) - self.recent_turns, 0)
+        state = _SessionState(session_id, summary_doc.get("summary", ""), summarized_until, turns[excess:])
+        state.pending = turns[:excess]
+        return state
+
+    def _fold_if_due(self, state: _SessionState) -> None:
+        """
+        Fold the pending turns of a session in the background once enough have accumulated
+        (any of them once the session is evicted), unless a fold is already in flight.
+        """
+        threshold = 1 if state.evicted else settings.memory_fold_turns
+        with state.lock:
+            due = len(state.pending) >= threshold and not state.compressing
+            if due:
+                state.compressing = True
+        if due:
+            try:
+                self._pool.submit(self._compress, state)
+            except RuntimeError:
+                # the memory is closing, the turns stay in MongoDB and are folded on the next load
+                state.compressing = False
+
+    def get(self, session_id) -> str:
+        """
+        Return the memory of a session formatted for the prompt.
+
+        Args:
+            session_id: chat session identifier
+
+        Returns:
+            str: summary of the earlier conversation followed by the recent turns
+        """
+        state = self._state(session_id)
+        limit = settings.memory_turn_max_chars
+        with state.lock:
+            lines = []
+            if state.summary:
+                lines.append(f"Summary of earlier conversation: {state.summary}")
+            for question, answer, _ in state.turns:
+                lines.append(f"User: {self._clip(question, limit)}")
+                lines.append(f"Assistant: {self._clip(answer, limit)}")
+        return "\n".join(lines) or "None yet."
+
+    def update(self, session_id, question: str, answer: str, timestamp) -> None:
+        """
+        Append a turn to the memory of a session.
+
+        Turns pushed out of the recent window are folded into the summary in the
+        background once ``settings.memory_fold_turns`` of them have accumulated.
+
+        Args:
+            session_id: chat session identifier
+            question (str): user question
+            answer (str): assistant answer
+            timestamp: timestamp the turn was stored with
+        """
+        state = self._state(session_id)
+        with state.lock:
+            if any(turn[2] == timestamp for turn in state.turns + state.pending):
+                # already picked up when the session was (re)loaded from MongoDB
+                return
+            state.turns.append((question, answer, timestamp))
+            if len(state.turns) > self.recent_turns:
+                state.pending.extend(state.turns[:-self.recent_turns])
+                state.turns = state.turns[-self.recent_turns:]
+        self._fold_if_due(state)
+
+    def _compress(self, state: _SessionState) -> None:
+        """
+        Fold the pending turns of a session into its rolling summary and persist it.
+
+        At most ``settings.memory_fold_max_turns`` turns go into one call, a longer
+        backlog is folded by the following calls.
+        """
+        with state.lock:
+            pending = state.pending[:settings.memory_fold_max_turns]
+            state.pending = state.pending[len(pending):]
+            summary = state.summary
+            state.folding_until = pending[-1][2] if pending else None
+        if not pending:
+            state.compressing = False
+            return
+
+        limit = settings.memory_turn_max_chars
+        turns = "\n".join(
+            f"User: {self._clip(q, limit)}\nAssistant: {self._clip(a, limit)}" for q, a, _ in pending
+        )
+        prompt = chat_summary_prompt.format(
+            max_words=settings.memory_summary_max_words, summary=summary or "None yet.", turns=turns
+        )
+        try:
+            new_summary = self.model.run([{"type": "text", "text": prompt}], system=chat_summary_system).strip()
+        except Exception as e:
+            self.logger.error(f"Failed to compress chat history: {e}")
+            new_summary = ""
+        if not new_summary:
+            # keep the turns for the next attempt instead of losing them
+            with state.lock:
+                state.pending = pending + state.pending
+                state.compressing = False
+            return
+
+        new_summary = self._clip(new_summary, settings.memory_summary_max_words * 8)
+        summarized_until = pending[-1][2]
+        # another process may have persisted a summary covering more turns meanwhile
+        if self.doc_store.upsert_summary(state.session_id, new_summary, summarized_until):
+            self.logger.info(f"Compressed {len(pending)} turns into the session summary")
+        with state.lock:
+            if self._after(summarized_until, state.summarized_until):
+                state.summary = new_summary
+                state.summarized_until = summarized_until
+            state.compressing = False
+        self._fold_if_due(state)
+
+    def close(self) -> None:
+        """Wait for the pending compressions to finish."""
+        self._pool.shutdown(wait=True)
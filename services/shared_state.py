@@ -0,0 +1,237 @@
+"""
+Local shared state for multi-process deployments.
+This module provides a small SQLite-backed store (WAL mode, one file on local disk)
+through which the API workers and the ingestion worker share ingestion job state,
+the ingestion queue, the Bedrock rate-limit bucket and cached safety verdicts,
+instead of keeping them in per-process globals. Rows nobody reads any more (done
+queue entries, finished jobs, expired values) are purged periodically.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from settings import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS ingest_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS ingest_queue_status ON ingest_queue (status, id);
+CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL);
+"""
+
+
+class SharedState:
+    """
+    SQLite store shared by every process of the deployment.
+
+    Each thread gets its own connection; write transactions use ``BEGIN IMMEDIATE``
+    so read-modify-write sequences (queue claims, bucket refills, counters) are atomic
+    across processes.
+
+    Attributes:
+        path (str): location of the SQLite database file
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Open (and create if needed) the store.
+
+        Args:
+            path (str): database file (default: settings.shared_state_path)
+        """
+        self.path = path or settings.shared_state_path
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._next_cleanup = 0.0
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run a block inside an immediate (write-locking) transaction."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    #  Jobs
+    def put_job(self, job_id: str, data: dict) -> None:
+        """Insert or replace the state of a job."""
+        self.maybe_cleanup()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, data, updated_at) VALUES (?, ?, ?)",
+                (job_id, json.dumps(data), time.time()),
+            )
+
+    def update_job(self, job_id: str, update) -> dict:
+        """Atomically apply ``update(data) -> data`` to the state of a job."""
+        with self.transaction() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            data = update(json.loads(row[0]))
+            conn.execute(
+                "UPDATE jobs SET data = ?, updated_at = ? WHERE job_id = ?", (json.dumps(data), time.time(), job_id)
+            )
+        return data
+
+    def get_job(self, job_id: str):
+        """Return the state of a job, None if unknown."""
+        row = self._connection().execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    #  Ingestion queue
+    def enqueue(self, job_id: str, payload: dict) -> None:
+        """Append an ingestion job to the queue."""
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO ingest_queue (job_id, payload) VALUES (?, ?)", (job_id, json.dumps(payload)))
+
+    def claim(self):
+        """
+        Claim the oldest pending queue entry.
+
+        Returns:
+            tuple: (entry id, job id, payload) or None if the queue is empty
+        """
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, job_id, payload FROM ingest_queue WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE ingest_queue SET status = 'claimed', claimed_at = ? WHERE id = ?",
+                         (time.time(), row[0]))
+        return row[0], row[1], json.loads(row[2])
+
+    def complete(self, entry_id: int) -> None:
+        """Mark a claimed queue entry as done."""
+        with self.transaction() as conn:
+            conn.execute("UPDATE ingest_queue SET status = 'done' WHERE id = ?", (entry_id,))
+
+    def heartbeat(self, entry_id: int) -> None:
+        """Refresh the claim of a queue entry that is still being worked on."""
+        with self.transaction() as conn:
+            conn.execute("UPDATE ingest_queue SET claimed_at = ? WHERE id = ? AND status = 'claimed'",
+                         (time.time(), entry_id))
+
+    def requeue_stale(self, older_than: float) -> int:
+        """Put entries claimed more than ``older_than`` seconds ago back to pending (crashed workers)."""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE ingest_queue SET status = 'pending', claimed_at = NULL "
+                "WHERE status = 'claimed' AND claimed_at < ?",
+                (time.time() - older_than,),
+            )
+        return cursor.rowcount
+
+    #  Rate limiting
+    def take_token(self, name: str, rate: float, capacity: float, reserve: float = 0.0) -> float:
+        """
+        Take one token from the shared bucket ``name``, leaving at least ``reserve`` in it.
+
+        Returns:
+            float: 0.0 if a token was taken, otherwise the seconds to wait before retrying
+        """
+        with self.transaction() as conn:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1 + reserve:
+                tokens -= 1
+            else:
+                wait = (1 + reserve - tokens) / rate
+            conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                         (name, tokens, now))
+        return wait
+
+    #  Key/value
+    def get(self, key: str):
+        """Return the JSON value stored under ``key``, None if absent or expired."""
+        row = self._connection().execute("SELECT value, expires_at FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        """Store a JSON value under ``key``, optionally expiring after ``ttl`` seconds."""
+        self.maybe_cleanup()
+        expires_at = time.time() + ttl if ttl else None
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                         (key, json.dumps(value), expires_at))
+
+    #  Housekeeping
+    def cleanup(self, finished_ttl: float = None) -> dict:
+        """
+        Delete the done queue entries, the jobs finished more than ``finished_ttl`` seconds
+        ago and the expired key/value entries.
+
+        Args:
+            finished_ttl (float): seconds a finished job stays queryable
+                (default: settings.shared_state_job_ttl)
+
+        Returns:
+            dict: number of rows deleted per table
+        """
+        finished_ttl = settings.shared_state_job_ttl if finished_ttl is None else finished_ttl
+        now = time.time()
+        with self.transaction() as conn:
+            deleted = {
+                "ingest_queue": conn.execute("DELETE FROM ingest_queue WHERE status = 'done'").rowcount,
+                "jobs": conn.execute(
+                    "DELETE FROM jobs WHERE updated_at < ? AND json_extract(data, '$.finished_at') IS NOT NULL",
+                    (now - finished_ttl,),
+                ).rowcount,
+                "kv": conn.execute("DELETE FROM kv WHERE expires_at < ?", (now,)).rowcount,
+            }
+        return deleted
+
+    def maybe_cleanup(self) -> None:
+        """Run ``cleanup`` if this process has not run it for ``settings.shared_state_cleanup_interval`` seconds."""
+        now = time.time()
+        if now < self._next_cleanup:
+            return
+        self._next_cleanup = now + settings.shared_state_cleanup_interval
+        self.cleanup()
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_shared_state():
+    """
+    Return the process-wide store, or None when neither ``settings.shared_state``
+    nor the production run mode is enabled.
+    """
+    global _state
+    if not (settings.shared_state or settings.run_mode == "production"):
+        return None
+    with _state_lock:
+        if _state is None:
+            _state = SharedState()
+        return _state
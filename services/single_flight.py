@@ -0,0 +1,90 @@
+"""
+Request coalescing for the Multi-Modal RAG system.
+This module lets concurrent identical requests share one execution: the first caller
+of a key runs the work, callers arriving while it is in flight wait for it and get the
+same result (or the same exception) instead of repeating the LLM and search calls.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Tuple
+
+from components.base_component import BaseComponent
+from services.metrics import metrics
+
+
+class _Call:
+    """One in-flight execution and its outcome."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(BaseComponent):
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    Only in-flight calls are shared, nothing is cached: a call arriving after the
+    leader finished runs again. Metrics are reported under ``{name}.leaders``,
+    ``{name}.coalesced`` and the ``{name}.wait`` timing.
+
+    Attributes:
+        name (str): metric name prefix
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize the coalescer.
+
+        Args:
+            name (str): metric name prefix
+        """
+        super().__init__(logger_name='SingleFlight')
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call
+
+    def run(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run ``fn`` unless a call with the same key is in flight, then share its result.
+
+        Args:
+            key (str): identity of the work, equal keys must produce interchangeable results
+            fn: the work, called without arguments by the leader only
+
+        Returns:
+            tuple: (result, shared) where ``shared`` is True for callers that waited on a leader
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            st = time.perf_counter()
+            call.done.wait()
+            metrics.observe(f"{self.name}.wait", time.perf_counter() - st)
+            metrics.incr(f"{self.name}.coalesced")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        metrics.incr(f"{self.name}.leaders")
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                self.logger.info(f"Shared one {self.name} execution with {call.waiters} waiting callers")
+            call.done.set()
@@ -0,0 +1,170 @@
+"""
+Structured model output for the Multi-Modal RAG system.
+This module holds the pydantic schemas of the JSON the models are asked for, and the
+local parsing that turns a raw model output into a validated object: code fences and
+surrounding prose are stripped, Python literals are accepted, and common defects
+(trailing commas, smart quotes, truncated brackets) are repaired before a costly
+re-ask is considered.
+"""
+
+import ast
+import json
+import re
+from typing import Any, List, Type
+
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+
+FENCE_REGEX = re.compile(r"```(?:json|python)?\s*(.*?)```", re.DOTALL)
+TRAILING_COMMA_REGEX = re.compile(r",\s*([\]}])")
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+class StructuredOutputError(Exception):
+    """Raised when a model output cannot be turned into the expected schema."""
+
+
+class QueryExpansion(BaseModel):
+    """Decomposed sub-questions and alternative phrasings of a user query."""
+
+    queries: List[str] = Field(min_length=1, description="5-6 search queries")
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_list(cls, data: Any) -> Any:
+        # the prompt asks for a bare list
+        return {"queries": data} if isinstance(data, list) else data
+
+    @field_validator("queries")
+    @classmethod
+    def _strip(cls, queries: List[str]) -> List[str]:
+        queries = [q.strip() for q in queries if q and q.strip()]
+        if not queries:
+            raise ValueError("no query generated")
+        return queries
+
+
+class Answer(BaseModel):
+    """Answer to a user question, status 1 when the context was relevant."""
+
+    status: int = Field(ge=0, le=1, description="1 if the question is answered from the context, else 0")
+    answer: str = Field(description="answer to the question")
+
+
+def _candidates(raw: str):
+    """Texts that may hold the JSON value, most likely first."""
+    text = (raw or "").strip().translate(SMART_QUOTES)
+    yield text
+    fenced = FENCE_REGEX.search(text)
+    if fenced:
+        yield fenced.group(1).strip()
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if starts:
+        start = min(starts)
+        closer = "}" if text[start] == "{" else "]"
+        end = text.rfind(closer)
+        # a truncated output has no closing bracket, keep everything after the opening one
+        yield text[start:end + 1] if end > start else text[start:]
+
+
+def _close_brackets(text: str) -> str:
+    """Append the closing quote and brackets of a truncated JSON text."""
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            stack.append("]" if char == "[" else "}")
+        elif char in "]}" and stack:
+            stack.pop()
+    return text + ('"' if in_string else "") + "".join(reversed(stack))
+
+
+def repair_json(raw: str) -> Any:
+    """
+    Decode the JSON (or Python literal) value of a raw model output.
+
+    Args:
+        raw (str): model output, possibly wrapped in prose or code fences
+
+    Returns:
+        the decoded value
+
+    Raises:
+        StructuredOutputError: if no repair produced a value
+    """
+    for text in _candidates(raw):
+        for attempt in (text, TRAILING_COMMA_REGEX.sub(r"\1", text)):
+            try:
+                return json.loads(attempt)
+            except ValueError:
+                pass
+            try:
+                return ast.literal_eval(attempt)
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                pass
+        try:
+            return json.loads(_close_brackets(TRAILING_COMMA_REGEX.sub(r"\1", text)))
+        except ValueError:
+            pass
+    raise StructuredOutputError(f"no JSON value in model output: {(raw or '')[:200]!r}")
+
+
+def validate(value: Any, schema: Type[BaseModel]) -> BaseModel:
+    """Validate a decoded value against ``schema``, raising ``StructuredOutputError``."""
+    try:
+        return schema.model_validate(value)
+    except ValidationError as e:
+        raise StructuredOutputError(f"{schema.__name__}: {e.errors(include_url=False)}") from e
+
+
+def parse_structured(raw: str, schema: Type[BaseModel]) -> BaseModel:
+    """
+    Turn a raw text model output into a ``schema`` object, repairing it locally.
+
+    Raises:
+        StructuredOutputError: if the output cannot be repaired or does not match the schema
+    """
+    return validate(repair_json(raw), schema)
+
+
+def coerce(value: Any, schema: Type[BaseModel]):
+    """
+    Validate a tool input or a text output, repairing it locally when it does not validate as is.
+
+    String-encoded JSON fields of a tool input (a list sent as a string) are decoded.
+
+    Returns:
+        tuple: (``schema`` instance, True if the local repair was needed)
+
+    Raises:
+        StructuredOutputError: if the value cannot be repaired into ``schema``
+    """
+    try:
+        return validate(json.loads(value) if isinstance(value, str) else value, schema), False
+    except (ValueError, StructuredOutputError):
+        pass
+    if isinstance(value, str):
+        return parse_structured(value, schema), True
+    if isinstance(value, dict):
+        fixed = {
+            key: repair_json(field) if isinstance(field, str) and field.strip()[:1] in ("[", "{") else field
+            for key, field in value.items()
+        }
+        return validate(fixed, schema), True
+    raise StructuredOutputError(f"{schema.__name__}: unexpected {type(value).__name__} output")
+
+
+def tool_definition(schema: Type[BaseModel], name: str, description: str = None) -> dict:
+    """Anthropic tool whose input schema is the JSON schema of ``schema``."""
+    return {
+        "name": name,
+        "description": description or (schema.__doc__ or name).strip(),
+        "input_schema": schema.model_json_schema(),
+    }
@@ -5,8 +5,91 @@ using a large language model (LLM) through the Bedrock service.
 """
 
 from components.base_component import BaseComponent
+from settings import settings
 from .bedrock import MLLM
-from app.prompt import summary_prompt_text, summary_prompt_image
+from .metrics import metrics
+from .structured_output import FENCE_REGEX, StructuredOutputError, repair_json
+from .image_describer import image_stub_text
+from .checkpoint import item_key
+from .table_index import parse_html_table, row_group_chunks, table_id
+from app.prompt import (
+    summary_system_text,
+    summary_prompt_text,
+    summary_prompt_image,
+    summary_system_table_batch,
+    summary_prompt_table_batch,
+    summary_system_image_batch,
+    summary_prompt_image_batch,
+)
+
+
+def pack_batches(items, size_of, max_items, max_size):
+    """
+    Split ``items`` into consecutive batches bounded by count and by total size.
+
+    Args:
+        items (list): items to pack, order is preserved
+        size_of (callable): size of one item (bytes, characters, ...)
+        max_items (int): maximum number of items per batch
+        max_size (int): maximum total size per batch; a single larger item gets its own batch
+
+    Returns:
+        list: list of batches (lists of items)
+    """
+    batches, batch, used = [], [], 0
+    for item in items:
+        size = size_of(item)
+        if batch and (len(batch) >= max_items or used + size > max_size):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(item)
+        used += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def parse_batch_response(raw, count):
+    """
+    Parse a ``{"1": "...", ...}`` batch answer.
+
+    The answer is repaired like any structured output (``repair_json``). When it was
+    cut off by the token budget, the last answered item is incomplete and is left
+    out, so only that item falls back to its own request.
+
+    Args:
+        raw (str): raw model output
+        count (int): number of items in the batch
+
+    Returns:
+        dict: item position (0-based) -> text, only for the items that were answered
+    """
+    try:
+        parsed = repair_json(raw)
+    except StructuredOutputError:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+    results = {}
+    for i in range(count):
+        text = parsed.get(str(i + 1))
+        if isinstance(text, str) and text.strip():
+            results[i] = text.strip()
+    fenced = FENCE_REGEX.search(raw)
+    body = (fenced.group(1) if fenced else raw).strip()
+    if results and not body.endswith("}"):
+        del results[max(results)]
+    return results
+
+
+def batch_tokens(model, count: int) -> int:
+    """
+    Response budget of a batch of ``count`` items: ``settings.summary_batch_tokens_per_item``
+    per item, never below the budget of a single item, at most
+    ``settings.summary_batch_max_output_tokens``.
+    """
+    return min(max(model.route.max_tokens, count * settings.summary_batch_tokens_per_item),
+               settings.summary_batch_max_output_tokens)
 
 
 class Summarizer(BaseComponent):
@@ -25,10 +108,12 @@ class Summarizer(BaseComponent):
         text_summaries (list): Generated summaries of text chunks
         image_summaries (list): Generated descriptions of images
         table_summaries (list): Generated summaries of tables
-        model (MLLM): Instance of the language model for summarization
+        model (MLLM): Instance of the language model for table summarization
+        image_model (MLLM): Instance of the multimodal language model for image descriptions
+        doc_store (DocumentStore): checkpoint store, None to disable checkpoints
     """
 
-    def __init__(self, texts, tables, images):
+    def __init__(self, texts, tables, images, doc_store=None):
         """
         Initialize the summarizer with content to process.
         
@@ -36,6 +121,8 @@ class Summarizer(BaseComponent):
             texts (list): List of text chunks to summarize
             tables (list): List of tables to summarize
             images (list): List of images to summarize
+            doc_store (DocumentStore): where every summary is checkpointed as soon as it is
+                produced, so a re-run of the same ingest only summarizes what is missing
         """
         super().__init__(logger_name='Summarizer')
         self.texts = texts
@@ -44,7 +131,9 @@ class Summarizer(BaseComponent):
         self.text_summaries = []
         self.image_summaries = []
         self.table_summaries = []
-        self.model = MLLM()
+        self.model = MLLM(task="table_summary")
+        self.image_model = MLLM(task="image_summary")
+        self.doc_store = doc_store if settings.ingest_checkpoints else None
 
     def run(self):
         """
@@ -58,6 +147,12 @@ class Summarizer(BaseComponent):
         1. Summarizing text chunks using a text-specific prompt
         2. Converting tables to HTML and summarizing them
         3. Generating detailed descriptions of images using a specialized image prompt
+
+        With ``settings.summary_batching`` several tables (and, separately, several
+        images) are packed into one request whose JSON answer is mapped back to the
+        items; unparsable batches fall back to one request per item. With
+        ``settings.image_summary_mode == "lazy"`` images are not described at all here.
+        Tables and images whose summary was checkpointed by an earlier run are not sent again.
         """
         # Summarize text chunks
         # for text in self.texts:
@@ -67,29 +162,208 @@ class Summarizer(BaseComponent):
         # for text we are not summarizing, since we don't want to lose any important information
         self.text_summaries = self.texts
 
-        # Summarize tables (converted to HTML)
-        for table in self.tables:
-            content = [{"type": "text", "text": summary_prompt_text.format(element=table['text'])}]
-            self.table_summaries.append({"text": self.model.run(content), "metadata": table['metadata']})
-
-        # Generate image descriptions
-        for image in self.images:
-            # Prepare content with both text prompt and image data
-            content = [{"type": "text", "text": summary_prompt_image}]
-            content_dict = {
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": "image/png",
-                    "data": image['image']
-                }
-            }
-            content.append(content_dict)
-            self.image_summaries.append(
-                {"text": self.model.run(content), "metadata": image['metadata'], "image": image['image']})
+        restored, pending = self._resume(self.tables)
+        if settings.summary_batching:
+            summaries = self._summarize_tables_batched(pending)
+        else:
+            summaries = [self._summarize_table(table) for table in pending]
+        self.table_summaries = self._merge(self.tables, restored, summaries)
+        if settings.table_row_indexing:
+            self.table_summaries = self._index_table_rows(self.table_summaries)
+
+        if settings.image_summary_mode == "lazy":
+            # index images by caption/OCR now, describe them on first retrieval
+            self.image_summaries = [
+                {"text": image_stub_text(image), "metadata": image['metadata'], "image": image['image'],
+                 "described": False, "item_key": image.get('item_key'), "section": self._caption(image)}
+                for image in self.images
+            ]
+        else:
+            restored, pending = self._resume(self.images)
+            if settings.summary_batching:
+                summaries = self._summarize_images_batched(pending)
+            else:
+                summaries = [self._summarize_image(image) for image in pending]
+            self.image_summaries = self._merge(self.images, restored, summaries)
 
         data = self.text_summaries + self.table_summaries + self.image_summaries
         # Log summary generation results
 
         self.logger.info(f'''summaries    {len(data)}''')
         return data
+
+    def _resume(self, items):
+        """
+        Split items into summaries restored from checkpoints and items still to summarize.
+
+        Returns:
+            tuple: (position -> restored summary text, list of pending items)
+        """
+        if self.doc_store is None:
+            return {}, list(items)
+        checkpoints = self.doc_store.get_checkpoints([item['item_key'] for item in items if item.get('item_key')])
+        restored, pending = {}, []
+        for position, item in enumerate(items):
+            checkpoint = checkpoints.get(item.get('item_key'))
+            if checkpoint is not None and checkpoint.get("text") is not None:
+                restored[position] = checkpoint["text"]
+            else:
+                pending.append(item)
+        if restored:
+            metrics.incr("summarizer.resumed", len(restored))
+            self.logger.info(f"Restored {len(restored)} summaries from checkpoints")
+        return restored, pending
+
+    @staticmethod
+    def _merge(items, restored, summaries):
+        """Interleave restored and fresh summaries back into the order of ``items``."""
+        fresh = iter(summaries)
+        merged = []
+        for position, item in enumerate(items):
+            if position in restored:
+                summary = {"text": restored[position], "metadata": item['metadata']}
+                if 'image' in item:
+                    summary["image"] = item['image']
+            else:
+                summary = next(fresh)
+            summary["item_key"] = item.get('item_key')
+            if 'image' in item:
+                summary["section"] = Summarizer._caption(item)
+            merged.append(summary)
+        return merged
+
+    @staticmethod
+    def _caption(image):
+        """Text around an image, indexed in the boostable ``section`` property."""
+        return (image.get('context') or "")[:settings.lazy_image_context_chars]
+
+    def _checkpoint(self, item, text):
+        """Persist the summary of an item as soon as it is produced."""
+        if self.doc_store is not None and item.get('item_key') and text is not None:
+            try:
+                self.doc_store.save_checkpoint(item['item_key'], "summarized", text=text)
+            except Exception as e:
+                self.logger.error(f"Summary checkpoint failed: {e}")
+
+    def _index_table_rows(self, summaries):
+        """
+        Parse every table into its columnar form and add its row-group chunks.
+
+        The summary of a parsed table carries the columnar table (stored in MongoDB
+        by ``VectorDB.run``) and its ``table_id``; tables that cannot be parsed only
+        keep their summary.
+        """
+        indexed = []
+        for table, summary in zip(self.tables, summaries):
+            parsed = parse_html_table(table['text'])
+            if parsed is None:
+                indexed.append(summary)
+                continue
+            tid = table_id(table['text'])
+            metadata = {k: v for k, v in summary['metadata'].items() if k not in ("text_as_html", "orig_elements")}
+            caption = f"Table on page {metadata.get('page_number')}: {(summary['text'] or '')[:200]}"
+            summary = dict(summary, metadata=dict(summary['metadata'], table_id=tid), table=parsed, section=caption)
+            indexed.append(summary)
+            chunks = row_group_chunks(parsed, tid, metadata, settings.table_row_group_size, caption)
+            for chunk in chunks:
+                chunk["section"] = caption
+                if summary.get('item_key'):
+                    chunk["item_key"] = item_key(summary['item_key'], "rows", chunk['metadata']['row_start'])
+            indexed.extend(chunks)
+        return indexed
+
+    def _call(self, content, model, system, max_tokens=None):
+        """Invoke ``model`` with the static ``system`` instructions and count the request."""
+        metrics.incr("summarizer.requests")
+        return model.run(content, system=system, max_tokens=max_tokens)
+
+    def _summarize_table(self, table):
+        """Summarize one table (converted to HTML) in its own request."""
+        content = [{"type": "text", "text": summary_prompt_text.format(element=table['text'])}]
+        text = self._call(content, self.model, summary_system_text)
+        self._checkpoint(table, text)
+        return {"text": text, "metadata": table['metadata']}
+
+    def _summarize_image(self, image):
+        """Describe one image in its own request."""
+        # The text prompt goes in the system prompt, the image data in the message
+        content = []
+        content_dict = {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": "image/png",
+                "data": image['image']
+            }
+        }
+        content.append(content_dict)
+        text = self._call(content, self.image_model, summary_prompt_image)
+        self._checkpoint(image, text)
+        return {"text": text, "metadata": image['metadata'], "image": image['image']}
+
+    def _run_batched(self, batches, request, single, model, system):
+        """
+        Summarize every batch with one request, falling back to single-item calls
+        for the items whose output could not be parsed back.
+        """
+        summaries = []
+        for batch in batches:
+            if len(batch) == 1:
+                summaries.append(single(batch[0]))
+                continue
+            raw = self._call(request(batch), model, system, batch_tokens(model, len(batch)))
+            parsed = parse_batch_response(raw, len(batch))
+            if len(parsed) < len(batch):
+                metrics.incr("summarizer.batch_fallbacks")
+                self.logger.info(f"Batch answer covered {len(parsed)}/{len(batch)} items, retrying the rest singly")
+            for i, item in enumerate(batch):
+                if i in parsed:
+                    self._checkpoint(item, parsed[i])
+                    summary = {"text": parsed[i], "metadata": item['metadata']}
+                    if 'image' in item:
+                        summary["image"] = item['image']
+                    summaries.append(summary)
+                else:
+                    summaries.append(single(item))
+        return summaries
+
+    def _summarize_tables_batched(self, tables):
+        """Summarize tables several at a time, bounded by count and characters."""
+
+        def request(batch):
+            elements = "\n".join(
+                f'<table id="{i + 1}">\n{table["text"]}\n</table>' for i, table in enumerate(batch)
+            )
+            prompt = summary_prompt_table_batch.format(count=len(batch), elements=elements)
+            return [{"type": "text", "text": prompt}]
+
+        batches = pack_batches(
+            tables, lambda table: len(table['text'] or ""),
+            settings.summary_batch_max_tables, settings.summary_batch_max_chars,
+        )
+        return self._run_batched(batches, request, self._summarize_table, self.model,
+                                 summary_system_table_batch)
+
+    def _summarize_images_batched(self, images):
+        """Describe images several at a time, bounded by count and base64 bytes."""
+
+        def request(batch):
+            content = [{"type": "text", "text": summary_prompt_image_batch.format(count=len(batch))}]
+            for i, image in enumerate(batch):
+                content.append({"type": "text", "text": f"Image {i + 1}"})
+                content.append({
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": "image/png",
+                        "data": image['image']
+                    }
+                })
+            return content
+
+        batches = pack_batches(
+            images, lambda image: len(image['image'] or ""),
+            settings.summary_batch_max_images, settings.summary_batch_max_bytes,
+        )
+        return self._run_batched(batches, request, self._summarize_image, self.image_model,
+                                 summary_system_image_batch)
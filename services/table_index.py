@@ -0,0 +1,169 @@
+"""
+Row-level table indexing for the Multi-Modal RAG system.
+This module parses the ``text_as_html`` of extracted tables into a compact columnar form,
+builds searchable row-group chunks from it, and picks the rows matching a question so only
+those rows, not whole tables, are put in the prompt.
+"""
+
+import hashlib
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+WORD_REGEX = re.compile(r"[\w.%$-]+")
+
+# Question words that never identify a row
+STOPWORDS = {
+    "a", "an", "and", "are", "by", "did", "do", "does", "for", "from", "how", "in", "is", "it", "many",
+    "much", "of", "on", "or", "the", "to", "was", "were", "what", "when", "where", "which", "who", "with",
+}
+
+
+class _TableParser(HTMLParser):
+    """Collect the cell texts of an HTML table, row by row, expanding colspans."""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.header_rows = 0
+        self._row = None
+        self._cell = None
+        self._colspan = 1
+        self._header_cells = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._row, self._header_cells = [], 0
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+            self._colspan = int(dict(attrs).get("colspan") or 1)
+            self._header_cells += max(self._colspan, 1) if tag == "th" else 0
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            text = " ".join("".join(self._cell).split())
+            self._row.extend([text] * max(self._colspan, 1))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if self._row:
+                if self._header_cells == len(self._row) and len(self.rows) == self.header_rows:
+                    self.header_rows += 1
+                self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def _terms(text: str) -> set:
+    """Lower-cased words and numbers of a text, without sentence-ending dots."""
+    return {t.rstrip(".") for t in WORD_REGEX.findall(text.lower())} - {""}
+
+
+def table_id(html: str) -> str:
+    """Stable id of a table, derived from its HTML."""
+    return hashlib.sha1((html or "").encode("utf-8")).hexdigest()[:16]
+
+
+def parse_html_table(html: str) -> Optional[Dict[str, list]]:
+    """
+    Parse ``text_as_html`` into a columnar table.
+
+    The ``<th>`` rows (or, without any, the first row) form the column names;
+    multi-row headers are joined per column.
+
+    Returns:
+        dict: {"columns": [names], "data": [[values of column 0], ...], "n_rows": int},
+        or None when the HTML holds no usable table
+    """
+    parser = _TableParser()
+    try:
+        parser.feed(html or "")
+    except Exception:
+        return None
+    rows = parser.rows
+    if len(rows) < 2:
+        return None
+
+    header_rows = parser.header_rows or 1
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    columns = []
+    for i in range(width):
+        parts = []
+        for row in rows[:header_rows]:
+            if row[i] and row[i] not in parts:
+                parts.append(row[i])
+        columns.append(" / ".join(parts) or f"column {i + 1}")
+    body = rows[header_rows:]
+    if not body:
+        return None
+    return {"columns": columns, "data": [list(column) for column in zip(*body)], "n_rows": len(body)}
+
+
+def table_rows(table: Dict[str, list], start: int = 0, end: int = None) -> List[List[str]]:
+    """Rows ``start:end`` of a columnar table, as lists of cell values."""
+    return [list(row) for row in zip(*(column[start:end] for column in table["data"]))]
+
+
+def render_rows(columns: List[str], rows: List[List[str]]) -> str:
+    """Compact pipe-separated rendering of a header and some rows."""
+    lines = [" | ".join(columns)]
+    lines.extend(" | ".join(row) for row in rows)
+    return "\n".join(lines)
+
+
+def row_group_chunks(table: Dict[str, list], tid: str, metadata: dict, group_size: int,
+                     caption: str = "") -> List[dict]:
+    """
+    Searchable chunks of ``group_size`` consecutive rows of a table.
+
+    Every row is written out as ``column: value`` pairs, so cell values can be matched
+    by keyword and by vector search together with their column names.
+
+    Returns:
+        list: {"text", "metadata"} items whose metadata points back to the table rows
+    """
+    chunks = []
+    columns = table["columns"]
+    for start in range(0, table["n_rows"], group_size):
+        rows = table_rows(table, start, start + group_size)
+        lines = [caption] if caption else []
+        for row in rows:
+            lines.append(" | ".join(f"{column}: {value}" for column, value in zip(columns, row) if value))
+        chunks.append({
+            "text": "\n".join(lines),
+            "metadata": dict(metadata, table_id=tid, row_start=start, row_end=start + len(rows)),
+        })
+    return chunks
+
+
+def match_rows(question: str, table: Dict[str, list], candidates: List[Tuple[int, int]],
+               max_rows: int) -> List[int]:
+    """
+    Pick the rows of a table worth putting in the prompt.
+
+    Rows of the matched ``candidates`` row ranges are ranked by the number of
+    question terms (words, numbers) found in their cells; rows without any match
+    are only kept when no row matches at all.
+
+    Args:
+        question (str): the user question
+        table (dict): columnar table
+        candidates (list): (row_start, row_end) ranges returned by the search
+        max_rows (int): upper bound of returned rows
+
+    Returns:
+        list: row indices, in table order
+    """
+    terms = _terms(question) - STOPWORDS
+    indices = sorted({i for start, end in candidates for i in range(start, min(end, table["n_rows"]))})
+    scored = []
+    for i in indices:
+        words = _terms(" ".join(column[i] for column in table["data"]))
+        scored.append((len(terms & words), i))
+    matched = [i for score, i in sorted(scored, key=lambda x: -x[0]) if score > 0][:max_rows]
+    if not matched:
+        matched = indices[:max_rows]
+    return sorted(matched)
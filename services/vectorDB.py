@@ -1,8 +1,13 @@
-from weaviate.classes.config import Configure
+from weaviate.classes.config import Configure, DataType, Property
+import threading
 import weaviate
 from app.config import config
 from components.base_component import BaseComponent
 from services.document_store import DocumentStore
+from services.checkpoint import item_uuid
+from services.near_duplicates import text_key
+from services.search_cache import search_cache
+from settings import settings
 
 
 class VectorDB(BaseComponent):
@@ -15,38 +20,109 @@ class VectorDB(BaseComponent):
         }
         self.client = weaviate.connect_to_local(host=config.WEAVIATE_HOST, port=8080, grpc_port=50051,
                                                 headers=self.headers)
+        # concurrent ingestion workers must not race on creating the collection
+        self._schema_lock = threading.Lock()
+
+    def _ensure_collection(self, class_name):
+        with self._schema_lock:
+            # Check if class already exists
+            existing_collections = self.client.collections.list_all()
+            if class_name not in existing_collections.keys():
+                self.client.collections.create(
+                    class_name,
+                    properties=[
+                        Property(name="text", data_type=DataType.TEXT),
+                        # heading path / caption, searchable and boostable by BM25 only
+                        Property(name="section", data_type=DataType.TEXT),
+                    ],
+                    vectorizer_config=[
+                        Configure.NamedVectors.text2vec_aws(
+                            name="text_vector",
+                            region=config.AWS_REGION,
+                            source_properties=["text"],
+                            service="bedrock",
+                            model="amazon.titan-embed-text-v2:0",
+                        )
+                    ],
+                )
+            else:
+                collection = self.client.collections.get(class_name)
+                names = {prop.name for prop in collection.config.get().properties}
+                if "section" not in names:
+                    # collections created before the section property existed
+                    collection.config.add_property(Property(name="section", data_type=DataType.TEXT))
+        return self.client.collections.get(class_name)
+
+    @staticmethod
+    def _duplicate_source(data_chunk) -> dict:
+        """Where a collapsed repeat came from, kept on the indexed original."""
+        metadata = data_chunk["metadata"]
+        source = {key: metadata.get(key) for key in ("filename", "page_number", "section")}
+        source["item_key"] = data_chunk.get("item_key")
+        return source
 
     def run(self, data,app):
         self.logger.info(self.client.is_ready())
-        # Check if class already exists
-        existing_collections = self.client.collections.list_all()
         class_name = "DocumentCollection"
-        if class_name not in existing_collections.keys():
-            self.client.collections.create(
-                class_name,
-                vectorizer_config=[
-                    Configure.NamedVectors.text2vec_aws(
-                        name="text_vector",
-                        region=config.AWS_REGION,
-                        source_properties=["text"],
-                        service="bedrock",
-                        model="amazon.titan-embed-text-v2:0",
-                    )
-                ],
-            )
-
-        collection = self.client.collections.get(class_name)
+        collection = self._ensure_collection(class_name)
+        doc_store = app.state.doc_store
+        keys = [chunk["item_key"] for chunk in data if chunk.get("item_key")]
+        checkpoints = doc_store.get_checkpoints(keys) if settings.ingest_checkpoints else {}
+        inserted = collapsed = 0
 
         for data_chunk in data:
-            uuid = collection.data.insert(
-                properties={"text": data_chunk["text"]},
-            )
+            key = data_chunk.get("item_key")
+            properties = {
+                "text": data_chunk["text"],
+                "section": data_chunk.get("section") or data_chunk["metadata"].get("section") or "",
+            }
+            # plain text chunks repeated verbatim (boilerplate) are collapsed; near-duplicates
+            # are kept, a revision differing in a few figures must stay searchable
+            is_text = not ({"image", "table"} & data_chunk.keys()) and "row_start" not in data_chunk["metadata"]
+            key_of_text = text_key(data_chunk["text"]) if is_text and settings.near_dup_collapse_index else None
+
+            uuid = item_uuid(key) if key is not None else None
+            exists = uuid is not None and collection.data.exists(uuid)
+            if exists and checkpoints.get(key, {}).get("stage") == "inserted":
+                continue
+            if not exists and key_of_text is not None:
+                original = doc_store.find_by_text_key(key_of_text, exclude=uuid)
+                if original is not None:
+                    doc_store.count_duplicate(original, self._duplicate_source(data_chunk))
+                    if key is not None and settings.ingest_checkpoints:
+                        doc_store.save_checkpoint(key, "inserted")
+                    collapsed += 1
+                    continue
+
+            if uuid is None:
+                uuid = collection.data.insert(
+                    properties=properties,
+                )
+            elif not exists:
+                # deterministic ids make a re-run of the same ingest idempotent; the vector
+                # store stays the reference, checkpoints only skip completed metadata writes
+                collection.data.insert(properties=properties, uuid=uuid)
+            inserted += 1
 
             # population the vector store with the textual data and keeping the metadata for docstore
-            doc_store = app.state.doc_store
             if 'image' in data_chunk.keys():
                 doc = {k: data_chunk[k] for k in ("image", "metadata")}
+                # lazily indexed images get described on their first retrieval
+                doc["described"] = data_chunk.get("described", True)
                 doc_store.upsert_metadata(str(uuid), doc)
             else:
-                doc_store.upsert_metadata(str(uuid), data_chunk["metadata"])
-            self.logger.info(f"Inserted meta data for document with UUID: {uuid}")
\ No newline at end of file
+                if 'table' in data_chunk:
+                    # columnar rows, looked up when one of the table's row groups is retrieved
+                    doc_store.upsert_table(data_chunk["metadata"]["table_id"], data_chunk["table"])
+                doc_store.upsert_metadata(str(uuid), data_chunk["metadata"], key_of_text)
+            if key is not None and settings.ingest_checkpoints:
+                doc_store.save_checkpoint(key, "inserted")
+            self.logger.info(f"Inserted meta data for document with UUID: {uuid}")
+
+        self.logger.info(
+            f"Inserted {inserted} objects, collapsed {collapsed} repeated chunks, "
+            f"{len(data) - inserted - collapsed} already ingested"
+        )
+        if inserted:
+            # cached search results of the previous collection state are now stale
+            search_cache.bump(app.state.doc_store, class_name)
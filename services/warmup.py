@@ -0,0 +1,75 @@
+"""
+Startup warm-up for the Multi-Modal RAG system.
+Heavy stacks (guardrails, Bedrock client, PDF extraction) are imported lazily; this
+module loads the ones a process needs ahead of the first request, in the background,
+so the API starts accepting connections immediately.
+"""
+
+import threading
+import time
+
+from components.base_component import BaseComponent
+from services.metrics import metrics
+from settings import settings
+
+
+class Warmup(BaseComponent):
+    """
+    Background loader of the lazily imported stacks.
+
+    The steps enabled by ``settings.warmup_*`` run once in a daemon thread;
+    ``ready`` is set when all of them are done (or failed) and backs the
+    ``/ready`` endpoint used by load balancers and autoscalers.
+
+    Attributes:
+        ready (threading.Event): set once the warm-up is over
+        steps (dict): step name -> seconds it took, or the error it raised
+    """
+
+    def __init__(self):
+        super().__init__(logger_name='Warmup')
+        self.ready = threading.Event()
+        self.steps = {}
+
+    @staticmethod
+    def _guardrails():
+        from services.guardrails import get_rails
+        get_rails()
+
+    @staticmethod
+    def _bedrock():
+        from services.bedrock_client import get_gateway
+        get_gateway()
+
+    @staticmethod
+    def _extraction():
+        from services.extractor import load_partition_pdf
+        load_partition_pdf()
+
+    def run(self) -> None:
+        """Run the enabled steps in sequence and mark the process as ready."""
+        steps = [
+            ("guardrails", settings.warmup_guardrails, self._guardrails),
+            ("bedrock", settings.warmup_bedrock, self._bedrock),
+            ("extraction", settings.warmup_extraction, self._extraction),
+        ]
+        try:
+            for name, enabled, step in steps:
+                if not enabled:
+                    continue
+                st = time.perf_counter()
+                try:
+                    step()
+                    self.steps[name] = round(time.perf_counter() - st, 3)
+                    metrics.observe(f"startup.warmup.{name}", time.perf_counter() - st)
+                except Exception as e:
+                    # the step is retried lazily by the first request that needs it
+                    self.steps[name] = f"failed: {e}"
+                    self.logger.error(f"Warm-up step {name} failed: {e}")
+            self.logger.info(f"Warm-up done: {self.steps}")
+        finally:
+            self.ready.set()
+
+    def start(self) -> None:
+        """Run the warm-up in a daemon thread."""
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
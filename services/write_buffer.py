@@ -0,0 +1,112 @@
+"""
+Asynchronous write-behind buffer for MongoDB inserts.
+This module lets the request path hand documents off to a background thread that
+persists them in batches, so storing chat history never adds latency to a response.
+"""
+
+import queue
+import threading
+import time
+
+from components.base_component import BaseComponent
+
+# MongoDB error code of an insert whose _id is already stored
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindBuffer(BaseComponent):
+    """
+    Batches ``insert_many`` calls for a collection on a background thread.
+
+    Documents are flushed when ``batch_size`` of them are waiting or ``flush_interval``
+    seconds after the first one arrived. When the queue is full, ``add`` writes
+    synchronously instead of dropping data. Failed documents are retried a few times
+    before being logged and discarded; after a partial ``BulkWriteError`` only the
+    documents that were not written are retried.
+
+    Attributes:
+        collection: pymongo collection the documents are written to
+        batch_size (int): maximum number of documents per insert_many
+        flush_interval (float): maximum seconds a document waits in the buffer
+    """
+
+    def __init__(self, collection, batch_size: int = 100, flush_interval: float = 0.5,
+                 max_queue: int = 10000, retries: int = 3):
+        """
+        Initialize the buffer and start its writer thread.
+
+        Args:
+            collection: pymongo collection to write to
+            batch_size (int): maximum documents per insert (default: 100)
+            flush_interval (float): maximum buffering delay in seconds (default: 0.5)
+            max_queue (int): queued documents before falling back to synchronous writes (default: 10000)
+            retries (int): attempts per batch before it is dropped (default: 3)
+        """
+        super().__init__(logger_name='WriteBehindBuffer')
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._worker, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def add(self, docs) -> None:
+        """
+        Queue documents for insertion.
+
+        Args:
+            docs (list): documents to insert, kept together in the same batch
+        """
+        if self._closed.is_set():
+            self._insert(list(docs))
+            return
+        try:
+            self._queue.put_nowait(list(docs))
+        except queue.Full:
+            self.logger.warning("Write-behind queue full, writing synchronously")
+            self._insert(list(docs))
+
+    def _insert(self, docs) -> None:
+        """Insert a batch, retrying the documents that failed."""
+        for attempt in range(1, self.retries + 1):
+            try:
+                self.collection.insert_many(docs, ordered=False)
+                return
+            except Exception as e:
+                self.logger.error(f"Write-behind insert failed (attempt {attempt}): {e}")
+                write_errors = (getattr(e, "details", None) or {}).get("writeErrors")
+                if write_errors is not None:
+                    # the other documents were written; a duplicate key is one written by an earlier attempt
+                    failed = sorted({error["index"] for error in write_errors if error.get("code") != DUPLICATE_KEY})
+                    docs = [docs[i] for i in failed]
+                    if not docs:
+                        return
+                # insert_many set the _id of every document, so a document written before a
+                # connection error comes back as a duplicate key instead of a second copy
+                time.sleep(0.1 * attempt)
+        self.logger.error(f"Dropping {len(docs)} documents after {self.retries} attempts")
+
+    def _worker(self) -> None:
+        """Drain the queue in batches until closed."""
+        while not (self._closed.is_set() and self._queue.empty()):
+            try:
+                batch = list(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                continue
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.extend(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._insert(batch)
+
+    def close(self) -> None:
+        """Flush everything that is still buffered and stop the writer thread."""
+        self._closed.set()
+        self._thread.join()
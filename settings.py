@@ -3,6 +3,8 @@ Configuration settings for the Multi-Modal RAG Application.
 This module defines all application-wide settings and configurations using Pydantic for type safety.
 """
 
+from typing import Any, Dict, List
+
 from pydantic_settings import BaseSettings
 from app.config import config
 
@@ -23,9 +25,11 @@ class Settings(BaseSettings):
         host (str): Host address for the application server
         admin_email (str): Administrator contact email
         MODEL_ID_SONNET_3_7 (str): Anthropic Claude 3.7 Sonnet model identifier
+        MODEL_ID_HAIKU_3_5 (str): Anthropic Claude 3.5 Haiku model identifier
         ANTHROPIC_VERSION (str): Version of the Anthropic API being used
         MAX_TOKENS (int): Maximum number of tokens for model responses
         model_temp (float): Temperature parameter for model response generation
+        model_routes (dict): Per-task model id, max_tokens, temperature and fallback models
     """
     app_name: str = "Multi-Modal RAG Application"
     app_description: str = "This app is a QnA application what reads a pdf  and answer all your questions"
@@ -35,15 +39,152 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     admin_email: str = "admin@example.com"
     MODEL_ID_SONNET_3_7: str = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"  # Sonnet3.7 model
+    MODEL_ID_SONNET_3_5: str = "us.anthropic.claude-3-5-sonnet-20241022-v2:0"  # Sonnet3.5 v2 model
+    MODEL_ID_HAIKU_3_5: str = "us.anthropic.claude-3-5-haiku-20241022-v1:0"  # Haiku3.5 model (text only)
+    # models that reject image blocks, skipped by the routes for requests carrying images
+    text_only_models: List[str] = [MODEL_ID_HAIKU_3_5]
     ANTHROPIC_VERSION: str = "bedrock-2023-05-31"
     MAX_TOKENS: int = 20000
     model_temp: float = 0.5
+    # task -> model routing, see services/model_router.py; missing keys fall back to "default"
+    model_routes: Dict[str, Dict[str, Any]] = {
+        "default": {"model": MODEL_ID_SONNET_3_7, "max_tokens": 4096, "temperature": 0.5},
+        "answer": {"model": MODEL_ID_SONNET_3_7, "max_tokens": 4096, "temperature": 0.2,
+                   "fallbacks": [MODEL_ID_SONNET_3_5]},
+        "query_expansion": {"model": MODEL_ID_HAIKU_3_5, "max_tokens": 512, "temperature": 0.3,
+                            "fallbacks": [MODEL_ID_SONNET_3_7]},
+        "table_summary": {"model": MODEL_ID_HAIKU_3_5, "max_tokens": 4096, "temperature": 0.1,
+                          "fallbacks": [MODEL_ID_SONNET_3_7]},
+        "image_summary": {"model": MODEL_ID_SONNET_3_7, "max_tokens": 4096, "temperature": 0.1,
+                          "fallbacks": [MODEL_ID_SONNET_3_5]},
+        "chat_summary": {"model": MODEL_ID_HAIKU_3_5, "max_tokens": 512, "temperature": 0.1,
+                         "fallbacks": [MODEL_ID_SONNET_3_7]},
+    }
+    search_cache_max_entries: int = 5000  # hybrid search results cached in process
+    search_cache_max_bytes: int = 64 * 1024 * 1024  # total size of the cached hit texts
+    search_cache_shared: bool = False  # also share cached results between processes through MongoDB
+    search_cache_shared_ttl: float = 86400  # seconds a shared cache entry is kept
+    search_cache_version_ttl: float = 1.0  # seconds the collection version is trusted before re-reading it
+    prompt_caching: bool = True  # mark static prompt prefixes with Anthropic cache-control breakpoints
+    bedrock_requests_per_second: float = 5.0  # token bucket refill rate shared by all model calls
+    bedrock_burst: float = 10.0  # token bucket capacity
+    bedrock_initial_concurrency: int = 4  # starting AIMD concurrency limit
+    bedrock_max_concurrency: int = 32  # AIMD concurrency ceiling
+    bedrock_max_attempts: int = 6  # attempts per model before falling back to the next one
+    bedrock_backoff_base: float = 0.5  # seconds, doubled per attempt (full jitter)
+    bedrock_backoff_cap: float = 20.0  # maximum backoff between two attempts
+    bedrock_call_deadline: float = 180.0  # seconds one model call may take including retries
+    bedrock_connect_timeout: float = 10.0  # seconds
+    bedrock_read_timeout: float = 120.0  # seconds for a single attempt
+    bedrock_circuit_threshold: int = 5  # consecutive failures before a model's circuit opens
+    bedrock_circuit_cooldown: float = 30.0  # seconds before a trial call is let through an open circuit
+    bedrock_bulk_reserve: float = 3.0  # rate-limit tokens bulk calls leave in the bucket for interactive ones
+    llm_scheduling: bool = True  # admit model calls by priority class instead of first come first served
+    llm_scheduler_slots: int = 16  # model calls running at once in a process
+    llm_scheduler_bulk_slots: int = 8  # of which bulk calls (summaries) may hold at most this many
+    llm_scheduler_initial_service_time: float = 5.0  # seconds, starting estimate of a model call duration
+    llm_latency_slo: float = 10.0  # seconds an interactive call may queue before it is shed with a 503
+    structured_output: bool = True  # force JSON answers through a tool call instead of parsing free text
+    structured_output_max_retries: int = 1  # re-asks when an output is invalid even after local repair
+    # task -> priority class ("interactive", "debug", "bulk"); request scopes override it
+    llm_task_priorities: Dict[str, str] = {
+        "answer": "interactive",
+        "query_expansion": "interactive",
+        "table_summary": "bulk",
+        "image_summary": "bulk",
+        "chat_summary": "bulk",
+    }
     persist_directory: str = "resources/chroma_langchain_db"
     embedding_model: str = "amazon.titan-embed-text-v2:0"
     IS_LOCAL:bool = True
     ranking_limit:int = 3
     search_limit:int = 5
     score_threshold: float = 0.7  # Threshold for document relevance scoring
+    search_alpha: float = 0.7  # hybrid weight of the vector search, 0 is pure BM25 and 1 pure vector
+    search_fusion: str = "relative_score"  # "relative_score" or "ranked" fusion of the BM25 and vector results
+    search_query_properties: List[str] = ["text", "section^2"]  # BM25 properties, "^n" boosts a property
+    search_bm25_fast_path: bool = True  # answer keyword-like queries (ids, codes, quoted phrases) with BM25 only
+    search_bm25_reference_score: float = 4.0  # raw BM25 score of a fast-path hit that just passes score_threshold
+    search_keyword_max_words: int = 8  # longer queries always use the hybrid search
+    speculative_retrieval: bool = True  # search the raw question while the decomposition is running
+    speculative_workers: int = 16  # threads shared by all in-flight speculative requests
+    speculative_skip_decomposition: bool = False  # answer from raw-question hits when they score high enough, decomposing only otherwise
+    speculative_skip_score: float = 0.85  # minimum raw-question score needed to skip the decomposition
+    answer_coalescing: bool = True  # concurrent identical questions of sessions without history share one answer
+    safety_cache_size: int = 10000  # safety verdicts kept for repeated questions
+    safety_cache_ttl: float = 86400  # seconds a cached safety verdict stays valid
+    safety_rail_latency_estimate: float = 2.0  # seconds saved per local verdict until a rail call is timed
+    session_memory: bool = True  # rolling summary + recent turns instead of the raw chat history
+    memory_recent_turns: int = 3  # question/answer pairs kept verbatim in the prompt
+    memory_fold_turns: int = 2  # pending older turns that trigger a compression call
+    memory_fold_max_turns: int = 20  # upper bound per call when a backlog of unsummarized turns is folded
+    memory_turn_max_chars: int = 1500  # each remembered message is clipped to this length
+    memory_summary_max_words: int = 200  # upper bound of the rolling summary
+    memory_max_sessions: int = 1000  # sessions cached in process
+    memory_idle_ttl: float = 3600  # seconds before an idle session is evicted from the cache (refreshed on every access in production)
+    chat_history_ttl_days: float = 30  # days after which each chat turn, and a summary not updated since, expires; 0 keeps them forever
+    chat_write_behind: bool = True  # persist chat turns from a background thread
+    chat_write_batch_size: int = 100  # chat documents per insert_many
+    chat_write_flush_interval: float = 0.5  # seconds a chat turn may wait in the write buffer
+    ingest_extract_workers: int = 2  # parallel partition_pdf runs in a batch ingestion
+    ingest_extract_in_processes: bool = False  # run extraction in worker processes instead of threads
+    ingest_summarize_workers: int = 4  # documents summarized concurrently
+    ingest_insert_workers: int = 2  # documents inserted into the vector store concurrently
+    ingest_queue_size: int = 4  # documents buffered between two stages before the upstream stage waits
+    ingest_spool_dir: str = "resources/ingest_spool"  # uploaded batches are stored here until ingested
+    ingest_root: str = "resources/documents"  # server-side directories must live under this path
+    run_mode: str = "single"  # "production" runs several API workers and a separate ingestion worker
+    shared_state: bool = False  # share jobs, rate limits and safety verdicts between processes (implied in production)
+    shared_state_path: str = "resources/state.db"  # SQLite file of the shared state, on local disk
+    shared_state_cleanup_interval: float = 600  # seconds between two purges of the shared state by a process
+    shared_state_job_ttl: float = 86400  # seconds a finished ingestion job stays queryable
+    ingest_poll_interval: float = 1.0  # seconds the ingestion worker sleeps when its queue is empty
+    ingest_claim_timeout: float = 300.0  # seconds without heartbeat before a claimed job is requeued
+    ingest_wait_timeout: float = 120.0  # seconds /embedding_file waits for its job in production before answering 202
+    chunking_strategy: str = "structured"  # "structured" token-sized section chunks, "by_title" the original chunking
+    chunk_max_tokens: int = 256  # size of the indexed (child) chunks
+    chunk_overlap_tokens: int = 32  # tokens shared by consecutive chunks of a section
+    chunk_parent_max_tokens: int = 1024  # size of the parent chunks returned by small-to-big retrieval
+    chunk_min_tokens: int = 64  # smaller section tails are merged into the previous parent
+    small_to_big: bool = True  # index small chunks, put their parent section in the prompt
+    extraction_cache: bool = True  # reuse the extraction of a PDF already partitioned with the same parameters
+    extraction_cache_dir: str = "resources/extraction_cache"  # gzipped JSON results, on local disk
+    extraction_cache_max_bytes: int = 2 * 1024 * 1024 * 1024  # least recently used results are evicted beyond this
+    ingest_checkpoints: bool = True  # checkpoint every summary and insert so a failed ingest resumes where it stopped
+    ingest_checkpoint_ttl_days: float = 30  # checkpoints expire after this many days
+    near_dup_detection: bool = True  # drop near-identical chunks from the prompt context
+    near_dup_collapse_index: bool = True  # do not index text chunks repeating an indexed one verbatim (case/spacing aside)
+    near_dup_max_sources: int = 50  # sources of collapsed repeats kept on the indexed chunk
+    near_dup_max_distance: int = 8  # SimHash bits two prompt chunks may differ by and still be near-duplicates
+    table_row_indexing: bool = True  # index tables row group by row group, besides their summary
+    table_row_group_size: int = 10  # table rows per indexed chunk
+    table_max_prompt_rows: int = 20  # matched rows of one table put in the prompt
+    compact_responses: bool = True  # /ask_question returns snippets and image URLs instead of full payloads
+    response_snippet_chars: int = 300  # characters of every context text in compact responses
+    thumbnail_max_px: int = 256  # width and height bound of image thumbnails
+    thumbnail_cache_size: int = 512  # image thumbnails kept in process
+    image_cache_max_age: int = 86400  # seconds clients may cache served images
+    gzip_minimum_size: int = 1024  # responses larger than this many bytes are gzip compressed
+    warmup_guardrails: bool = True  # load the guardrails stack right after startup instead of on the first question
+    warmup_bedrock: bool = True  # create the Bedrock client right after startup
+    warmup_extraction: bool = False  # import the PDF extraction stack at startup (the ingestion worker always does)
+    summary_batching: bool = True  # summarize several tables / images per model request
+    summary_batch_max_tables: int = 8  # tables per batched request
+    summary_batch_max_chars: int = 24000  # HTML characters per batched table request (~6k tokens)
+    summary_batch_max_images: int = 5  # images per batched request
+    summary_batch_max_bytes: int = 6000000  # base64 bytes per batched image request
+    summary_batch_tokens_per_item: int = 1024  # response tokens budgeted per item of a batched request
+    summary_batch_max_output_tokens: int = 8192  # response budget cap of a batched request (Haiku 3.5 / Sonnet 3.5 limit)
+    image_summary_mode: str = "eager"  # "eager" describes every image at ingest, "lazy" on first retrieval
+    lazy_image_ocr: bool = True  # add OCR text to the searchable stub of lazily indexed images
+    lazy_image_context_chars: int = 1500  # nearby chunk text kept in the stub
+    lazy_image_workers: int = 2  # background threads describing retrieved images
+    lazy_image_max_pending: int = 256  # descriptions queued per process, more are left to a later retrieval
+    image_filtering: bool = True  # drop blank and repeated images of a document before summarizing them
+    image_analysis_grid: int = 64  # side of the grayscale grid images are analysed on (multiple of 32)
+    image_analysis_workers: int = 4  # threads decoding the images of a document
+    image_blank_stddev: float = 10.0  # images whose pixel standard deviation is below this are blank
+    image_dedup_max_distance: int = 4  # perceptual hash bits two repeated images may differ by, -1 disables
 
 # Create a global settings instance
 settings = Settings()
@@ -1,6 +1,14 @@
 #!/bin/bash
 
-uvicorn app.main:app --host 0.0.0.0 --port 8000 &
+if [ "$RUN_MODE" = "production" ]; then
+  # several API workers for queries, one separate process for ingestion
+  export SHARED_STATE=true
+  export SEARCH_CACHE_SHARED=true
+  python -m services.ingestion_worker &
+  gunicorn app.main:app -k uvicorn.workers.UvicornWorker -w "${API_WORKERS:-4}" --bind 0.0.0.0:8000 --timeout 600 &
+else
+  uvicorn app.main:app --host 0.0.0.0 --port 8000 &
+fi
 
 echo "🕒 Waiting for backend to become ready..."
 while ! nc -z localhost 8000; do
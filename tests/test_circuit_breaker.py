@@ -0,0 +1,155 @@
+"""
+State transitions of the Bedrock circuit breaker, on its own and through ``BedrockGateway.invoke``.
+
+Run with ``python -m pytest tests`` (the gateway tests need botocore).
+"""
+
+import json
+import logging
+import threading
+import time
+import unittest
+from unittest import mock
+
+from services.bedrock_client import (
+    AdaptiveLimiter,
+    BedrockGateway,
+    BedrockRequestError,
+    BedrockUnavailableError,
+    CircuitBreaker,
+    TokenBucket,
+)
+from settings import settings
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover
+    ClientError = None
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def open_breaker(self, cooldown=0.05):
+        breaker = CircuitBreaker(threshold=2, cooldown=cooldown)
+        breaker.record(False)
+        breaker.record(False)
+        return breaker
+
+    def test_closed_until_threshold(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=60)
+        breaker.record(False)
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=60)
+        breaker.record(False)
+        breaker.record(True)
+        breaker.record(False)
+        self.assertTrue(breaker.allow())
+
+    def test_single_trial_after_cooldown(self):
+        breaker = self.open_breaker()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        # only one trial call while half-open
+        self.assertFalse(breaker.allow())
+
+    def test_trial_success_closes(self):
+        breaker = self.open_breaker()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record(True)
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+
+    def test_trial_failure_reopens(self):
+        breaker = self.open_breaker()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+
+    def test_trial_without_verdict_releases_trial(self):
+        breaker = self.open_breaker()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record(None)
+        # still half-open, the next call is the new trial
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+
+class _Body:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def read(self):
+        return json.dumps(self._payload).encode()
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+
+
+@unittest.skipIf(ClientError is None, "botocore is not installed")
+class GatewayBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gateway = BedrockGateway.__new__(BedrockGateway)
+        self.gateway.logger = logging.getLogger("test")
+        self.gateway.client = mock.Mock()
+        self.gateway.bucket = TokenBucket(rate=1000, capacity=1000)
+        self.gateway.limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=4)
+        self.gateway._breakers = {}
+        self.gateway._lock = threading.Lock()
+        overrides = {"bedrock_max_attempts": 2, "bedrock_backoff_base": 0.001, "bedrock_backoff_cap": 0.001,
+                     "bedrock_circuit_threshold": 1, "bedrock_circuit_cooldown": 0.05}
+        patcher = mock.patch.multiple(settings, **overrides)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = self.gateway._breaker("model")
+        self.breaker.record(False)
+        time.sleep(0.06)
+
+    def assert_trial_released(self):
+        self.assertTrue(self.breaker.allow(), "the half-open trial was never settled")
+
+    def test_throttled_trial(self):
+        self.gateway.client.invoke_model.side_effect = client_error("ThrottlingException")
+        with self.assertRaises(BedrockUnavailableError):
+            self.gateway.invoke("model", "{}")
+        self.assert_trial_released()
+
+    def test_rejected_trial(self):
+        self.gateway.client.invoke_model.side_effect = client_error("ValidationException")
+        with self.assertRaises(BedrockRequestError):
+            self.gateway.invoke("model", "{}")
+        self.assert_trial_released()
+
+    def test_trial_without_slot(self):
+        self.gateway.bucket = TokenBucket(rate=0.001, capacity=1)
+        self.gateway.bucket.acquire(time.monotonic())
+        with self.assertRaises(BedrockUnavailableError):
+            self.gateway.invoke("model", "{}", deadline=time.monotonic() + 0.01)
+        self.assert_trial_released()
+
+    def test_unexpected_error_trial(self):
+        self.gateway.client.invoke_model.side_effect = RuntimeError("boom")
+        with self.assertRaises(RuntimeError):
+            self.gateway.invoke("model", "{}")
+        self.assert_trial_released()
+
+    def test_successful_trial_closes(self):
+        self.gateway.client.invoke_model.return_value = {"body": _Body({"content": []})}
+        self.assertEqual(self.gateway.invoke("model", "{}"), {"content": []})
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+
+if __name__ == "__main__":
+    unittest.main()
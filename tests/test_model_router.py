@@ -0,0 +1,44 @@
+"""
+Route resolution of the model router, and the models tried for requests carrying images.
+
+Run with ``python -m pytest tests``.
+"""
+
+import unittest
+
+from services.model_router import ModelRouter
+from settings import settings
+
+# tasks whose prompts carry base64 image blocks
+MULTIMODAL_TASKS = ("answer", "image_summary")
+
+
+class ModelRouterTest(unittest.TestCase):
+
+    def test_unknown_task_uses_default_route(self):
+        router = ModelRouter({"default": {"model": "m", "max_tokens": 10, "temperature": 0.0}})
+        route = router.route("unknown")
+        self.assertEqual((route.task, route.model, route.max_tokens), ("unknown", "m", 10))
+
+    def test_fallbacks_follow_primary_once(self):
+        router = ModelRouter({"t": {"model": "a", "fallbacks": ["a", "b"]}})
+        self.assertEqual(router.route("t").models, ["a", "b"])
+
+    def test_text_only_models_skipped_for_images(self):
+        text_only = settings.text_only_models[0]
+        router = ModelRouter({"t": {"model": "vision", "fallbacks": [text_only, "vision2"]}})
+        route = router.route("t")
+        self.assertEqual(route.models_for(images=False), ["vision", text_only, "vision2"])
+        self.assertEqual(route.models_for(images=True), ["vision", "vision2"])
+
+    def test_multimodal_routes_keep_a_fallback_for_images(self):
+        router = ModelRouter()
+        for task in MULTIMODAL_TASKS:
+            with self.subTest(task=task):
+                route = router.route(task)
+                self.assertNotIn(route.model, settings.text_only_models)
+                self.assertGreater(len(route.models_for(images=True)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
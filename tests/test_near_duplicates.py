@@ -0,0 +1,64 @@
+"""
+SimHash fingerprints used for prompt-time dedup, and the text keys used to collapse verbatim repeats at ingest.
+
+Run with ``python -m pytest tests``.
+"""
+
+import random
+import unittest
+
+from services.near_duplicates import hamming, normalize_text, simhash, text_key
+
+
+def words(seed: int, count: int = 300):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    return [rng.choice(vocabulary) for _ in range(count)]
+
+
+class SimHashTest(unittest.TestCase):
+
+    def test_stable_across_processes(self):
+        # the feature hash is not Python's salted ``hash``
+        self.assertEqual(simhash("revenue grew by ten percent"), simhash("revenue grew by ten percent"))
+        self.assertEqual(simhash("a b c"), 0x8a3310240026b000)
+
+    def test_case_and_punctuation_insensitive(self):
+        self.assertEqual(simhash("Revenue grew, by ten percent."), simhash("revenue grew by ten percent"))
+
+    def test_small_edit_is_close(self):
+        text = words(1)
+        edited = list(text)
+        edited[150] = "changed"
+        self.assertLessEqual(hamming(simhash(" ".join(text)), simhash(" ".join(edited))), 8)
+
+    def test_unrelated_texts_are_far(self):
+        self.assertGreater(hamming(simhash(" ".join(words(1))), simhash(" ".join(words(2)))), 16)
+
+    def test_short_and_empty_texts(self):
+        self.assertEqual(simhash(""), 0)
+        self.assertEqual(simhash("word"), simhash("WORD"))
+
+    def test_hamming(self):
+        self.assertEqual(hamming(0b1011, 0b0010), 2)
+        self.assertEqual(hamming(7, 7), 0)
+
+
+class TextKeyTest(unittest.TestCase):
+
+    def test_verbatim_repeat_up_to_case_and_spacing(self):
+        self.assertEqual(text_key("Confidential -  Do not\ndistribute"), text_key("confidential - do not distribute"))
+
+    def test_revision_with_other_figures_is_kept(self):
+        self.assertNotEqual(text_key("Revenue was 4.2M in Q3"), text_key("Revenue was 4.7M in Q3"))
+
+    def test_punctuation_is_significant(self):
+        self.assertNotEqual(text_key("Do not stop."), text_key("Do not stop!"))
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("  A\tB \n c "), "a b c")
+        self.assertEqual(normalize_text(None), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+Keys, LRU bounds, size accounting and collection versions of the hybrid search cache.
+
+Run with ``python -m pytest tests``.
+"""
+
+import unittest
+from unittest import mock
+
+from services.search_cache import SearchCache, normalize_query
+from settings import settings
+
+
+def hits(*texts):
+    return [(f"uuid-{i}", text, 0.5) for i, text in enumerate(texts)]
+
+
+class FakeDocStore:
+    """Collection versions and shared cache entries kept in dicts."""
+
+    def __init__(self):
+        self.versions = {}
+        self.shared = {}
+
+    def get_collection_version(self, collection):
+        return self.versions.get(collection, 0)
+
+    def bump_collection_version(self, collection):
+        self.versions[collection] = self.versions.get(collection, 0) + 1
+        return self.versions[collection]
+
+    def get_cached_search(self, key):
+        return self.shared.get(key)
+
+    def put_cached_search(self, key, hits):
+        self.shared[key] = hits
+
+
+class KeyTest(unittest.TestCase):
+
+    def test_normalized_query(self):
+        self.assertEqual(normalize_query("  What  is RAG? "), "what is rag")
+        self.assertEqual(SearchCache.key("What is RAG?", {"k": 5}, 1), SearchCache.key("what is  rag", {"k": 5}, 1))
+
+    def test_params_and_version_are_part_of_the_key(self):
+        key = SearchCache.key("q", {"k": 5}, 1)
+        self.assertNotEqual(key, SearchCache.key("q", {"k": 6}, 1))
+        self.assertNotEqual(key, SearchCache.key("q", {"k": 5}, 2))
+
+
+class LruTest(unittest.TestCase):
+
+    def test_entry_bound_evicts_least_recently_used(self):
+        cache = SearchCache(max_entries=2, max_bytes=10_000)
+        cache.put("a", hits("a"))
+        cache.put("b", hits("b"))
+        cache.get("a")
+        cache.put("c", hits("c"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_size_bound(self):
+        cache = SearchCache(max_entries=100, max_bytes=3 * (100 + 64))
+        for key in "abcd":
+            cache.put(key, hits("x" * 100))
+        self.assertEqual(len(cache._entries), 3)
+        self.assertEqual(cache._bytes, 3 * (100 + 64))
+        self.assertIsNone(cache.get("a"))
+
+    def test_replacing_an_entry_keeps_the_size_exact(self):
+        cache = SearchCache(max_entries=10, max_bytes=10_000)
+        cache.put("a", hits("x" * 100, "y" * 50))
+        cache.put("a", hits("z" * 10))
+        cache.put("b", hits(None))
+        self.assertEqual(cache._bytes, (10 + 64) + (0 + 64))
+        self.assertEqual(cache.get("a"), hits("z" * 10))
+
+    def test_size_is_counted_in_utf8_bytes(self):
+        cache = SearchCache(max_entries=10, max_bytes=10_000)
+        cache.put("a", hits("é" * 10))
+        self.assertEqual(cache._bytes, 20 + 64)
+
+    def test_oversized_entry_is_not_kept(self):
+        cache = SearchCache(max_entries=10, max_bytes=100)
+        cache.put("a", hits("x" * 500))
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache._bytes, 0)
+
+    def test_clear(self):
+        cache = SearchCache(max_entries=10, max_bytes=10_000)
+        cache.put("a", hits("a"))
+        cache.clear()
+        self.assertEqual((len(cache._entries), cache._bytes), (0, 0))
+
+
+class VersionTest(unittest.TestCase):
+
+    def test_bump_changes_the_version_at_once(self):
+        store, cache = FakeDocStore(), SearchCache()
+        self.assertEqual(cache.version(store, "C"), 0)
+        self.assertEqual(cache.bump(store, "C"), 1)
+        self.assertEqual(cache.version(store, "C"), 1)
+
+    def test_version_is_reread_after_its_ttl(self):
+        store, cache = FakeDocStore(), SearchCache()
+        with mock.patch("services.search_cache.time.time", return_value=1000.0):
+            cache.version(store, "C")
+            store.bump_collection_version("C")  # by another process
+            self.assertEqual(cache.version(store, "C"), 0)
+        with mock.patch("services.search_cache.time.time", return_value=1000.0 + settings.search_cache_version_ttl):
+            self.assertEqual(cache.version(store, "C"), 1)
+
+
+class SharedTierTest(unittest.TestCase):
+
+    def test_shared_hit_fills_the_local_tier(self):
+        store = FakeDocStore()
+        with mock.patch.object(settings, "search_cache_shared", True):
+            SearchCache().put("k", hits("a"), doc_store=store)
+            other = SearchCache()
+            self.assertEqual(other.get("k", doc_store=store), hits("a"))
+        self.assertEqual(other.get("k"), hits("a"))
+
+    def test_disabled_shared_tier(self):
+        store = FakeDocStore()
+        with mock.patch.object(settings, "search_cache_shared", False):
+            SearchCache().put("k", hits("a"), doc_store=store)
+        self.assertEqual(store.shared, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
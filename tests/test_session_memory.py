@@ -0,0 +1,151 @@
+"""
+Loading, folding and cross-process refresh of the session memory, against an in-memory chat store.
+
+Run with ``python -m pytest tests``.
+"""
+
+import datetime
+import unittest
+from unittest import mock
+
+from services.session_memory import SessionMemory
+from settings import settings
+
+START = datetime.datetime(2026, 1, 1)
+
+
+class FakeStore:
+    """The chat and summary collections of ``DocumentStore`` for session "s", messages of a turn in ``order``."""
+
+    def __init__(self, order=("user", "assistant")):
+        self.order = order
+        self.messages = []
+        self.summary = None
+
+    def add_turn(self, i):
+        ts = START + datetime.timedelta(minutes=i)
+        text = {"user": f"q{i}", "assistant": f"a{i}"}
+        for role in self.order:
+            self.messages.append({"role": role, "message": text[role], "timestamp": ts})
+        return ts
+
+    def get_turns(self, session_id, since=None, limit=10):
+        if session_id != "s":
+            return []
+        docs = [doc for doc in self.messages if since is None or doc["timestamp"] > since]
+        return docs if limit is None else docs[-limit:]
+
+    def get_summary(self, session_id):
+        return self.summary if session_id == "s" else None
+
+    def upsert_summary(self, session_id, summary, summarized_until):
+        if self.summary and self.summary["summarized_until"] >= summarized_until:
+            return False
+        self.summary = {"summary": summary, "summarized_until": summarized_until}
+        return True
+
+
+class InlinePool:
+    """Executor running the submitted calls at once, or holding them back when ``paused``."""
+
+    def __init__(self):
+        self.paused = False
+        self.held = []
+
+    def submit(self, fn, *args):
+        if self.paused:
+            self.held.append((fn, args))
+        else:
+            fn(*args)
+
+    def run_held(self):
+        self.paused = False
+        held, self.held = self.held, []
+        for fn, args in held:
+            fn(*args)
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class FakeModel:
+    """Summarizes the questions of the folded turns."""
+
+    def run(self, content, system=None):
+        lines = content[0]["text"].splitlines()
+        return " ".join(line[len("User: "):] for line in lines if line.startswith("User: "))
+
+
+def memory(store, refresh=False):
+    mem = SessionMemory(store)
+    mem._pool = InlinePool()
+    mem._model = FakeModel()
+    mem.refresh = refresh
+    return mem
+
+
+class SessionMemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        overrides = {"memory_recent_turns": 3, "memory_fold_turns": 2, "memory_fold_max_turns": 20}
+        patcher = mock.patch.multiple(settings, **overrides)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tied_messages_load_in_either_order(self):
+        for order in (("user", "assistant"), ("assistant", "user")):
+            with self.subTest(order=order):
+                store = FakeStore(order)
+                for i in range(2):
+                    store.add_turn(i)
+                state = memory(store)._load("s")
+                self.assertEqual([turn[:2] for turn in state.turns], [("q0", "a0"), ("q1", "a1")])
+
+    def test_unsummarized_backlog_is_folded_on_load(self):
+        store = FakeStore(("assistant", "user"))
+        for i in range(7):
+            store.add_turn(i)
+        text = memory(store).get("s")
+        self.assertIn("Summary of earlier conversation: q0 q1 q2 q3", text)
+        self.assertIn("User: q6", text)
+        self.assertEqual(store.summary["summarized_until"], START + datetime.timedelta(minutes=3))
+
+    def test_turns_after_the_summary_only(self):
+        store = FakeStore()
+        for i in range(4):
+            store.add_turn(i)
+        store.summary = {"summary": "old", "summarized_until": START + datetime.timedelta(minutes=1)}
+        state = memory(store)._load("s")
+        self.assertEqual([turn[0] for turn in state.turns], ["q2", "q3"])
+        self.assertEqual(state.pending, [])
+
+    def test_workers_see_each_others_turns(self):
+        store = FakeStore()
+        workers = [memory(store, refresh=True), memory(store, refresh=True)]
+        for i in range(6):
+            worker = workers[i % 2]
+            worker.get("s")
+            worker.update("s", f"q{i}", f"a{i}", store.add_turn(i))
+        self.assertEqual(workers[0].get("s"), workers[1].get("s"))
+        self.assertEqual(workers[0].get("s").count("User: q5"), 1)
+        self.assertEqual(store.summary["summary"], "q0 q1")
+
+    def test_eviction_does_not_fold_twice(self):
+        store = FakeStore()
+        mem = memory(store)
+        mem.max_sessions = 1
+        mem._pool.paused = True
+        for i in range(5):
+            mem.update("s", f"q{i}", f"a{i}", store.add_turn(i))
+        state = mem._sessions["s"]
+        self.assertTrue(state.compressing)
+        # a second session evicts the first one while its fold is queued
+        mem.get("other")
+        self.assertEqual(len(mem._pool.held), 1)
+        mem._pool.run_held()
+        self.assertEqual(store.summary["summary"], "q0 q1")
+        self.assertFalse(state.compressing)
+
+
+if __name__ == "__main__":
+    unittest.main()
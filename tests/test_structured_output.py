@@ -0,0 +1,90 @@
+"""
+Local repair and validation of structured model outputs.
+
+Run with ``python -m pytest tests``.
+"""
+
+import unittest
+
+from services.structured_output import (
+    Answer,
+    QueryExpansion,
+    StructuredOutputError,
+    coerce,
+    parse_structured,
+    repair_json,
+    tool_definition,
+)
+
+
+class RepairJsonTest(unittest.TestCase):
+
+    def test_plain_json(self):
+        self.assertEqual(repair_json('{"a": [1, 2]}'), {"a": [1, 2]})
+
+    def test_code_fence_and_prose(self):
+        raw = 'Here are the queries:\n```json\n["a", "b"]\n```\nHope this helps.'
+        self.assertEqual(repair_json(raw), ["a", "b"])
+
+    def test_surrounding_prose_without_fence(self):
+        self.assertEqual(repair_json('Sure! {"status": 1, "answer": "x"} Done.'), {"status": 1, "answer": "x"})
+
+    def test_trailing_commas(self):
+        self.assertEqual(repair_json('{"a": [1, 2,],}'), {"a": [1, 2]})
+
+    def test_smart_quotes(self):
+        self.assertEqual(repair_json('[“one”, “two”]'), ["one", "two"])
+
+    def test_python_literal(self):
+        self.assertEqual(repair_json("['a', 'b']"), ["a", "b"])
+
+    def test_truncated_output(self):
+        self.assertEqual(repair_json('{"status": 1, "answer": "The value is 4'), {"status": 1, "answer": "The value is 4"})
+        self.assertEqual(repair_json('["first query", "second'), ["first query", "second"])
+
+    def test_no_value(self):
+        with self.assertRaises(StructuredOutputError):
+            repair_json("I cannot help with that.")
+
+
+class SchemaTest(unittest.TestCase):
+
+    def test_query_expansion_from_bare_list(self):
+        expansion = parse_structured('["a ", "", " b"]', QueryExpansion)
+        self.assertEqual(expansion.queries, ["a", "b"])
+
+    def test_query_expansion_rejects_empty(self):
+        with self.assertRaises(StructuredOutputError):
+            parse_structured('["", "  "]', QueryExpansion)
+
+    def test_answer_status_range(self):
+        with self.assertRaises(StructuredOutputError):
+            parse_structured('{"status": 2, "answer": "x"}', Answer)
+
+    def test_tool_definition(self):
+        tool = tool_definition(Answer, "answer")
+        self.assertEqual(tool["name"], "answer")
+        self.assertIn("status", tool["input_schema"]["properties"])
+
+
+class CoerceTest(unittest.TestCase):
+
+    def test_valid_tool_input(self):
+        answer, repaired = coerce({"status": 1, "answer": "x"}, Answer)
+        self.assertEqual((answer.status, answer.answer, repaired), (1, "x", False))
+
+    def test_list_sent_as_string(self):
+        expansion, repaired = coerce({"queries": '["a", "b",]'}, QueryExpansion)
+        self.assertEqual((expansion.queries, repaired), (["a", "b"], True))
+
+    def test_text_output(self):
+        expansion, repaired = coerce('```json\n["a"]\n```', QueryExpansion)
+        self.assertEqual((expansion.queries, repaired), (["a"], True))
+
+    def test_unexpected_type(self):
+        with self.assertRaises(StructuredOutputError):
+            coerce(42, Answer)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Batch packing, batch answer parsing and response budgets of the summarizer.
+
+Run with ``python -m pytest tests``.
+"""
+
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from services.summarizer import batch_tokens, pack_batches, parse_batch_response
+from settings import settings
+
+
+class PackBatchesTest(unittest.TestCase):
+
+    def test_bounded_by_count(self):
+        self.assertEqual(pack_batches(list(range(5)), lambda item: 1, 2, 100), [[0, 1], [2, 3], [4]])
+
+    def test_bounded_by_size(self):
+        self.assertEqual(pack_batches([4, 4, 4], lambda item: item, 10, 8), [[4, 4], [4]])
+
+    def test_oversized_item_gets_its_own_batch(self):
+        self.assertEqual(pack_batches([1, 50, 1], lambda item: item, 10, 8), [[1], [50], [1]])
+
+    def test_empty(self):
+        self.assertEqual(pack_batches([], len, 2, 10), [])
+
+
+class ParseBatchResponseTest(unittest.TestCase):
+
+    def test_complete_answer(self):
+        self.assertEqual(parse_batch_response('{"1": "a", "2": "b"}', 2), {0: "a", 1: "b"})
+
+    def test_fenced_answer_with_trailing_comma(self):
+        raw = 'Summaries:\n```json\n{"1": "a", "2": "b",}\n```'
+        self.assertEqual(parse_batch_response(raw, 2), {0: "a", 1: "b"})
+
+    def test_missing_and_empty_items(self):
+        self.assertEqual(parse_batch_response('{"1": "a", "3": " "}', 3), {0: "a"})
+
+    def test_truncated_answer_drops_the_cut_item(self):
+        raw = '{"1": "first summary", "2": "second summary", "3": "third summ'
+        self.assertEqual(parse_batch_response(raw, 3), {0: "first summary", 1: "second summary"})
+
+    def test_unparsable_answer(self):
+        self.assertEqual(parse_batch_response("Sorry, I cannot do that.", 2), {})
+        self.assertEqual(parse_batch_response('["a", "b"]', 2), {})
+        self.assertEqual(parse_batch_response(None, 2), {})
+
+
+class BatchTokensTest(unittest.TestCase):
+
+    def test_scales_with_batch_size(self):
+        model = SimpleNamespace(route=SimpleNamespace(max_tokens=2048))
+        with mock.patch.multiple(settings, summary_batch_tokens_per_item=1000, summary_batch_max_output_tokens=8000):
+            self.assertEqual(batch_tokens(model, 1), 2048)
+            self.assertEqual(batch_tokens(model, 5), 5000)
+            self.assertEqual(batch_tokens(model, 20), 8000)
+
+
+if __name__ == "__main__":
+    unittest.main()
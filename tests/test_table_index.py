@@ -0,0 +1,89 @@
+"""
+HTML table parsing, row-group chunks and row matching of the table index.
+
+Run with ``python -m pytest tests``.
+"""
+
+import unittest
+
+from services.table_index import match_rows, parse_html_table, render_rows, row_group_chunks, table_id, table_rows
+
+HTML = """
+<table>
+<tr><th>Region</th><th colspan="2">Revenue</th></tr>
+<tr><th></th><th>2022</th><th>2023</th></tr>
+<tr><td>North</td><td>1.2M</td><td>1.5M</td></tr>
+<tr><td>South</td><td>0.8M</td><td>0.9M</td></tr>
+<tr><td>East</td><td>2.1M</td><td>2.4M</td></tr>
+<tr><td>West</td><td>1.1M</td><td>1.0M</td></tr>
+</table>
+"""
+
+
+class ParseHtmlTableTest(unittest.TestCase):
+
+    def test_multi_row_header_and_colspan(self):
+        table = parse_html_table(HTML)
+        self.assertEqual(table["columns"], ["Region", "Revenue / 2022", "Revenue / 2023"])
+        self.assertEqual(table["n_rows"], 4)
+        self.assertEqual(table["data"][0], ["North", "South", "East", "West"])
+
+    def test_first_row_is_header_without_th(self):
+        table = parse_html_table("<table><tr><td>a</td><td>b</td></tr><tr><td>1</td></tr></table>")
+        self.assertEqual(table["columns"], ["a", "b"])
+        self.assertEqual(table_rows(table), [["1", ""]])
+
+    def test_unusable_tables(self):
+        self.assertIsNone(parse_html_table(""))
+        self.assertIsNone(parse_html_table("<table><tr><td>only</td></tr></table>"))
+        self.assertIsNone(parse_html_table("<p>no table</p>"))
+
+    def test_table_id_is_stable(self):
+        self.assertEqual(table_id(HTML), table_id(HTML))
+        self.assertNotEqual(table_id(HTML), table_id(HTML + " "))
+
+
+class RowGroupsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = parse_html_table(HTML)
+
+    def test_row_group_chunks(self):
+        chunks = row_group_chunks(self.table, "t1", {"page_number": 3}, group_size=3, caption="Table 2")
+        self.assertEqual([(c["metadata"]["row_start"], c["metadata"]["row_end"]) for c in chunks], [(0, 3), (3, 4)])
+        self.assertEqual(chunks[0]["metadata"]["table_id"], "t1")
+        self.assertEqual(chunks[0]["metadata"]["page_number"], 3)
+        self.assertEqual(chunks[1]["text"], "Table 2\nRegion: West | Revenue / 2022: 1.1M | Revenue / 2023: 1.0M")
+
+    def test_render_rows(self):
+        self.assertEqual(render_rows(["a", "b"], [["1", "2"]]), "a | b\n1 | 2")
+
+
+class MatchRowsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = parse_html_table(HTML)
+
+    def test_rows_matching_the_question(self):
+        self.assertEqual(match_rows("What was the revenue of the East region?", self.table, [(0, 4)], 5), [2])
+
+    def test_best_matches_within_the_bound(self):
+        rows = match_rows("Compare North, South and West", self.table, [(0, 4)], 2)
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(set(rows) <= {0, 1, 3})
+
+    def test_only_candidate_ranges(self):
+        self.assertEqual(match_rows("East and West", self.table, [(3, 4)], 5), [3])
+
+    def test_trailing_punctuation_of_terms(self):
+        self.assertEqual(match_rows("Which region made 1.0M.", self.table, [(0, 4)], 5), [3])
+
+    def test_no_match_keeps_the_first_candidates(self):
+        self.assertEqual(match_rows("Tell me about margins", self.table, [(1, 4)], 2), [1, 2])
+
+    def test_ranges_past_the_end_are_clipped(self):
+        self.assertEqual(match_rows("nothing", self.table, [(2, 10)], 10), [2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Batching and partial-failure retries of the write-behind buffer.
+
+Run with ``python -m pytest tests``.
+"""
+
+import threading
+import unittest
+
+from services.write_buffer import DUPLICATE_KEY, WriteBehindBuffer
+
+
+class FakeBulkWriteError(Exception):
+    """Carries ``details`` like ``pymongo.errors.BulkWriteError``."""
+
+    def __init__(self, details):
+        super().__init__("batch op errors occurred")
+        self.details = details
+
+
+class FakeCollection:
+    """Stores inserted documents by _id and fails the inserts it is told to."""
+
+    def __init__(self, failures=()):
+        self.stored = {}
+        self.calls = []
+        self.failures = list(failures)  # per call: set of _ids failing with a write error, or an exception
+        self._lock = threading.Lock()
+
+    def insert_many(self, docs, ordered=True):
+        with self._lock:
+            self.calls.append([doc["_id"] for doc in docs])
+            failing = self.failures.pop(0) if self.failures else set()
+            if isinstance(failing, Exception):
+                raise failing
+            errors = []
+            for i, doc in enumerate(docs):
+                if doc["_id"] in self.stored:
+                    errors.append({"index": i, "code": DUPLICATE_KEY})
+                elif doc["_id"] in failing:
+                    errors.append({"index": i, "code": 91})
+                else:
+                    self.stored[doc["_id"]] = doc
+            if errors:
+                raise FakeBulkWriteError({"writeErrors": errors, "nInserted": len(docs) - len(errors)})
+
+
+def docs(*ids):
+    return [{"_id": i} for i in ids]
+
+
+class InsertRetryTest(unittest.TestCase):
+
+    def buffer(self, collection):
+        buffer = WriteBehindBuffer(collection, retries=3)
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def test_partial_failure_retries_only_failed_documents(self):
+        collection = FakeCollection(failures=[{2, 4}])
+        self.buffer(collection)._insert(docs(1, 2, 3, 4, 5))
+        self.assertEqual(collection.calls, [[1, 2, 3, 4, 5], [2, 4]])
+        self.assertEqual(sorted(collection.stored), [1, 2, 3, 4, 5])
+
+    def test_duplicate_keys_count_as_written(self):
+        collection = FakeCollection()
+        collection.stored[1] = {"_id": 1}
+        self.buffer(collection)._insert(docs(1, 2))
+        self.assertEqual(collection.calls, [[1, 2]])
+        self.assertEqual(sorted(collection.stored), [1, 2])
+
+    def test_connection_error_retries_without_duplicates(self):
+        collection = FakeCollection(failures=[ConnectionError("reset")])
+        self.buffer(collection)._insert(docs(1, 2))
+        self.assertEqual(collection.calls, [[1, 2], [1, 2]])
+        self.assertEqual(sorted(collection.stored), [1, 2])
+
+    def test_documents_dropped_after_the_last_attempt(self):
+        collection = FakeCollection(failures=[{2}, {2}, {2}])
+        self.buffer(collection)._insert(docs(1, 2, 3))
+        self.assertEqual(collection.calls, [[1, 2, 3], [2], [2]])
+        self.assertEqual(sorted(collection.stored), [1, 3])
+
+
+class BufferTest(unittest.TestCase):
+
+    def test_close_flushes_in_batches(self):
+        collection = FakeCollection()
+        buffer = WriteBehindBuffer(collection, batch_size=4, flush_interval=0.05)
+        for i in range(10):
+            buffer.add(docs(i))
+        buffer.close()
+        self.assertEqual(sorted(collection.stored), list(range(10)))
+        self.assertTrue(all(len(call) <= 4 for call in collection.calls))
+
+    def test_add_after_close_writes_synchronously(self):
+        collection = FakeCollection()
+        buffer = WriteBehindBuffer(collection)
+        buffer.close()
+        buffer.add(docs(1))
+        self.assertEqual(list(collection.stored), [1])
+
+
+if __name__ == "__main__":
+    unittest.main()